@@ -0,0 +1,210 @@
+"""
+Streaming auth-failure monitoring
+
+Every state keeps success/failure counts over sliding 1m, 15m and 1h
+windows. Each window is a ring of buckets with running totals, so recording
+an event and reading a rate are both O(1). Events reach the monitor by
+tailing auth_events from an id watermark (see poll), which lets every
+worker keep its own counters; the rates endpoint only reads the counters.
+
+A (state, window) pair is flagged when its failure rate reaches
+AUTH_FAILURE_THRESHOLD over at least AUTH_MIN_ATTEMPTS attempts.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.models import AuthEvent
+from ..utils.regions import STATE_TO_REGION
+
+logger = logging.getLogger(__name__)
+
+AUTH_FAILURE_THRESHOLD = float(os.getenv("AUTH_FAILURE_THRESHOLD", "0.25"))
+AUTH_MIN_ATTEMPTS = int(os.getenv("AUTH_MIN_ATTEMPTS", "20"))
+
+# Window name -> length in seconds
+WINDOWS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+
+BUCKETS_PER_WINDOW = 60
+
+UNKNOWN = "Unknown"
+
+
+def _epoch(timestamp: datetime) -> float:
+    """Seconds since the epoch for a naive UTC or aware datetime"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class SlidingWindowCounter:
+    """Success and failure counts over a sliding window, in a ring of buckets"""
+
+    def __init__(self, window_seconds: float, buckets: int = BUCKETS_PER_WINDOW):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / buckets
+        self._size = buckets
+        self._successes = [0] * buckets
+        self._failures = [0] * buckets
+        self._head: Optional[int] = None
+        self.successes = 0
+        self.failures = 0
+
+    def _advance(self, bucket: int):
+        if self._head is None:
+            self._head = bucket
+            return
+        steps = bucket - self._head
+        if steps <= 0:
+            return
+        # Expire the buckets the window slid past; at most one full lap
+        for offset in range(1, min(steps, self._size) + 1):
+            slot = (self._head + offset) % self._size
+            self.successes -= self._successes[slot]
+            self.failures -= self._failures[slot]
+            self._successes[slot] = 0
+            self._failures[slot] = 0
+        self._head = bucket
+
+    def add(self, at: float, success: bool):
+        bucket = int(at // self.bucket_seconds)
+        self._advance(bucket)
+        if bucket <= self._head - self._size:
+            return  # older than the window
+        slot = bucket % self._size
+        if success:
+            self._successes[slot] += 1
+            self.successes += 1
+        else:
+            self._failures[slot] += 1
+            self.failures += 1
+
+    def counts(self, now: float) -> Tuple[int, int]:
+        """(attempts, failures) in the window ending at now"""
+        self._advance(int(now // self.bucket_seconds))
+        return self.successes + self.failures, self.failures
+
+
+class AuthMonitor:
+    def __init__(
+        self,
+        threshold: float = AUTH_FAILURE_THRESHOLD,
+        min_attempts: int = AUTH_MIN_ATTEMPTS,
+        windows: Dict[str, float] = WINDOWS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.threshold = threshold
+        self.min_attempts = min_attempts
+        self.windows = dict(windows)
+        self.clock = clock
+        self.last_id = 0
+        self.alerts = deque(maxlen=100)
+        self._counters: Dict[str, Dict[str, SlidingWindowCounter]] = {}
+        self._alerting = set()
+        self._lock = threading.Lock()
+
+    def _is_spike(self, attempts: int, failures: int) -> bool:
+        return attempts >= self.min_attempts and failures / attempts >= self.threshold
+
+    def record(self, state: Optional[str], success: bool, timestamp: Optional[datetime] = None):
+        """Count one auth attempt and flag the state if its failure rate spikes"""
+        state = state or UNKNOWN
+        at = _epoch(timestamp) if timestamp is not None else self.clock()
+        with self._lock:
+            counters = self._counters.get(state)
+            if counters is None:
+                counters = self._counters[state] = {
+                    name: SlidingWindowCounter(seconds) for name, seconds in self.windows.items()
+                }
+            for name, counter in counters.items():
+                counter.add(at, success)
+                attempts, failures = counter.successes + counter.failures, counter.failures
+                key = (state, name)
+                if self._is_spike(attempts, failures):
+                    if key not in self._alerting:
+                        self._alerting.add(key)
+                        rate = failures / attempts
+                        self.alerts.append({
+                            "state": state,
+                            "window": name,
+                            "failure_rate": rate,
+                            "attempts": attempts,
+                            "at": datetime.fromtimestamp(at, timezone.utc).replace(tzinfo=None),
+                        })
+                        logger.warning(
+                            "Auth failure spike in %s over %s: %.1f%% of %d attempts",
+                            state, name, rate * 100, attempts
+                        )
+                else:
+                    self._alerting.discard(key)
+
+    def poll(self, db: Session, batch_size: int = 10000) -> int:
+        """Record auth events added since the last poll; returns events read"""
+        stmt = select(AuthEvent.id, AuthEvent.state, AuthEvent.success, AuthEvent.timestamp)
+        if self.last_id:
+            stmt = stmt.where(AuthEvent.id > self.last_id)
+        else:
+            # First poll: only the longest window can still be affected
+            horizon = datetime.utcnow() - timedelta(seconds=max(self.windows.values()))
+            stmt = stmt.where(AuthEvent.timestamp >= horizon)
+        stmt = stmt.order_by(AuthEvent.id).execution_options(yield_per=batch_size)
+
+        seen = 0
+        for rows in db.execute(stmt).partitions():
+            for event_id, state, success, timestamp in rows:
+                self.record(state, bool(success), timestamp)
+                self.last_id = event_id
+                seen += 1
+
+        if not self.last_id:
+            # Nothing recent; start tailing from the current end of the table
+            latest = db.query(AuthEvent.id).order_by(AuthEvent.id.desc()).first()
+            self.last_id = latest[0] if latest else 0
+        return seen
+
+    def rates(self, window: Optional[str] = None) -> Tuple[List[dict], List[dict]]:
+        """Current per-state and per-region failure rates"""
+        now = self.clock()
+        names = [window] if window else list(self.windows)
+        states = []
+        regions: Dict[Tuple[str, str], List[int]] = {}
+
+        with self._lock:
+            for state in sorted(self._counters):
+                region = STATE_TO_REGION.get(state, UNKNOWN)
+                for name in names:
+                    attempts, failures = self._counters[state][name].counts(now)
+                    if attempts == 0:
+                        continue
+                    states.append(self._row(state, region, name, attempts, failures))
+                    totals = regions.setdefault((region, name), [0, 0])
+                    totals[0] += attempts
+                    totals[1] += failures
+
+        region_rows = [
+            self._row(None, region, name, attempts, failures)
+            for (region, name), (attempts, failures) in sorted(regions.items())
+        ]
+        return states, region_rows
+
+    def _row(self, state, region, window, attempts, failures) -> dict:
+        return {
+            "state": state,
+            "region": region,
+            "window": window,
+            "attempts": attempts,
+            "failures": failures,
+            "failure_rate": failures / attempts,
+            "alerting": self._is_spike(attempts, failures),
+        }
+
+
+auth_monitor = AuthMonitor()
@@ -0,0 +1,246 @@
+"""
+Cohort-based conversion funnel
+
+Users join the cohort of the day of their first successful auth, in the
+region of that auth's state. They convert on the day of their first paid
+status change, or on their cohort day if they were already paid. Per
+(cohort day, region, day) counts of new users and conversions are stored
+in cohort_daily_counts.
+
+Each refresh reads only auth and status events past their id watermarks.
+It sorts both deltas by userId and sort-merge joins them with the users'
+stored cohort state, so counts are extended without rescanning history.
+
+Ids are assigned at insert, not at commit, so a row can become visible
+after a refresh has moved the watermark past it. Each refresh therefore
+also re-reads the last COHORT_LATE_ID_WINDOW ids below the watermark.
+Folding an event twice changes nothing, since cohorts and conversions are
+only assigned once per user. A row that commits later than that is
+missed until the tables are rebuilt:
+    python -m app.analytics.cohorts
+"""
+
+import os
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..jobs.scheduler import job_lock
+from ..models.models import (
+    AuthEvent,
+    CohortDailyCount,
+    StatusChangeEvent,
+    UserCohort,
+    Watermark,
+)
+from ..utils.regions import STATE_TO_REGION
+
+AUTH_WATERMARK = "cohorts_auth_events"
+STATUS_WATERMARK = "cohorts_status_change_events"
+
+# Scheduler job that refreshes the cohorts; its lock keeps refreshes single-flight
+REFRESH_JOB = "cohorts"
+
+UNKNOWN = "Unknown"
+
+# Ids below the watermark re-read on each refresh to catch late commits
+COHORT_LATE_ID_WINDOW = int(os.getenv("COHORT_LATE_ID_WINDOW", "1000"))
+
+# (userId, timestamp, state) for auth rows, (userId, timestamp, None) for paid rows
+Event = Tuple[str, datetime, Optional[str]]
+
+
+def _watermark(db: Session, name: str) -> Watermark:
+    watermark = db.get(Watermark, name)
+    if watermark is None:
+        watermark = Watermark(name=name, last_id=0)
+        db.add(watermark)
+    return watermark
+
+
+def _first_per_user(events: List[Event]) -> Iterator[Event]:
+    """Earliest event per user from events sorted by (userId, timestamp)"""
+    previous = None
+    for event in events:
+        if event[0] != previous:
+            previous = event[0]
+            yield event
+
+
+def _merge_join(left: Iterator[Event], right: Iterator[Event]):
+    """Full outer sort-merge join of two per-user streams sorted by userId"""
+    a, b = next(left, None), next(right, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield a[0], a, None
+            a = next(left, None)
+        elif a is None or b[0] < a[0]:
+            yield b[0], None, b
+            b = next(right, None)
+        else:
+            yield a[0], a, b
+            a, b = next(left, None), next(right, None)
+
+
+def refresh_cohorts(
+    db: Session,
+    batch_size: int = 50000,
+    late_id_window: int = COHORT_LATE_ID_WINDOW,
+) -> int:
+    """Fold auth and status events past the watermarks into the cohort counts; returns users updated"""
+    auth_mark = _watermark(db, AUTH_WATERMARK)
+    status_mark = _watermark(db, STATUS_WATERMARK)
+
+    auths: List[Event] = []
+    last_auth_id = auth_mark.last_id or 0
+    stmt = select(
+        AuthEvent.id, AuthEvent.userId, AuthEvent.timestamp, AuthEvent.state, AuthEvent.success
+    ).where(AuthEvent.id > last_auth_id - late_id_window).order_by(AuthEvent.id).execution_options(yield_per=batch_size)
+    for rows in db.execute(stmt).partitions():
+        for event_id, user_id, timestamp, state, success in rows:
+            last_auth_id = max(last_auth_id, event_id)
+            if success and user_id is not None and timestamp is not None:
+                auths.append((user_id, timestamp, state))
+
+    paids: List[Event] = []
+    last_status_id = status_mark.last_id or 0
+    stmt = select(
+        StatusChangeEvent.id, StatusChangeEvent.userId, StatusChangeEvent.timestamp, StatusChangeEvent.level
+    ).where(StatusChangeEvent.id > last_status_id - late_id_window).order_by(StatusChangeEvent.id).execution_options(yield_per=batch_size)
+    for rows in db.execute(stmt).partitions():
+        for event_id, user_id, timestamp, level in rows:
+            last_status_id = max(last_status_id, event_id)
+            if level == "paid" and user_id is not None and timestamp is not None:
+                paids.append((user_id, timestamp, None))
+
+    auths.sort(key=lambda event: (event[0], event[1]))
+    paids.sort(key=lambda event: (event[0], event[1]))
+
+    # Stored state for every user the deltas touch
+    touched = sorted({event[0] for event in auths} | {event[0] for event in paids})
+    existing: Dict[str, UserCohort] = {}
+    for start in range(0, len(touched), 1000):
+        chunk = touched[start:start + 1000]
+        for user in db.query(UserCohort).filter(UserCohort.userId.in_(chunk)):
+            existing[user.userId] = user
+
+    counts: Dict[Tuple[date, str, date], List[int]] = defaultdict(lambda: [0, 0])
+    # Users whose state changed; re-read events usually change nothing
+    updated = 0
+    for user_id, auth, paid in _merge_join(_first_per_user(auths), _first_per_user(paids)):
+        user = existing.get(user_id)
+        before = None
+        if user is None:
+            user = UserCohort(userId=user_id)
+            db.add(user)
+        else:
+            before = (user.cohort_date, user.first_paid_at, user.converted_at)
+
+        if auth is not None and user.cohort_date is None:
+            # Cohorts are fixed once assigned; late older auths don't move users
+            user.first_seen_at = auth[1]
+            user.cohort_date = auth[1].date()
+            user.region = STATE_TO_REGION.get(auth[2] or "", UNKNOWN)
+            counts[(user.cohort_date, user.region, user.cohort_date)][0] += 1
+
+        if paid is not None and (user.first_paid_at is None or paid[1] < user.first_paid_at):
+            user.first_paid_at = paid[1]
+
+        if user.cohort_date is not None and user.first_paid_at is not None and user.converted_at is None:
+            user.converted_at = max(user.first_seen_at, user.first_paid_at)
+            counts[(user.cohort_date, user.region, user.converted_at.date())][1] += 1
+
+        if before != (user.cohort_date, user.first_paid_at, user.converted_at):
+            updated += 1
+
+    for (cohort_date, region, day), (new_users, conversions) in counts.items():
+        row = db.get(CohortDailyCount, (cohort_date, region, day))
+        if row is None:
+            row = CohortDailyCount(cohort_date=cohort_date, region=region, day=day, new_users=0, conversions=0)
+            db.add(row)
+        row.new_users += new_users
+        row.conversions += conversions
+
+    auth_mark.last_id = last_auth_id
+    status_mark.last_id = last_status_id
+    auth_mark.updated_at = status_mark.updated_at = datetime.utcnow()
+    db.commit()
+    return updated
+
+
+def ensure_cohorts(db: Session):
+    """Build the cohort counts on first use if they have never been refreshed
+
+    Holds the refresh job's lock, so a request arriving while the first
+    scheduled run is in progress waits for it instead of racing it.
+    """
+    if db.get(Watermark, AUTH_WATERMARK) is not None:
+        return
+    with job_lock(REFRESH_JOB):
+        # The scheduled run may have finished while we waited
+        db.expire_all()
+        if db.get(Watermark, AUTH_WATERMARK) is None:
+            refresh_cohorts(db)
+
+
+def cohort_conversion(
+    db: Session,
+    granularity: str = "week",
+    region: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    within_days: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Users and conversions per cohort and region
+
+    granularity groups cohort days into days or weeks (starting Monday).
+    within_days only counts conversions that happened that many days after
+    the cohort day or sooner.
+    """
+    query = db.query(
+        CohortDailyCount.cohort_date,
+        CohortDailyCount.region,
+        CohortDailyCount.day,
+        CohortDailyCount.new_users,
+        CohortDailyCount.conversions
+    )
+    if region:
+        query = query.filter(CohortDailyCount.region == region)
+    if start:
+        query = query.filter(CohortDailyCount.cohort_date >= start)
+    if end:
+        query = query.filter(CohortDailyCount.cohort_date <= end)
+
+    df = pd.DataFrame(query.all(), columns=["cohort_date", "region", "day", "new_users", "conversions"])
+    if within_days is not None:
+        late = (pd.to_datetime(df["day"]) - pd.to_datetime(df["cohort_date"])).dt.days > within_days
+        df.loc[late, "conversions"] = 0
+
+    if granularity == "week":
+        cohort_dates = pd.to_datetime(df["cohort_date"])
+        df["cohort"] = (cohort_dates - pd.to_timedelta(cohort_dates.dt.weekday, unit="D")).dt.date
+    else:
+        df["cohort"] = df["cohort_date"]
+
+    result = df.groupby(["cohort", "region"], sort=True).agg(
+        users=("new_users", "sum"),
+        conversions=("conversions", "sum")
+    ).reset_index()
+    result["conversion_rate"] = (result["conversions"] / result["users"]).where(result["users"] > 0, 0.0)
+    return result
+
+
+if __name__ == "__main__":
+    from ..db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        updated = refresh_cohorts(db)
+        print(f"Updated cohort state for {updated} users")
+    finally:
+        db.close()
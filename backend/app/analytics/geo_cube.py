@@ -0,0 +1,173 @@
+"""
+Hierarchical geo cube (region -> state -> ZIP)
+
+Stream counts are aggregated once at the finest grain, (region, state, zip,
+genre, level, artist), and rolled up into cuboids per geo level and measure.
+Genre and level cuboids are small and are materialized at every level up
+front. Artist cuboids are only materialized at the ZIP level; the state and
+region rollups are built from the ZIP cuboid the first time they are asked
+for and memoized, so drill-down queries never rescan raw events.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models.models import ListenEvent
+from ..utils.regions import GEO_LEVELS, STATE_TO_REGION
+
+# Dimensions a drill-down can break stream counts down by
+CUBE_MEASURES = ("genre", "level", "artist")
+
+# Measures whose rollups are materialized eagerly at every geo level
+EAGER_MEASURES = ("genre", "level")
+
+UNKNOWN = "Unknown"
+
+BASE_COLUMNS = ["state", "zip", "genre", "level", "artist", "stream_count"]
+
+
+class GeoCube:
+    """Partially materialized aggregate cube over the geo hierarchy"""
+
+    def __init__(self, base: pd.DataFrame):
+        base = base.copy()
+        base["state"] = base["state"].fillna(UNKNOWN)
+        base["zip"] = base["zip"].fillna(UNKNOWN)
+        base["region"] = base["state"].map(STATE_TO_REGION).fillna(UNKNOWN)
+        for measure in CUBE_MEASURES:
+            base[measure] = base[measure].fillna(UNKNOWN)
+
+        self.total_streams = int(base["stream_count"].sum())
+        self._lock = threading.RLock()
+        self._cuboids: Dict[Tuple[str, str], pd.DataFrame] = {}
+
+        for measure in CUBE_MEASURES:
+            self._cuboids[("zip", measure)] = self._rollup(base, "zip", measure)
+
+        for measure in EAGER_MEASURES:
+            self._cuboid("state", measure)
+            self._cuboid("region", measure)
+
+    @classmethod
+    def from_events(cls, events: pd.DataFrame) -> "GeoCube":
+        """Build the cube from raw listen event rows"""
+        if "zip" not in events.columns:
+            events = events.assign(zip=None)
+        keys = ["state", "zip", "genre", "level", "artist"]
+        base = (
+            events[keys]
+            .groupby(keys, dropna=False)
+            .size()
+            .reset_index(name="stream_count")
+        )
+        return cls(base)
+
+    @classmethod
+    def from_db(cls, db: Session) -> "GeoCube":
+        """Build the cube from one aggregate query over listen_events"""
+        results = db.query(
+            ListenEvent.state,
+            ListenEvent.zip,
+            ListenEvent.genre,
+            ListenEvent.level,
+            ListenEvent.artist,
+            func.count(ListenEvent.id).label("stream_count")
+        ).group_by(
+            ListenEvent.state,
+            ListenEvent.zip,
+            ListenEvent.genre,
+            ListenEvent.level,
+            ListenEvent.artist
+        ).all()
+        return cls(pd.DataFrame(results, columns=BASE_COLUMNS))
+
+    @staticmethod
+    def _rollup(frame: pd.DataFrame, level: str, measure: str) -> pd.DataFrame:
+        keys = list(GEO_LEVELS[:GEO_LEVELS.index(level) + 1]) + [measure]
+        return frame.groupby(keys, sort=True)["stream_count"].sum().reset_index()
+
+    def _cuboid(self, level: str, measure: str) -> pd.DataFrame:
+        key = (level, measure)
+        cuboid = self._cuboids.get(key)
+        if cuboid is None:
+            with self._lock:
+                cuboid = self._cuboids.get(key)
+                if cuboid is None:
+                    # Roll up from the next finer level, which is always
+                    # materialized or derivable from the ZIP cuboid
+                    finer = GEO_LEVELS[GEO_LEVELS.index(level) + 1]
+                    cuboid = self._rollup(self._cuboid(finer, measure), level, measure)
+                    self._cuboids[key] = cuboid
+        return cuboid
+
+    @property
+    def materialized(self):
+        """(level, measure) pairs currently held in memory"""
+        return sorted(self._cuboids)
+
+    def drill_down(
+        self,
+        measure: str,
+        level: str = "region",
+        region: Optional[str] = None,
+        state: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Stream counts broken down by measure at a geo level
+
+        region and state restrict the answer to one branch of the hierarchy.
+        With limit, only the top members of the measure are kept within each
+        geo member.
+        """
+        if measure not in CUBE_MEASURES:
+            raise ValueError(f"Unknown measure '{measure}'")
+        if level not in GEO_LEVELS:
+            raise ValueError(f"Unknown geo level '{level}'")
+        if state and level == "region":
+            raise ValueError("A state filter needs level 'state' or 'zip'")
+
+        result = self._cuboid(level, measure)
+        if region:
+            result = result[result["region"] == region]
+        if state:
+            result = result[result["state"] == state]
+
+        if limit is not None:
+            geo_keys = list(GEO_LEVELS[:GEO_LEVELS.index(level) + 1])
+            result = (
+                result.sort_values(
+                    geo_keys + ["stream_count", measure],
+                    ascending=[True] * len(geo_keys) + [False, True]
+                )
+                .groupby(geo_keys, sort=False)
+                .head(limit)
+            )
+
+        return result.reset_index(drop=True)
+
+
+_cube: Optional[GeoCube] = None
+_cube_lock = threading.Lock()
+
+
+def get_geo_cube(db: Session) -> GeoCube:
+    """Return the shared cube, building it on first use"""
+    global _cube
+    if _cube is None:
+        with _cube_lock:
+            if _cube is None:
+                _cube = GeoCube.from_db(db)
+    return _cube
+
+
+def refresh_geo_cube(db: Session) -> GeoCube:
+    """Rebuild the shared cube from the database and swap it in"""
+    global _cube
+    cube = GeoCube.from_db(db)
+    _cube = cube
+    return cube
@@ -0,0 +1,182 @@
+"""
+Declarative metrics layer
+
+Metrics (count, sum, mean, nunique, mode, share-of-total, per-user averages)
+are declared against named dimensions and compiled into a single vectorized
+group-by over the source DataFrame.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from ..utils.regions import STATE_TO_REGION
+
+
+@dataclass(frozen=True)
+class Dimension:
+    """A grouping key, either a raw column or derived from one"""
+    name: str
+    column: str
+    derive: Optional[Callable[[pd.Series], pd.Series]] = None
+
+
+@dataclass(frozen=True)
+class Metric:
+    """
+    A named aggregation
+
+    agg is one of AGGREGATIONS. column is the source column for sum, mean,
+    nunique and mode; for share and per_user it is optional and switches the
+    numerator from a row count to the sum of that column. within lists the
+    dimensions a share is normalized over (empty means the grand total).
+    """
+    name: str
+    agg: str
+    column: Optional[str] = None
+    within: Tuple[str, ...] = ()
+
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'nunique', 'mode', 'share', 'per_user')
+
+
+DIMENSIONS: Dict[str, Dimension] = {
+    'region': Dimension('region', 'state', lambda s: s.map(STATE_TO_REGION)),
+    'state': Dimension('state', 'state'),
+    'level': Dimension('level', 'level'),
+    'genre': Dimension('genre', 'genre'),
+    'artist': Dimension('artist', 'artist'),
+    'userId': Dimension('userId', 'userId'),
+    'hour': Dimension('hour', 'timestamp', lambda s: pd.to_datetime(s).dt.hour),
+    'day_of_week': Dimension(
+        'day_of_week', 'timestamp', lambda s: pd.to_datetime(s).dt.day_name()
+    ),
+    'date': Dimension('date', 'timestamp', lambda s: pd.to_datetime(s).dt.date),
+}
+
+
+def _validate(dimensions: Sequence[str], metrics: Sequence[Metric]):
+    if len(dimensions) == 0:
+        raise ValueError("At least one dimension is required")
+
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{dimension}'")
+
+    for metric in metrics:
+        if metric.agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{metric.agg}' for metric '{metric.name}'")
+        if metric.agg in ('sum', 'mean', 'nunique', 'mode') and metric.column is None:
+            raise ValueError(f"Metric '{metric.name}' requires a column")
+        missing = set(metric.within) - set(dimensions)
+        if missing:
+            raise ValueError(f"Metric '{metric.name}' is normalized over unknown dimensions {sorted(missing)}")
+
+
+def _sorted_categories(values: pd.Series) -> pd.Series:
+    # Categoricals group and sort in category order; sort the categories so
+    # results and mode tie-breaks match plain string columns
+    if isinstance(values.dtype, pd.CategoricalDtype) and not values.cat.ordered:
+        return values.cat.reorder_categories(sorted(values.cat.categories))
+    return values
+
+
+def _project(df: pd.DataFrame, dimensions: Sequence[str], columns: Sequence[str]) -> pd.DataFrame:
+    """Build the frame the group-by runs over without touching the input"""
+    projected = {}
+    for name in dimensions:
+        dimension = DIMENSIONS[name]
+        if dimension.column not in df.columns:
+            raise ValueError(f"Column '{dimension.column}' not found in dataframe")
+        source = df[dimension.column]
+        projected[name] = _sorted_categories(dimension.derive(source) if dimension.derive else source)
+
+    for column in columns:
+        if column not in projected:
+            if column not in df.columns:
+                raise ValueError(f"Column '{column}' not found in dataframe")
+            projected[column] = _sorted_categories(df[column])
+
+    return pd.DataFrame(projected, index=df.index)
+
+
+def compute_metrics(
+    df: pd.DataFrame,
+    dimensions: Sequence[str],
+    metrics: Sequence[Metric],
+    user_column: str = 'userId',
+) -> pd.DataFrame:
+    """
+    Compute every metric for each combination of dimensions in one pass
+
+    Returns a DataFrame indexed by the dimensions with one column per metric,
+    in the order the metrics were declared. The input frame is not modified.
+    """
+    dimensions = list(dimensions)
+    _validate(dimensions, metrics)
+
+    # Collect the base aggregations every metric needs so each is computed once
+    base: Dict[str, Tuple[str, str]] = {}
+    size_key = '__rows'
+    base[size_key] = (dimensions[0], 'size')
+
+    def numerator(metric: Metric) -> str:
+        if metric.column is None:
+            return size_key
+        key = f'sum__{metric.column}'
+        base[key] = (metric.column, 'sum')
+        return key
+
+    plan: List[Tuple[Metric, Tuple[str, ...]]] = []
+    source_columns = set()
+    for metric in metrics:
+        if metric.column is not None:
+            source_columns.add(metric.column)
+
+        if metric.agg == 'count':
+            plan.append((metric, (size_key,)))
+        elif metric.agg in ('sum', 'mean', 'nunique'):
+            key = f'{metric.agg}__{metric.column}'
+            base[key] = (metric.column, metric.agg)
+            plan.append((metric, (key,)))
+        elif metric.agg == 'share':
+            plan.append((metric, (numerator(metric),)))
+        elif metric.agg == 'per_user':
+            users_key = f'nunique__{user_column}'
+            base[users_key] = (user_column, 'nunique')
+            source_columns.add(user_column)
+            plan.append((metric, (numerator(metric), users_key)))
+        else:
+            plan.append((metric, ()))
+
+    frame = _project(df, dimensions, sorted(source_columns))
+    aggregated = frame.groupby(dimensions, sort=True, observed=True).agg(**base)
+
+    result = pd.DataFrame(index=aggregated.index)
+    for metric, keys in plan:
+        if metric.agg in ('count', 'sum', 'mean', 'nunique'):
+            result[metric.name] = aggregated[keys[0]]
+        elif metric.agg == 'share':
+            values = aggregated[keys[0]]
+            if metric.within:
+                totals = values.groupby(level=list(metric.within), observed=True).transform('sum')
+            else:
+                totals = values.sum()
+            result[metric.name] = values / totals
+        elif metric.agg == 'per_user':
+            result[metric.name] = aggregated[keys[0]] / aggregated[keys[1]]
+        elif metric.agg == 'mode':
+            result[metric.name] = _mode(frame, dimensions, metric.column)
+
+    return result
+
+
+def _mode(frame: pd.DataFrame, dimensions: List[str], column: str) -> pd.Series:
+    """Most frequent value per group, ties broken by the smallest value"""
+    counts = frame.groupby(dimensions + [column], sort=False, observed=True).size().reset_index(name='__n')
+    counts = counts.sort_values(
+        dimensions + ['__n', column],
+        ascending=[True] * len(dimensions) + [False, True]
+    )
+    return counts.drop_duplicates(dimensions).set_index(dimensions)[column]
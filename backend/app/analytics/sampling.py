@@ -0,0 +1,344 @@
+"""
+Stratified sample of listen events for approximate dashboard queries
+
+listen_events is stratified by (state, genre) and each stratum keeps a
+uniform reservoir of at most SAMPLE_PER_STRATUM events. Because the sample
+is bounded by the number of strata rather than the table size, approximate
+queries cost the same at any data size. Counts are estimated with the
+stratified estimator and returned with 95% confidence intervals.
+
+The sample is extended incrementally from a watermark on listen_events.id.
+Ids are assigned at insert but become visible at commit, so each refresh
+records the ids missing among the last SAMPLE_LATE_ID_WINDOW ids it read in
+watermark_gaps, and the next refresh folds any of them that have since
+committed. Each event is still counted once:
+    python -m app.analytics.sampling
+
+Each worker keeps the sample in memory as integer codes, reloaded when the
+watermark moves. Estimates are then a mask and a unique count over arrays
+rather than a SQL group-by over listen_events_sample on every request.
+"""
+
+import os
+import random
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from ..jobs.scheduler import job_lock
+from ..models.models import ListenEvent, ListenEventSample, SampleStratum, Watermark, WatermarkGap
+from .metrics import Metric, compute_metrics
+
+SAMPLE_PER_STRATUM = int(os.getenv("SAMPLE_PER_STRATUM", "100"))
+
+# Trailing ids checked again on the next refresh in case they commit late
+SAMPLE_LATE_ID_WINDOW = int(os.getenv("SAMPLE_LATE_ID_WINDOW", "1000"))
+
+WATERMARK_NAME = "listen_events_sample"
+
+# Scheduler job that refreshes the sample; its lock keeps refreshes single-flight
+REFRESH_JOB = "listen_sample"
+
+# Two-sided 95% normal interval
+Z_95 = 1.96
+
+UNKNOWN = "Unknown"
+
+SAMPLE_COLUMNS = ["artist", "userId", "state", "level", "genre", "timestamp"]
+
+
+def _stratum(state: Optional[str], genre: Optional[str]) -> Tuple[str, str]:
+    return (state or UNKNOWN, genre or UNKNOWN)
+
+
+def refresh_listen_sample(
+    db: Session,
+    per_stratum: int = SAMPLE_PER_STRATUM,
+    rng: Optional[random.Random] = None,
+    batch_size: int = 50000,
+    late_id_window: int = SAMPLE_LATE_ID_WINDOW,
+) -> int:
+    """
+    Fold listen events newer than the watermark, and late commits below it,
+    into the per-stratum reservoirs
+
+    Returns the number of new events seen.
+    """
+    rng = rng or random.Random()
+
+    watermark = db.get(Watermark, WATERMARK_NAME)
+    if watermark is None:
+        watermark = Watermark(name=WATERMARK_NAME, last_id=0)
+        db.add(watermark)
+
+    population: Dict[Tuple[str, str], int] = {
+        (s.state, s.genre): s.population for s in db.query(SampleStratum)
+    }
+    members: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for event_id, state, genre in db.query(
+        ListenEventSample.event_id, ListenEventSample.state, ListenEventSample.genre
+    ).order_by(ListenEventSample.event_id):
+        members[(state, genre)].append(event_id)
+
+    added = set()
+    removed = set()
+    seen = 0
+    previous_id = last_id = watermark.last_id or 0
+    gaps = set(db.scalars(select(WatermarkGap.event_id).where(WatermarkGap.name == WATERMARK_NAME)))
+    recent = deque(maxlen=late_id_window)
+
+    condition = ListenEvent.id > last_id
+    if gaps:
+        condition = or_(condition, ListenEvent.id.in_(sorted(gaps)))
+    stmt = select(ListenEvent.id, ListenEvent.state, ListenEvent.genre).where(
+        condition
+    ).order_by(ListenEvent.id).execution_options(yield_per=batch_size)
+
+    # Algorithm R per stratum: the k-th event of a full stratum replaces a
+    # random slot with probability per_stratum / k
+    for rows in db.execute(stmt).partitions():
+        for event_id, state, genre in rows:
+            key = _stratum(state, genre)
+            count = population.get(key, 0) + 1
+            population[key] = count
+            reservoir = members[key]
+            if len(reservoir) < per_stratum:
+                reservoir.append(event_id)
+                added.add(event_id)
+            else:
+                slot = rng.randrange(count)
+                if slot < per_stratum:
+                    evicted = reservoir[slot]
+                    reservoir[slot] = event_id
+                    if evicted in added:
+                        added.discard(evicted)
+                    else:
+                        removed.add(evicted)
+                    added.add(event_id)
+            if event_id > previous_id:
+                recent.append(event_id)
+                last_id = event_id
+            else:
+                gaps.discard(event_id)
+            seen += 1
+
+    if seen == 0:
+        db.commit()
+        return 0
+
+    # Ids the window skipped may belong to transactions still in flight
+    window_start = max(previous_id + 1, last_id - late_id_window + 1)
+    gaps = {event_id for event_id in gaps if event_id > last_id - late_id_window}
+    gaps.update(set(range(window_start, last_id + 1)).difference(recent))
+    db.execute(delete(WatermarkGap).where(WatermarkGap.name == WATERMARK_NAME))
+    if gaps:
+        db.execute(insert(WatermarkGap), [{"name": WATERMARK_NAME, "event_id": event_id} for event_id in sorted(gaps)])
+
+    for chunk in _chunks(sorted(removed)):
+        db.execute(delete(ListenEventSample).where(ListenEventSample.event_id.in_(chunk)))
+
+    for chunk in _chunks(sorted(added)):
+        rows = db.query(
+            ListenEvent.id, ListenEvent.artist, ListenEvent.userId, ListenEvent.state,
+            ListenEvent.level, ListenEvent.genre, ListenEvent.timestamp
+        ).filter(ListenEvent.id.in_(chunk)).all()
+        records = []
+        for row in rows:
+            record = dict(zip(["event_id"] + SAMPLE_COLUMNS, row))
+            record["state"], record["genre"] = _stratum(row.state, row.genre)
+            records.append(record)
+        db.execute(insert(ListenEventSample), records)
+
+    for (state, genre), count in population.items():
+        db.merge(SampleStratum(
+            state=state,
+            genre=genre,
+            population=count,
+            sample_size=len(members[(state, genre)])
+        ))
+
+    watermark.last_id = last_id
+    watermark.updated_at = datetime.utcnow()
+    db.commit()
+
+    # Load the new sample here rather than on the next request
+    sample_snapshot(db, reload=True)
+    return seen
+
+
+def ensure_listen_sample(db: Session):
+    """Build the sample on first use if it has never been refreshed
+
+    Holds the refresh job's lock, so a request arriving while the first
+    scheduled run is in progress waits for it instead of racing it.
+    """
+    if db.get(Watermark, WATERMARK_NAME) is not None:
+        return
+    with job_lock(REFRESH_JOB):
+        # The scheduled run may have finished while we waited
+        db.expire_all()
+        if db.get(Watermark, WATERMARK_NAME) is None:
+            refresh_listen_sample(db)
+
+
+def _chunks(values: Sequence[int], size: int = 1000):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class SampleSnapshot:
+    """The sample and its strata in memory for one watermark"""
+
+    # Sample columns that can be grouped on below the stratum
+    GROUP_COLUMNS = ("artist", "userId", "level")
+
+    def __init__(self, version: tuple, sample: pd.DataFrame, strata: pd.DataFrame):
+        self.version = version
+        self.strata = strata.reset_index(drop=True)
+
+        # Sample rows without a stratum row are ignored, as an inner join would
+        lookup = pd.MultiIndex.from_frame(self.strata[["state", "genre"]])
+        stratum = lookup.get_indexer(pd.MultiIndex.from_frame(sample[["state", "genre"]]))
+        keep = stratum >= 0
+        sample = sample[keep]
+        self._stratum = stratum[keep].astype(np.int64)
+        self._timestamps = pd.to_datetime(sample["timestamp"]).to_numpy(dtype="datetime64[ns]")
+
+        # Nulls are a group of their own, as in a SQL GROUP BY
+        self._codes: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, np.ndarray] = {}
+        for column in self.GROUP_COLUMNS:
+            codes, uniques = pd.factorize(sample[column], use_na_sentinel=False)
+            self._codes[column] = codes.astype(np.int64)
+            self._values[column] = np.asarray(uniques, dtype=object)
+
+    def __len__(self):
+        return len(self._stratum)
+
+    def estimate_counts(
+        self,
+        group_by: Sequence[str] = (),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        """Per-stratum estimates; see estimate_counts"""
+        for column in group_by:
+            if column not in self._codes:
+                raise ValueError(f"Cannot group the sample by '{column}'")
+
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self._timestamps >= np.datetime64(start)
+        if end is not None:
+            mask &= self._timestamps < np.datetime64(end)
+
+        # One integer key per (stratum, *group_by) so a unique count does the group-by
+        key = self._stratum[mask]
+        for column in group_by:
+            key = key * len(self._values[column]) + self._codes[column][mask]
+        keys, hits = np.unique(key, return_counts=True)
+
+        groups = {}
+        for column in reversed(group_by):
+            size = len(self._values[column])
+            groups[column] = self._values[column].take(keys % size)
+            keys = keys // size
+
+        df = self.strata.iloc[keys].reset_index(drop=True)
+        df = df[["state", "genre"]].assign(**{column: groups[column] for column in group_by})
+        df["hits"] = hits
+        df["population"] = self.strata["population"].to_numpy()[keys]
+        df["sample_size"] = self.strata["sample_size"].to_numpy()[keys]
+        return _add_estimates(df)
+
+    @classmethod
+    def from_db(cls, db: Session, version: tuple) -> "SampleSnapshot":
+        sample = pd.DataFrame(
+            db.query(*[getattr(ListenEventSample, column) for column in SAMPLE_COLUMNS]).all(),
+            columns=SAMPLE_COLUMNS
+        )
+        strata = pd.DataFrame(
+            db.query(SampleStratum.state, SampleStratum.genre, SampleStratum.population, SampleStratum.sample_size).all(),
+            columns=["state", "genre", "population", "sample_size"]
+        )
+        return cls(version, sample, strata)
+
+
+_snapshot: Optional[SampleSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def sample_snapshot(db: Session, reload: bool = False) -> SampleSnapshot:
+    """The in-memory sample, reloaded when the watermark has moved"""
+    global _snapshot
+    watermark = db.get(Watermark, WATERMARK_NAME)
+    version = (watermark.last_id, watermark.updated_at) if watermark is not None else (0, None)
+    snapshot = _snapshot
+    if reload or snapshot is None or snapshot.version != version:
+        with _snapshot_lock:
+            snapshot = _snapshot
+            if reload or snapshot is None or snapshot.version != version:
+                snapshot = _snapshot = SampleSnapshot.from_db(db, version)
+    return snapshot
+
+
+def _add_estimates(df: pd.DataFrame) -> pd.DataFrame:
+    N = df["population"].astype(float)
+    n = df["sample_size"].astype(float)
+    p = df["hits"] / n
+    df["estimate"] = N * p
+    # Stratified estimator variance with the finite population correction;
+    # a fully sampled stratum (n == N) contributes no error
+    df["variance"] = np.where(
+        n > 1,
+        N ** 2 * (1 - n / N) * p * (1 - p) / (n - 1).clip(lower=1),
+        0.0
+    )
+    return df
+
+
+def estimate_counts(
+    db: Session,
+    group_by: Sequence[str] = (),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """
+    Per-stratum count estimates from the sample
+
+    Returns one row per (state, genre, *group_by) with the estimated number
+    of listen events and its variance. Estimates and variances of disjoint
+    strata add, so callers roll them up with a plain sum.
+    """
+    return sample_snapshot(db).estimate_counts(group_by, start, end)
+
+
+def rollup_estimates(df: pd.DataFrame, dimensions: Sequence[str]) -> pd.DataFrame:
+    """Sum per-stratum estimates to the dimensions and attach 95% intervals"""
+    result = compute_metrics(df, dimensions, [
+        Metric("estimate", "sum", "estimate"),
+        Metric("variance", "sum", "variance"),
+    ]).reset_index()
+
+    margin = Z_95 * np.sqrt(result["variance"])
+    result["low"] = (result["estimate"] - margin).clip(lower=0)
+    result["high"] = result["estimate"] + margin
+    return result.drop(columns="variance")
+
+
+if __name__ == "__main__":
+    from ..db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        seen = refresh_listen_sample(db)
+        strata = db.query(func.count(), func.sum(SampleStratum.sample_size)).select_from(SampleStratum).one()
+        print(f"Folded {seen} new events; {strata[0]} strata, {strata[1] or 0} sampled events")
+    finally:
+        db.close()
@@ -0,0 +1,237 @@
+"""
+Mergeable t-digest sketches of listen durations
+
+One digest is kept per (genre, region, day) cell and merged at query time,
+so percentiles for any slice come from a few hundred centroids instead of a
+sort over listen_events. Each worker's store remembers the highest
+listen_events id it has folded in. The refresh job then folds in only newer
+rows, including rows written by a separate ingest process.
+"""
+
+import threading
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.models import ListenEvent
+from ..utils.regions import STATE_TO_REGION
+
+DEFAULT_COMPRESSION = 200.0
+
+UNKNOWN = "Unknown"
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) with the arcsine scale function
+
+    Values are buffered and folded into centroids in vectorized batches.
+    Centroids near the tails hold few points, which keeps p99 accurate.
+    """
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.count = 0.0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer_means = []
+        self._buffer_weights = []
+        self._buffered = 0
+
+    def update(self, values, weights=None):
+        """Add values (optionally weighted) to the digest"""
+        values = np.asarray(values, dtype=float).ravel()
+        if weights is None:
+            weights = np.ones_like(values)
+        else:
+            weights = np.asarray(weights, dtype=float).ravel()
+
+        keep = ~np.isnan(values)
+        values, weights = values[keep], weights[keep]
+        if len(values) == 0:
+            return
+
+        self.count += weights.sum()
+        self.total += (values * weights).sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        self._buffer_means.append(values)
+        self._buffer_weights.append(weights)
+        self._buffered += len(values)
+        if self._buffered >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        """Fold another digest's centroids into this one"""
+        other._compress()
+        if other.count == 0:
+            return
+        self._buffer_means.append(other._means)
+        self._buffer_weights.append(other._weights)
+        self._buffered += len(other._means)
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if self._buffered >= 5 * self.compression:
+            self._compress()
+
+    def _compress(self):
+        if self._buffered == 0:
+            return
+
+        means = np.concatenate([self._means] + self._buffer_means)
+        weights = np.concatenate([self._weights] + self._buffer_weights)
+        self._buffer_means, self._buffer_weights, self._buffered = [], [], 0
+
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+
+        # Bucket points by the integer part of the scale function at their
+        # quantile; every bucket spans roughly one unit of k
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+
+        self._weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / self._weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0-1), or None when empty"""
+        self._compress()
+        if self.count == 0:
+            return None
+        if len(self._means) == 1:
+            return float(self._means[0])
+
+        # Each centroid's mean sits at the midpoint of its cumulative weight
+        mids = np.cumsum(self._weights) - self._weights / 2
+        positions = np.r_[0.0, mids, self.count]
+        values = np.r_[self.min, self._means, self.max]
+        return float(np.interp(q * self.count, positions, values))
+
+    @property
+    def centroids(self) -> int:
+        self._compress()
+        return len(self._means)
+
+
+SketchKey = Tuple[str, str, date]
+
+
+class DurationSketchStore:
+    """Duration digests keyed by (genre, region, day)"""
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self._digests: Dict[SketchKey, TDigest] = {}
+        self._lock = threading.Lock()
+        self.listen_count = 0
+        self.last_id = 0
+
+    def __len__(self):
+        return len(self._digests)
+
+    def update(self, events: pd.DataFrame):
+        """Fold listen events (genre, state, timestamp, duration) into the digests"""
+        frame = pd.DataFrame({
+            "genre": events["genre"].fillna(UNKNOWN),
+            "region": events["state"].map(STATE_TO_REGION).fillna(UNKNOWN),
+            "day": pd.to_datetime(events["timestamp"]).dt.date,
+            "duration": pd.to_numeric(events["duration"]),
+        }).dropna(subset=["duration", "day"])
+
+        with self._lock:
+            for key, durations in frame.groupby(["genre", "region", "day"])["duration"]:
+                digest = self._digests.get(key)
+                if digest is None:
+                    digest = self._digests[key] = TDigest(self.compression)
+                digest.update(durations.to_numpy())
+            self.listen_count += len(frame)
+
+    def query(
+        self,
+        genre: Optional[str] = None,
+        region: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> TDigest:
+        """Merge the digests of every cell in the slice (start/end inclusive)"""
+        merged = TDigest(self.compression)
+        with self._lock:
+            for (cell_genre, cell_region, day), digest in self._digests.items():
+                if genre is not None and cell_genre != genre:
+                    continue
+                if region is not None and cell_region != region:
+                    continue
+                if start is not None and day < start:
+                    continue
+                if end is not None and day > end:
+                    continue
+                merged.merge(digest)
+        return merged
+
+    def update_from_db(self, db: Session, batch_size: int = 50000) -> int:
+        """Fold in listen_events rows above last_id, streamed in batches; returns rows read"""
+        stmt = select(
+            ListenEvent.id,
+            ListenEvent.genre,
+            ListenEvent.state,
+            ListenEvent.timestamp,
+            ListenEvent.duration
+        ).where(ListenEvent.id > self.last_id).execution_options(yield_per=batch_size)
+
+        seen = 0
+        for rows in db.execute(stmt).partitions():
+            frame = pd.DataFrame(rows, columns=["id", "genre", "state", "timestamp", "duration"])
+            self.update(frame)
+            self.last_id = max(self.last_id, int(frame["id"].max()))
+            seen += len(frame)
+        return seen
+
+    @classmethod
+    def from_db(cls, db: Session, batch_size: int = 50000) -> "DurationSketchStore":
+        """Build the digests by streaming listen_events in batches"""
+        store = cls()
+        store.update_from_db(db, batch_size)
+        return store
+
+
+_sketches: Optional[DurationSketchStore] = None
+_sketches_lock = threading.Lock()
+
+
+def get_duration_sketches(db: Session) -> DurationSketchStore:
+    """Return the shared sketch store, building it on first use"""
+    global _sketches
+    if _sketches is None:
+        with _sketches_lock:
+            if _sketches is None:
+                _sketches = DurationSketchStore.from_db(db)
+    return _sketches
+
+
+def refresh_duration_sketches(db: Session) -> DurationSketchStore:
+    """Fold rows added since the last refresh into the shared store
+
+    The store is rebuilt from scratch only when it does not exist yet or the
+    table has shrunk below its last_id.
+    """
+    global _sketches
+    with _sketches_lock:
+        store = _sketches
+        top = db.scalar(select(func.max(ListenEvent.id))) or 0
+        if store is None or top < store.last_id:
+            _sketches = DurationSketchStore.from_db(db)
+        else:
+            store.update_from_db(db)
+        return _sketches
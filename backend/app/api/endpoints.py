@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Integer, and_, case, cast, func, or_, select
 from typing import List, Optional
+from datetime import date
+import numpy as np
 import pandas as pd
 
 from ..db.database import get_db
@@ -10,128 +12,324 @@ from ..schemas.schemas import (
     GenreByRegionResponse,
     SubscriberByRegionResponse,
     TopArtistResponse,
-    RisingArtistResponse
+    RisingArtistResponse,
+    GeoDrillDownResponse,
+    DurationQuantileResponse,
+    JobStatusResponse,
+    AuthFailureRatesResponse,
+    CohortConversionResponse,
+    HourlyStreamsResponse
 )
-from ..utils.regions import STATE_TO_REGION
+from ..analytics.geo_cube import get_geo_cube
+from ..storage.segments import count_by_hour, get_segment_store
+from ..utils.regions import GEO_LEVELS, STATE_TO_REGION
+from ..analytics.sketches import get_duration_sketches
+from ..analytics.sampling import UNKNOWN as SAMPLE_UNKNOWN
+from ..analytics.sampling import WATERMARK_NAME as SAMPLE_WATERMARK
+from ..analytics.sampling import ensure_listen_sample, estimate_counts, rollup_estimates
+from ..analytics.auth_monitor import auth_monitor
+from ..analytics.cohorts import AUTH_WATERMARK, STATUS_WATERMARK, cohort_conversion, ensure_cohorts
+from .pagination import decode_cursor, ndjson_response, paginate, stream_query
+from .responses import cache_headers, json_response, make_etag, max_id, not_modified, watermark_id
 
 router = APIRouter()
 
 
-@router.get("/genres/by-region", response_model=List[GenreByRegionResponse])
+def _counts(values: pd.Series) -> pd.Series:
+    """Round (possibly estimated) counts to ints"""
+    return values.round().astype(int)
+
+
+def _region_of(state_column):
+    """SQL expression for the region of a state column, NULL when unknown"""
+    # The region endpoints roll states up in the database rather than loading
+    # every event to run compute_metrics, which aggregates in pandas. The
+    # CASE is generated from the same STATE_TO_REGION map as the metrics
+    # layer's region dimension, so both assign states to regions identically.
+    return case(STATE_TO_REGION, value=state_column)
+
+
+@router.get(
+    "/genres/by-region",
+    response_model=List[GenreByRegionResponse],
+    response_model_exclude_none=True
+)
 def get_genres_by_region(
+    request: Request,
     region: Optional[str] = Query(None, description="Filter by specific region"),
+    approx: bool = Query(False, description="Answer from the stratified sample with 95% confidence intervals"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default: all rows)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json, or ndjson to stream rows"),
     db: Session = Depends(get_db)
 ):
     """
     Get genre distribution by US region (Northeast, Southeast, Midwest, West)
+    Ordered by region and genre
     """
-    # Query all listen events
-    query = db.query(
-        ListenEvent.state,
-        ListenEvent.genre,
-        func.count(ListenEvent.id).label('stream_count')
-    ).group_by(ListenEvent.state, ListenEvent.genre)
+    after = decode_cursor(cursor, (str, str))
     
-    results = query.all()
+    if approx:
+        ensure_listen_sample(db)
+        etag = make_etag(request, watermark_id(db, SAMPLE_WATERMARK))
+    else:
+        etag = make_etag(request, max_id(db, ListenEvent))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
     
-    # Convert to dataframe for easier processing
-    df = pd.DataFrame(results, columns=['state', 'genre', 'stream_count'])
+    if approx:
+        # Estimate per (state, genre) stratum from the sample. Null genres
+        # are stratified as UNKNOWN; drop them as the exact query does
+        estimates = estimate_counts(db)
+        estimates = estimates[estimates['genre'] != SAMPLE_UNKNOWN]
+        region_genre = rollup_estimates(estimates, ['region', 'genre'])
+        region_genre = region_genre.sort_values(['region', 'genre'])
+        
+        # Filter by region if specified
+        if region:
+            region_genre = region_genre[region_genre['region'] == region]
+        if after:
+            region_genre = region_genre[
+                (region_genre['region'] > after[0])
+                | ((region_genre['region'] == after[0]) & (region_genre['genre'] > after[1]))
+            ]
+        if limit:
+            region_genre = region_genre.head(limit + 1)
+        
+        # Serialize plain rows; bounds are only present in approximate mode
+        rows = pd.DataFrame({
+            'region': region_genre['region'],
+            'genre': region_genre['genre'],
+            'stream_count': _counts(region_genre['estimate']),
+            'stream_count_low': _counts(region_genre['low']),
+            'stream_count_high': _counts(region_genre['high'])
+        }).to_dict('records')
+        
+        if format == "ndjson":
+            return ndjson_response([rows[:limit]], headers=cache_headers(etag))
+        rows, headers = paginate(request, rows, limit, lambda row: (row['region'], row['genre']))
+        return json_response(request, rows, etag, headers)
     
-    # Map states to regions
-    df['region'] = df['state'].map(STATE_TO_REGION)
+    # Streams by state and genre, summed up to regions, so the region CASE
+    # runs once per state rather than once per event
+    per_state = select(
+        ListenEvent.state,
+        ListenEvent.genre,
+        func.count(ListenEvent.id).label('stream_count')
+    ).where(ListenEvent.genre.isnot(None)).group_by(ListenEvent.state, ListenEvent.genre).subquery()
+    states = select(
+        _region_of(per_state.c.state).label('region'),
+        per_state.c.genre,
+        per_state.c.stream_count
+    ).subquery()
+    stmt = select(
+        states.c.region,
+        states.c.genre,
+        cast(func.sum(states.c.stream_count), Integer).label('stream_count')
+    ).where(states.c.region.isnot(None))
     
     # Filter by region if specified
     if region:
-        df = df[df['region'] == region]
-    
-    # Group by region and genre
-    region_genre = df.groupby(['region', 'genre'])['stream_count'].sum().reset_index()
-    
-    # Convert to response format
-    response = []
-    for _, row in region_genre.iterrows():
-        response.append(GenreByRegionResponse(
-            region=row['region'],
-            genre=row['genre'],
-            stream_count=int(row['stream_count'])
+        stmt = stmt.where(states.c.region == region)
+    if after:
+        stmt = stmt.where(or_(
+            states.c.region > after[0],
+            and_(states.c.region == after[0], states.c.genre > after[1])
         ))
+    stmt = stmt.group_by(states.c.region, states.c.genre).order_by(states.c.region, states.c.genre)
+    
+    if format == "ndjson":
+        if limit:
+            stmt = stmt.limit(limit)
+        batches = (
+            [{'region': r, 'genre': genre, 'stream_count': count} for r, genre, count in rows]
+            for rows in stream_query(db, stmt)
+        )
+        return ndjson_response(batches, headers=cache_headers(etag))
     
-    return response
+    if limit:
+        stmt = stmt.limit(limit + 1)
+    rows = [
+        {'region': r, 'genre': genre, 'stream_count': count}
+        for r, genre, count in db.execute(stmt)
+    ]
+    rows, headers = paginate(request, rows, limit, lambda row: (row['region'], row['genre']))
+    
+    return json_response(request, rows, etag, headers)
 
 
 @router.get("/subscribers/by-region", response_model=List[SubscriberByRegionResponse])
 def get_subscribers_by_region(
+    request: Request,
     region: Optional[str] = Query(None, description="Filter by specific region"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default: all rows)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json, or ndjson to stream rows"),
     db: Session = Depends(get_db)
 ):
     """
     Get subscriber distribution (paid vs free) by US region
+    Ordered by region and level
     """
-    # Query unique users by state and level
-    query = db.query(
+    after = decode_cursor(cursor, (str, str))
+    
+    etag = make_etag(request, max_id(db, StatusChangeEvent))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    
+    # Unique users by state and level, summed up to regions
+    per_state = select(
         StatusChangeEvent.state,
         StatusChangeEvent.level,
         func.count(func.distinct(StatusChangeEvent.userId)).label('user_count')
-    ).group_by(StatusChangeEvent.state, StatusChangeEvent.level)
-    
-    results = query.all()
-    
-    # Convert to dataframe
-    df = pd.DataFrame(results, columns=['state', 'level', 'user_count'])
-    
-    # Map states to regions
-    df['region'] = df['state'].map(STATE_TO_REGION)
+    ).group_by(StatusChangeEvent.state, StatusChangeEvent.level).subquery()
+    states = select(
+        _region_of(per_state.c.state).label('region'),
+        per_state.c.level,
+        per_state.c.user_count
+    ).subquery()
+    stmt = select(
+        states.c.region,
+        states.c.level,
+        cast(func.sum(states.c.user_count), Integer).label('user_count')
+    ).where(states.c.region.isnot(None), states.c.level.isnot(None))
     
     # Filter by region if specified
     if region:
-        df = df[df['region'] == region]
-    
-    # Group by region and level
-    region_level = df.groupby(['region', 'level'])['user_count'].sum().reset_index()
-    
-    # Convert to response format
-    response = []
-    for _, row in region_level.iterrows():
-        response.append(SubscriberByRegionResponse(
-            region=row['region'],
-            level=row['level'],
-            user_count=int(row['user_count'])
+        stmt = stmt.where(states.c.region == region)
+    if after:
+        stmt = stmt.where(or_(
+            states.c.region > after[0],
+            and_(states.c.region == after[0], states.c.level > after[1])
         ))
+    stmt = stmt.group_by(states.c.region, states.c.level).order_by(states.c.region, states.c.level)
     
-    return response
+    if format == "ndjson":
+        if limit:
+            stmt = stmt.limit(limit)
+        batches = (
+            [{'region': r, 'level': level, 'user_count': count} for r, level, count in rows]
+            for rows in stream_query(db, stmt)
+        )
+        return ndjson_response(batches, headers=cache_headers(etag))
+    
+    if limit:
+        stmt = stmt.limit(limit + 1)
+    rows = [
+        {'region': r, 'level': level, 'user_count': count}
+        for r, level, count in db.execute(stmt)
+    ]
+    rows, headers = paginate(request, rows, limit, lambda row: (row['region'], row['level']))
+    
+    return json_response(request, rows, etag, headers)
 
 
-@router.get("/artists/top", response_model=List[TopArtistResponse])
+@router.get(
+    "/artists/top",
+    response_model=List[TopArtistResponse],
+    response_model_exclude_none=True
+)
 def get_top_artists(
-    limit: int = Query(10, ge=1, le=100, description="Number of top artists to return"),
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default 10; ndjson streams every artist unless set)"),
+    approx: bool = Query(False, description="Answer from the stratified sample with 95% confidence intervals"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json, or ndjson to stream the leaderboard"),
     db: Session = Depends(get_db)
 ):
     """
     Get top artists by total stream count
+    Ties are ordered by artist name
     """
-    # Query artists with stream counts
-    query = db.query(
-        ListenEvent.artist,
-        func.count(ListenEvent.id).label('stream_count')
-    ).group_by(ListenEvent.artist).order_by(func.count(ListenEvent.id).desc()).limit(limit)
+    # The cursor holds (stream_count, artist, rank) of the last row served
+    after = decode_cursor(cursor, (int, str, int))
+    last_rank = after[2] if after else 0
+    if limit is None and format == "json":
+        limit = 10
+    
+    if approx:
+        ensure_listen_sample(db)
+        etag = make_etag(request, watermark_id(db, SAMPLE_WATERMARK))
+    else:
+        etag = make_etag(request, max_id(db, ListenEvent))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
     
-    results = query.all()
+    def page_key(row):
+        return row['stream_count'], row['artist'], row['rank']
     
-    # Convert to response format with ranking
-    response = []
-    for rank, (artist, stream_count) in enumerate(results, 1):
-        response.append(TopArtistResponse(
-            artist=artist,
-            stream_count=stream_count,
-            rank=rank
+    if approx:
+        df = rollup_estimates(estimate_counts(db, ['artist']), ['artist'])
+        df = df.assign(stream_count=_counts(df['estimate']))
+        df = df.sort_values(['stream_count', 'artist'], ascending=[False, True])
+        if after:
+            df = df[(df['stream_count'] < after[0]) | ((df['stream_count'] == after[0]) & (df['artist'] > after[1]))]
+        if limit:
+            df = df.head(limit + 1)
+        
+        rows = pd.DataFrame({
+            'artist': df['artist'],
+            'stream_count': df['stream_count'],
+            'rank': range(last_rank + 1, last_rank + len(df) + 1),
+            'stream_count_low': _counts(df['low']),
+            'stream_count_high': _counts(df['high'])
+        }).to_dict('records')
+        
+        if format == "ndjson":
+            return ndjson_response([rows[:limit]], headers=cache_headers(etag))
+        rows, headers = paginate(request, rows, limit, page_key)
+        return json_response(request, rows, etag, headers)
+    
+    # Artists with stream counts, resuming after the cursor
+    stream_count = func.count(ListenEvent.id)
+    stmt = select(
+        ListenEvent.artist,
+        stream_count.label('stream_count')
+    ).where(ListenEvent.artist.isnot(None)).group_by(ListenEvent.artist)
+    if after:
+        stmt = stmt.having(or_(
+            stream_count < after[0],
+            and_(stream_count == after[0], ListenEvent.artist > after[1])
         ))
+    stmt = stmt.order_by(stream_count.desc(), ListenEvent.artist)
+    
+    if format == "ndjson":
+        if limit:
+            stmt = stmt.limit(limit)
+        
+        def batches():
+            rank = last_rank
+            for rows in stream_query(db, stmt):
+                batch = []
+                for artist, count in rows:
+                    rank += 1
+                    batch.append({'artist': artist, 'stream_count': count, 'rank': rank})
+                yield batch
+        
+        return ndjson_response(batches(), headers=cache_headers(etag))
     
-    return response
+    # Serialize with ranking
+    response = [
+        {'artist': artist, 'stream_count': count, 'rank': rank}
+        for rank, (artist, count) in enumerate(db.execute(stmt.limit(limit + 1)), last_rank + 1)
+    ]
+    response, headers = paginate(request, response, limit, page_key)
+    
+    return json_response(request, response, etag, headers)
 
 
-@router.get("/artists/rising", response_model=List[RisingArtistResponse])
+@router.get(
+    "/artists/rising",
+    response_model=List[RisingArtistResponse],
+    response_model_exclude_none=True
+)
 def get_rising_artists(
+    request: Request,
     limit: int = Query(10, ge=1, le=100, description="Number of rising artists to return"),
+    approx: bool = Query(False, description="Answer from the stratified sample with 95% confidence intervals"),
     db: Session = Depends(get_db)
 ):
     """
@@ -140,59 +338,269 @@ def get_rising_artists(
     """
     from datetime import datetime, timedelta
     
-    # Get current time and calculate time windows
-    now = datetime.utcnow()
+    # Get current time and calculate time windows; whole minutes so that
+    # repeated polls within a minute share an ETag
+    now = datetime.utcnow().replace(second=0, microsecond=0)
     recent_start = now - timedelta(days=7)
     previous_start = now - timedelta(days=14)
     
-    # Query recent period (last 7 days)
-    recent_query = db.query(
-        ListenEvent.artist,
-        func.count(ListenEvent.id).label('stream_count')
-    ).filter(
-        ListenEvent.timestamp >= recent_start
-    ).group_by(ListenEvent.artist)
+    if approx:
+        ensure_listen_sample(db)
+        etag = make_etag(request, now.isoformat(), watermark_id(db, SAMPLE_WATERMARK))
+    else:
+        etag = make_etag(request, now.isoformat(), max_id(db, ListenEvent))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
     
-    recent_results = recent_query.all()
-    recent_df = pd.DataFrame(recent_results, columns=['artist', 'current_streams'])
+    if approx:
+        recent_df = rollup_estimates(
+            estimate_counts(db, ['artist'], start=recent_start), ['artist']
+        ).rename(columns={
+            'estimate': 'current_streams', 'low': 'current_low', 'high': 'current_high'
+        })
+        previous_df = rollup_estimates(
+            estimate_counts(db, ['artist'], start=previous_start, end=recent_start), ['artist']
+        ).rename(columns={
+            'estimate': 'previous_streams', 'low': 'previous_low', 'high': 'previous_high'
+        })
+    else:
+        # Query recent period (last 7 days)
+        recent_query = db.query(
+            ListenEvent.artist,
+            func.count(ListenEvent.id).label('stream_count')
+        ).filter(
+            ListenEvent.timestamp >= recent_start,
+            ListenEvent.artist.isnot(None)
+        ).group_by(ListenEvent.artist)
     
-    # Query previous period (8-14 days ago)
-    previous_query = db.query(
-        ListenEvent.artist,
-        func.count(ListenEvent.id).label('stream_count')
-    ).filter(
-        ListenEvent.timestamp >= previous_start,
-        ListenEvent.timestamp < recent_start
-    ).group_by(ListenEvent.artist)
+        recent_results = recent_query.all()
+        recent_df = pd.DataFrame(recent_results, columns=['artist', 'current_streams'])
     
-    previous_results = previous_query.all()
-    previous_df = pd.DataFrame(previous_results, columns=['artist', 'previous_streams'])
+        # Query previous period (8-14 days ago)
+        previous_query = db.query(
+            ListenEvent.artist,
+            func.count(ListenEvent.id).label('stream_count')
+        ).filter(
+            ListenEvent.timestamp >= previous_start,
+            ListenEvent.timestamp < recent_start,
+            ListenEvent.artist.isnot(None)
+        ).group_by(ListenEvent.artist)
+    
+        previous_results = previous_query.all()
+        previous_df = pd.DataFrame(previous_results, columns=['artist', 'previous_streams'])
     
     # Merge dataframes
     df = recent_df.merge(previous_df, on='artist', how='left')
     df['previous_streams'] = df['previous_streams'].fillna(0)
+    if approx:
+        df[['previous_low', 'previous_high']] = df[['previous_low', 'previous_high']].fillna(0)
     
     # Calculate growth rate (avoid division by zero)
-    df['growth_rate'] = df.apply(
-        lambda row: (
-            ((row['current_streams'] - row['previous_streams']) / row['previous_streams'] * 100)
-            if row['previous_streams'] > 0
-            else (100.0 if row['current_streams'] > 0 else 0.0)
-        ),
-        axis=1
+    current, previous = df['current_streams'], df['previous_streams']
+    df['growth_rate'] = np.where(
+        previous > 0,
+        (current - previous) / previous.where(previous > 0, 1) * 100,
+        np.where(current > 0, 100.0, 0.0)
     )
     
     # Sort by growth rate and limit
     df = df.sort_values('growth_rate', ascending=False).head(limit)
     
-    # Convert to response format
-    response = []
-    for _, row in df.iterrows():
-        response.append(RisingArtistResponse(
-            artist=row['artist'],
-            growth_rate=float(row['growth_rate']),
-            current_streams=int(row['current_streams']),
-            previous_streams=int(row['previous_streams'])
-        ))
+    # Serialize plain rows; bounds are only present in approximate mode
+    rows = pd.DataFrame({
+        'artist': df['artist'],
+        'growth_rate': df['growth_rate'].astype(float),
+        'current_streams': _counts(df['current_streams']),
+        'previous_streams': _counts(df['previous_streams'])
+    })
+    if approx:
+        for column in ['current', 'previous']:
+            rows[f'{column}_streams_low'] = _counts(df[f'{column}_low'])
+            rows[f'{column}_streams_high'] = _counts(df[f'{column}_high'])
+    
+    return json_response(request, rows.to_dict('records'), etag)
+
+
+@router.get(
+    "/geo/drilldown",
+    response_model=List[GeoDrillDownResponse],
+    response_model_exclude_none=True
+)
+def get_geo_drilldown(
+    request: Request,
+    dimension: str = Query("genre", pattern="^(genre|level|artist)$", description="Break streams down by genre, level or artist"),
+    level: str = Query("region", pattern="^(region|state|zip)$", description="Geo level to report at"),
+    region: Optional[str] = Query(None, description="Restrict to one region"),
+    state: Optional[str] = Query(None, description="Restrict to one state (level state or zip)"),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="Top values to keep per geo member"),
+    db: Session = Depends(get_db)
+):
+    """
+    Drill down stream counts from region to state to ZIP
+    Answered from the in-memory geo cube, not from raw listen events
+    """
+    if state and level == "region":
+        raise HTTPException(status_code=400, detail="A state filter needs level 'state' or 'zip'")
+    
+    cube = get_geo_cube(db)
+    etag = make_etag(request, cube.total_streams)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    
+    df = cube.drill_down(dimension, level=level, region=region, state=state, limit=limit)
     
-    return response
+    # Serialize down to the requested geo level only
+    rows = df.rename(columns={dimension: 'value'}).assign(stream_count=_counts(df['stream_count']))
+    columns = list(GEO_LEVELS[:GEO_LEVELS.index(level) + 1]) + ['value', 'stream_count']
+    
+    return json_response(request, rows[columns].to_dict('records'), etag)
+
+
+@router.get("/durations/quantiles", response_model=DurationQuantileResponse)
+def get_duration_quantiles(
+    request: Request,
+    genre: Optional[str] = Query(None, description="Filter by genre"),
+    region: Optional[str] = Query(None, description="Filter by specific region"),
+    start: Optional[date] = Query(None, description="First day of the slice (inclusive)"),
+    end: Optional[date] = Query(None, description="Last day of the slice (inclusive)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get p50/p90/p99 track duration and total listening time in milliseconds
+    Merged from per genre/region/day t-digest sketches
+    """
+    sketches = get_duration_sketches(db)
+    etag = make_etag(request, sketches.listen_count)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    
+    digest = sketches.query(genre=genre, region=region, start=start, end=end)
+    
+    def to_ms(seconds):
+        return None if seconds is None else int(round(seconds * 1000))
+    
+    return json_response(request, {
+        'listen_count': int(digest.count),
+        'p50_ms': to_ms(digest.quantile(0.5)),
+        'p90_ms': to_ms(digest.quantile(0.9)),
+        'p99_ms': to_ms(digest.quantile(0.99)),
+        'listening_time_ms': to_ms(digest.total)
+    }, etag)
+
+
+@router.get(
+    "/auth/failure-rates",
+    response_model=AuthFailureRatesResponse,
+    response_model_exclude_none=True
+)
+def get_auth_failure_rates(
+    window: Optional[str] = Query(None, pattern="^(1m|15m|1h)$", description="Only report one window (1m, 15m or 1h)"),
+    region: Optional[str] = Query(None, description="Filter by specific region")
+):
+    """
+    Get current auth failure rates per state and region
+    Read from in-memory sliding-window counters, not from auth_events
+    """
+    states, regions = auth_monitor.rates(window)
+    
+    # Filter by region if specified
+    if region:
+        states = [row for row in states if row['region'] == region]
+        regions = [row for row in regions if row['region'] == region]
+    
+    return AuthFailureRatesResponse(
+        threshold=auth_monitor.threshold,
+        min_attempts=auth_monitor.min_attempts,
+        states=states,
+        regions=regions,
+        recent_alerts=list(auth_monitor.alerts)
+    )
+
+
+@router.get("/conversion/cohorts", response_model=List[CohortConversionResponse])
+def get_cohort_conversion(
+    request: Request,
+    granularity: str = Query("week", pattern="^(day|week)$", description="Group cohorts by first-seen day or week"),
+    region: Optional[str] = Query(None, description="Filter by specific region"),
+    start: Optional[date] = Query(None, description="First cohort day (inclusive)"),
+    end: Optional[date] = Query(None, description="Last cohort day (inclusive)"),
+    within_days: Optional[int] = Query(None, ge=0, description="Only count conversions within this many days of first seen"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get free to paid conversion by first-seen cohort and region
+    Served from precomputed per-cohort daily counts
+    """
+    ensure_cohorts(db)
+    etag = make_etag(request, watermark_id(db, AUTH_WATERMARK), watermark_id(db, STATUS_WATERMARK))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    
+    df = cohort_conversion(
+        db, granularity=granularity, region=region, start=start, end=end, within_days=within_days
+    )
+    
+    rows = df.assign(
+        users=_counts(df['users']),
+        conversions=_counts(df['conversions']),
+        conversion_rate=df['conversion_rate'].astype(float)
+    )
+    columns = ['cohort', 'region', 'users', 'conversions', 'conversion_rate']
+    
+    return json_response(request, rows[columns].to_dict('records'), etag)
+
+
+@router.get("/streams/hourly", response_model=List[HourlyStreamsResponse])
+def get_hourly_streams(
+    request: Request,
+    genre: Optional[str] = Query(None, description="Filter by genre"),
+    region: Optional[str] = Query(None, description="Filter by specific region"),
+    start: Optional[date] = Query(None, description="First day (inclusive)"),
+    end: Optional[date] = Query(None, description="Last day (inclusive)"),
+):
+    """
+    Get stream counts by hour of day (UTC)
+    Scanned from the memory-mapped segment store, not from listen_events
+    """
+    store = get_segment_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Segment store is not configured (set SEGMENT_DIR)")
+    
+    # Segments are immutable and numbered in write order, so the newest one
+    # identifies the data
+    segments = store.segments()
+    etag = make_etag(request, segments[-1].name if segments else None)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    
+    filters = {}
+    if genre:
+        filters['genre'] = [genre]
+    if region:
+        filters['state'] = [state for state, name in STATE_TO_REGION.items() if name == region]
+    
+    counts = count_by_hour(
+        store,
+        start=pd.Timestamp(start) if start else None,
+        end=pd.Timestamp(end) + pd.Timedelta(days=1) if end else None,
+        filters=filters
+    )
+    
+    response = [{'hour': hour, 'stream_count': int(count)} for hour, count in enumerate(counts)]
+    return json_response(request, response, etag)
+
+
+@router.get("/jobs", response_model=List[JobStatusResponse])
+def get_jobs(request: Request):
+    """
+    Get run time, lag and failure counts of the background refresh jobs
+    """
+    scheduler = getattr(request.app.state, "scheduler", None)
+    if scheduler is None:
+        return []
+    return scheduler.status()
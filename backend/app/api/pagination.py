@@ -0,0 +1,88 @@
+"""
+Keyset pagination and NDJSON streaming for large analytics results
+
+Pages are ordered on a unique key, and the cursor holds the key of the last
+row served. The next page starts strictly after it, so deep pages cost the
+same as the first and don't shift when rows are added. The cursor is handed
+out in the X-Next-Cursor header (and a Link rel="next" header), which keeps
+JSON bodies a plain list.
+
+NDJSON responses read from a server-side cursor in batches of
+STREAM_BATCH_SIZE rows and write each batch before fetching the next, so
+memory stays flat however many rows are streamed.
+"""
+
+import base64
+import binascii
+import os
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    """Opaque cursor for the key of the last row of a page"""
+    return base64.urlsafe_b64encode(orjson.dumps(list(key))).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], types: Sequence[type]) -> Optional[Tuple]:
+    """Key stored in a cursor, checked against the expected types"""
+    if cursor is None:
+        return None
+    try:
+        key = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        key = None
+    if (
+        not isinstance(key, list)
+        or len(key) != len(types)
+        or not all(isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(key, types))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(key)
+
+
+def paginate(request: Request, rows: List[dict], limit: Optional[int], key) -> Tuple[List[dict], dict]:
+    """Trim a page fetched with limit + 1 rows and build its next-page headers
+
+    The extra row only signals that another page exists.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, {}
+    rows = rows[:limit]
+    cursor = encode_cursor(key(rows[-1]))
+    url = request.url.include_query_params(cursor=cursor)
+    return rows, {"X-Next-Cursor": cursor, "Link": f'<{url}>; rel="next"'}
+
+
+def stream_query(db: Session, stmt, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List]:
+    """Batches of rows from a server-side cursor
+
+    Uses its own session on the request's engine: a streaming body is still
+    being sent after the request's session has been closed.
+    """
+    session = Session(bind=db.get_bind())
+    try:
+        result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        session.close()
+
+
+def ndjson_response(batches: Iterable[Iterable[dict]], headers: Optional[dict] = None) -> StreamingResponse:
+    """Stream batches of rows as newline-delimited JSON"""
+    def generate():
+        for batch in batches:
+            chunk = b"".join(orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n" for row in batch)
+            if chunk:
+                yield chunk
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,129 @@
+"""
+Conditional, compressed JSON responses for the analytics endpoints
+
+ETags combine the request URL with a version of the data the endpoint
+reads: the newest event id, an incremental job's watermark or the event
+count of an in-memory structure. The version is one cheap lookup, so a
+matching If-None-Match is answered with 304 before any aggregation runs.
+
+Bodies are serialized with orjson straight from plain row dicts, skipping
+per-row pydantic models, and compressed with brotli or gzip once they reach
+COMPRESS_MIN_BYTES.
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models.models import Watermark
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Clients may reuse a response but must revalidate it with the ETag first
+CACHE_CONTROL = "no-cache"
+
+
+def max_id(db: Session, model) -> int:
+    """Newest row id of an append-only event table"""
+    return db.query(func.max(model.id)).scalar() or 0
+
+
+def watermark_id(db: Session, name: str) -> int:
+    """Last id folded in by an incremental job"""
+    watermark = db.get(Watermark, name)
+    if watermark is None:
+        return 0
+    return watermark.last_id or 0
+
+
+def make_etag(request: Request, *version: Any) -> str:
+    """Weak ETag for this URL at the given data version"""
+    digest = hashlib.sha1(request.url.path.encode())
+    digest.update(repr(sorted(request.query_params.multi_items())).encode())
+    digest.update(repr(version).encode())
+    return f'W/"{digest.hexdigest()[:24]}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 response when If-None-Match already holds the ETag, else None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {_opaque(tag) for tag in header.split(",")}
+    if "*" not in tags and _opaque(etag) not in tags:
+        return None
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def cache_headers(etag: Optional[str]) -> dict:
+    headers = {"Vary": "Accept-Encoding"}
+    if etag is not None:
+        headers["ETag"] = etag
+        headers["Cache-Control"] = CACHE_CONTROL
+    return headers
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred supported content coding from an Accept-Encoding header"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: Optional[str]) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def json_response(
+    request: Request,
+    content: Any,
+    etag: Optional[str] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    """Serialize plain rows with orjson, compressing larger bodies"""
+    body = orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    headers = {**cache_headers(etag), **(headers or {})}
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        coding = accepted_encoding(request.headers.get("accept-encoding", ""))
+        if coding is not None:
+            body = compress(body, coding)
+            headers["Content-Encoding"] = coding
+
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,267 @@
+"""
+Ingest-time deduplication of listen events
+
+listen_events has no natural key, so replaying an import used to insert
+every row again. Rows are now keyed on (userId, timestamp, song). A Bloom
+filter over the keys already in the table answers "definitely new" for most
+rows. Only rows the filter flags as possible duplicates are checked exactly
+against the table.
+
+The filter is saved to DEDUP_FILTER_PATH together with the highest
+listen_events id it covers and the database it was built from. On open,
+rows inserted since then are added by id. The filter is rebuilt from the
+table if the table shrank, the database changed or the filter is full.
+Rebuilds double the capacity. A crash between insert and save leaves a file
+that covers fewer ids than the table, which the next open catches up on.
+
+Ids are assigned at insert but become visible at commit, so a concurrent
+ingest's row can appear below last_id after the filter moved past it. The
+filter keeps the ids missing among the last DEDUP_LATE_ID_WINDOW ids it
+read, and each catch-up adds any of them that have since committed.
+Deleted rows only cost an exact check; they never block an insert.
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from ..models.models import ListenEvent
+from ..storage.bloom import BloomFilter
+
+DEDUP_FILTER_PATH = os.getenv("DEDUP_FILTER_PATH", "listen_events.bloom")
+DEDUP_CAPACITY = int(os.getenv("DEDUP_CAPACITY", "1000000"))
+DEDUP_FP_RATE = float(os.getenv("DEDUP_FP_RATE", "0.001"))
+DEDUP_LATE_ID_WINDOW = int(os.getenv("DEDUP_LATE_ID_WINDOW", "1000"))
+
+KEY_COLUMNS = ["userId", "timestamp", "song"]
+
+# Candidates per exact-check query, to stay under bind parameter limits
+EXACT_CHECK_CHUNK = 400
+
+# Above this many candidates the exact check scans their time range instead
+EXACT_SCAN_THRESHOLD = 20000
+
+
+def listen_keys(events: pd.DataFrame) -> pd.DataFrame:
+    """Dedup keys with the dtypes the filter hashes: strings ('' for null) and epoch microseconds"""
+    keys = {}
+    for column in ("userId", "song"):
+        values = events[column]
+        keys[column] = values.astype(str).where(values.notna(), "").to_numpy(dtype=object)
+    # The table keeps microseconds, so keys do too
+    timestamps = pd.to_datetime(events["timestamp"]).dt.floor("us")
+    keys["timestamp"] = timestamps.to_numpy(dtype="datetime64[us]").astype(np.int64)
+    return pd.DataFrame(keys, columns=KEY_COLUMNS)
+
+
+@dataclass
+class DedupStats:
+    rows: int = 0
+    duplicates: int = 0
+    candidates: int = 0
+    false_positives: int = 0
+    seconds: float = 0.0
+    expected_fp_rate: float = 0.0
+
+    @property
+    def false_positive_rate(self) -> float:
+        """Share of new rows the filter wrongly flagged"""
+        new_rows = self.rows - self.duplicates
+        return self.false_positives / new_rows if new_rows else 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Dedup: {self.rows} rows, {self.duplicates} duplicates skipped, "
+            f"{self.candidates} filter hits, {self.false_positives} false positives "
+            f"({self.false_positive_rate:.4%} observed, {self.expected_fp_rate:.4%} expected), "
+            f"{self.rows_per_second:,.0f} rows/s"
+        )
+
+
+def _database_id(db: Session) -> str:
+    return db.get_bind().url.render_as_string(hide_password=True)
+
+
+class ListenDedup:
+    """Bloom filter over listen_events keys, kept in step with the table"""
+
+    def __init__(self, bloom: BloomFilter, path: Optional[str] = None, fp_rate: float = DEDUP_FP_RATE):
+        self.bloom = bloom
+        self.path = path
+        self.fp_rate = fp_rate
+        self.stats = DedupStats()
+
+    @property
+    def last_id(self) -> int:
+        return self.bloom.meta.get("last_id", 0)
+
+    @classmethod
+    def open(
+        cls,
+        db: Session,
+        path: Optional[str] = DEDUP_FILTER_PATH,
+        capacity: int = DEDUP_CAPACITY,
+        fp_rate: float = DEDUP_FP_RATE,
+    ) -> "ListenDedup":
+        """Load the saved filter (or start one) and catch it up with the table"""
+        bloom = BloomFilter.load(path) if path else None
+        if bloom is None or bloom.meta.get("database") != _database_id(db):
+            bloom = BloomFilter(capacity, fp_rate)
+            bloom.meta = {"database": _database_id(db), "last_id": 0}
+
+        dedup = cls(bloom, path, fp_rate)
+        top = db.scalar(select(func.max(ListenEvent.id))) or 0
+        if top < dedup.last_id:
+            dedup.rebuild(db, bloom.capacity)
+        else:
+            dedup._add_from_table(db)
+        dedup.reserve(db, 0)
+        return dedup
+
+    def rebuild(self, db: Session, capacity: int):
+        """Replace the filter with one built from the whole table"""
+        bloom = BloomFilter(capacity, self.fp_rate)
+        bloom.meta = {"database": _database_id(db), "last_id": 0}
+        self.bloom = bloom
+        self._add_from_table(db)
+
+    def reserve(self, db: Session, rows: int):
+        """Rebuild at twice the size if `rows` more keys would overfill the filter"""
+        needed = self.bloom.count + rows
+        if needed > self.bloom.capacity:
+            self.rebuild(db, max(2 * needed, self.bloom.capacity))
+
+    def _add_from_table(self, db: Session, batch_size: int = 50000):
+        """Add keys of rows with ids above the filter's last_id, or missing when it passed them"""
+        previous = self.last_id
+        missing = set(self.bloom.meta.get("missing", []))
+        condition = ListenEvent.id > previous
+        if missing:
+            condition = or_(condition, ListenEvent.id.in_(sorted(missing)))
+        stmt = (
+            select(ListenEvent.id, ListenEvent.userId, ListenEvent.timestamp, ListenEvent.song)
+            .where(condition)
+            .order_by(ListenEvent.id)
+            .execution_options(yield_per=batch_size)
+        )
+        recent = deque(maxlen=DEDUP_LATE_ID_WINDOW)
+        for rows in db.execute(stmt).partitions():
+            frame = pd.DataFrame(rows, columns=["id", "userId", "timestamp", "song"])
+            self.bloom.add(listen_keys(frame))
+            ids = frame["id"].to_numpy()
+            missing.difference_update(ids[ids <= previous].tolist())
+            recent.extend(ids[ids > previous].tolist())
+            self.bloom.meta["last_id"] = max(self.last_id, int(ids.max()))
+
+        # Ids skipped in the trailing window may belong to uncommitted rows
+        last_id = self.last_id
+        window_start = max(previous + 1, last_id - DEDUP_LATE_ID_WINDOW + 1)
+        missing = {i for i in missing if i > last_id - DEDUP_LATE_ID_WINDOW}
+        missing.update(set(range(window_start, last_id + 1)).difference(recent))
+        self.bloom.meta["missing"] = sorted(missing)
+
+    def _existing(self, db: Session, candidates: pd.DataFrame) -> np.ndarray:
+        """Exact check: which candidate keys are already in the table
+
+        Candidates must be unique. Table rows are matched against them a
+        batch at a time, so only the candidates are held in memory.
+        """
+        existing = np.zeros(len(candidates), dtype=bool)
+        if len(candidates) == 0:
+            return existing
+
+        index = pd.MultiIndex.from_frame(candidates)
+
+        def mark(rows):
+            found = listen_keys(pd.DataFrame(rows, columns=KEY_COLUMNS))
+            positions = index.get_indexer(pd.MultiIndex.from_frame(found))
+            existing[positions[positions >= 0]] = True
+
+        columns = [ListenEvent.userId, ListenEvent.timestamp, ListenEvent.song]
+        if len(candidates) > EXACT_SCAN_THRESHOLD:
+            # Replays flag most rows; one range scan beats many lookups
+            first, last = pd.to_datetime([candidates["timestamp"].min(), candidates["timestamp"].max()], unit="us")
+            stmt = (
+                select(*columns)
+                .where(ListenEvent.timestamp.between(first.to_pydatetime(), last.to_pydatetime()))
+                .execution_options(yield_per=50000)
+            )
+            for rows in db.execute(stmt).partitions():
+                mark(rows)
+        else:
+            for start in range(0, len(candidates), EXACT_CHECK_CHUNK):
+                chunk = candidates.iloc[start:start + EXACT_CHECK_CHUNK]
+                users = [user for user in chunk["userId"].unique() if user != ""]
+                user_filter = ListenEvent.userId.in_(users)
+                if (chunk["userId"] == "").any():
+                    user_filter = or_(user_filter, ListenEvent.userId.is_(None), ListenEvent.userId == "")
+                timestamps = pd.to_datetime(chunk["timestamp"].unique(), unit="us").to_pydatetime().tolist()
+
+                stmt = select(*columns).where(user_filter, ListenEvent.timestamp.in_(timestamps))
+                rows = db.execute(stmt).all()
+                if rows:
+                    mark(rows)
+        return existing
+
+    def filter(self, db: Session, events: pd.DataFrame):
+        """Split off rows already in the table or repeated within `events`
+
+        Returns (new events, their keys, stats for this call).
+        """
+        started = time.perf_counter()
+        keys = listen_keys(events)
+
+        # Repeats inside one import are exact duplicates of an earlier row
+        duplicate = keys.duplicated().to_numpy()
+        possible = self.bloom.contains(keys) & ~duplicate
+        existing = self._existing(db, keys[possible])
+        duplicate[possible] = existing
+
+        stats = DedupStats(
+            rows=len(events),
+            duplicates=int(duplicate.sum()),
+            candidates=int(possible.sum()),
+            false_positives=int((~existing).sum()),
+            seconds=time.perf_counter() - started,
+            expected_fp_rate=self.bloom.expected_fp_rate(),
+        )
+        self._accumulate(stats)
+        return events[~duplicate], keys[~duplicate], stats
+
+    def _accumulate(self, stats: DedupStats):
+        total = self.stats
+        total.rows += stats.rows
+        total.duplicates += stats.duplicates
+        total.candidates += stats.candidates
+        total.false_positives += stats.false_positives
+        total.seconds += stats.seconds
+        total.expected_fp_rate = stats.expected_fp_rate
+
+    def record(self, db: Session, keys: pd.DataFrame):
+        """Add keys of rows just inserted and advance last_id"""
+        top = db.scalar(select(func.max(ListenEvent.id))) or 0
+        if top - self.last_id == len(keys):
+            self.bloom.add(keys)
+            self.bloom.meta["last_id"] = top
+            if self.bloom.meta.get("missing"):
+                # Only looks up the missing ids, which may have committed since
+                self._add_from_table(db)
+        else:
+            # Someone else inserted too, or the ids skipped. Read every row
+            # past last_id back instead, so each key is counted once
+            self._add_from_table(db)
+
+    def save(self):
+        if self.path:
+            self.bloom.save(self.path)
@@ -0,0 +1,88 @@
+"""
+Bulk ingest of listen events
+
+Rows already in listen_events (same userId, timestamp and song) are
+skipped; see dedup.py. New rows are inserted with a single executemany per
+batch. When SEGMENT_DIR is set they are also appended to the segment store.
+The API's duration sketches pick the rows up by id on their next refresh.
+
+Usage:
+    python -m app.db.ingest path/to/listen_events.csv
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..models.models import ListenEvent
+from ..storage.segments import get_segment_store
+from .dedup import ListenDedup
+
+LISTEN_COLUMNS = ["artist", "song", "duration", "userId", "state", "zip", "level", "genre", "timestamp"]
+
+
+def ingest_listen_events(
+    db: Session,
+    events: pd.DataFrame,
+    batch_size: int = 10000,
+    dedup: Optional[ListenDedup] = None,
+) -> int:
+    """Insert new listen events; returns rows inserted
+
+    Duplicates are checked against `dedup`, or against the filter saved at
+    DEDUP_FILTER_PATH when none is given. Its stats cover every call.
+    """
+    events = events.reindex(columns=LISTEN_COLUMNS)
+    # Stamp rows here rather than relying on the column default so the
+    # segment store, the dedup keys and the table agree on the event time
+    events["timestamp"] = pd.to_datetime(events["timestamp"]).fillna(pd.Timestamp(datetime.utcnow()))
+
+    owned = dedup is None
+    if owned:
+        dedup = ListenDedup.open(db)
+    dedup.reserve(db, len(events))
+    events, keys, _ = dedup.filter(db, events)
+    events = events.astype(object).where(events.notna(), None)
+
+    inserted = 0
+    for start in range(0, len(events), batch_size):
+        batch = events.iloc[start:start + batch_size]
+        records = batch.to_dict("records")
+        for record in records:
+            record["timestamp"] = record["timestamp"].to_pydatetime()
+        db.execute(insert(ListenEvent), records)
+        db.commit()
+        dedup.record(db, keys.iloc[start:start + batch_size])
+        inserted += len(records)
+
+    # Keep the segment store in step when one is configured
+    store = get_segment_store()
+    if store is not None:
+        store.append(events)
+
+    if owned:
+        dedup.save()
+    return inserted
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import SessionLocal
+
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.db.ingest path/to/listen_events.csv")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        dedup = ListenDedup.open(db)
+        count = ingest_listen_events(db, pd.read_csv(sys.argv[1]), dedup=dedup)
+        dedup.save()
+        print(f"Ingested {count} listen events")
+        print(dedup.stats.report())
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+"""
+Refresh jobs that keep derived structures warm off the request path
+
+Intervals are configured in seconds through environment variables.
+"""
+
+import os
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from ..analytics import cohorts, sampling
+from ..analytics.auth_monitor import auth_monitor
+from ..analytics.geo_cube import refresh_geo_cube
+from ..analytics.sketches import refresh_duration_sketches
+from ..db.database import SessionLocal
+from .scheduler import Scheduler
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+
+GEO_CUBE_REFRESH_SECONDS = float(os.getenv("GEO_CUBE_REFRESH_SECONDS", "300"))
+DURATION_SKETCH_REFRESH_SECONDS = float(os.getenv("DURATION_SKETCH_REFRESH_SECONDS", "900"))
+LISTEN_SAMPLE_REFRESH_SECONDS = float(os.getenv("LISTEN_SAMPLE_REFRESH_SECONDS", "300"))
+AUTH_MONITOR_POLL_SECONDS = float(os.getenv("AUTH_MONITOR_POLL_SECONDS", "5"))
+COHORT_REFRESH_SECONDS = float(os.getenv("COHORT_REFRESH_SECONDS", "600"))
+
+
+def with_session(func: Callable[[Session], object]) -> Callable[[], None]:
+    """Wrap a db function as a job with its own session"""
+    def run():
+        db = SessionLocal()
+        try:
+            func(db)
+        finally:
+            db.close()
+    run.__name__ = func.__name__
+    return run
+
+
+def build_scheduler() -> Scheduler:
+    scheduler = Scheduler()
+
+    # In-memory caches live in each worker, so every worker refreshes its own
+    scheduler.add_job(
+        "geo_cube", with_session(refresh_geo_cube),
+        GEO_CUBE_REFRESH_SECONDS, jitter=SCHEDULER_JITTER
+    )
+    scheduler.add_job(
+        "duration_sketches", with_session(refresh_duration_sketches),
+        DURATION_SKETCH_REFRESH_SECONDS, jitter=SCHEDULER_JITTER
+    )
+    scheduler.add_job(
+        "auth_monitor", with_session(auth_monitor.poll),
+        AUTH_MONITOR_POLL_SECONDS, jitter=SCHEDULER_JITTER
+    )
+
+    # Shared tables, so only one worker may extend them at a time
+    scheduler.add_job(
+        sampling.REFRESH_JOB, with_session(sampling.refresh_listen_sample),
+        LISTEN_SAMPLE_REFRESH_SECONDS, jitter=SCHEDULER_JITTER, exclusive=True
+    )
+    scheduler.add_job(
+        cohorts.REFRESH_JOB, with_session(cohorts.refresh_cohorts),
+        COHORT_REFRESH_SECONDS, jitter=SCHEDULER_JITTER, exclusive=True
+    )
+
+    return scheduler
@@ -0,0 +1,207 @@
+"""
+In-process asyncio scheduler for periodic refresh jobs
+
+Each job runs on its own interval with random jitter so workers started
+together drift apart. A job never overlaps with itself inside a process,
+and jobs marked exclusive also take a host-wide file lock so only one
+worker runs them at a time; a worker that finds the lock held skips that
+run. Job functions are synchronous and run in a worker thread. Code off the
+scheduler that must not overlap an exclusive job takes job_lock.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_DIR = os.getenv("SCHEDULER_LOCK_DIR", "/tmp/ziplisten-locks")
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    skipped: int = 0
+    last_started_at: Optional[datetime] = None
+    last_success_at: Optional[datetime] = None
+    last_duration_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], object]
+    interval: float
+    jitter: float = 0.1
+    exclusive: bool = False
+    run_on_start: bool = True
+    stats: JobStats = field(default_factory=JobStats)
+    running: bool = False
+
+    def next_delay(self) -> float:
+        """Seconds until the next run, with +/- jitter applied"""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+
+class _FileLock:
+    """Non-blocking flock on a per-job file, shared by all workers on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+@contextmanager
+def job_lock(name: str, lock_dir: str = DEFAULT_LOCK_DIR) -> Iterator[None]:
+    """Hold an exclusive job's lock, waiting while a run of it finishes"""
+    lock = _FileLock(os.path.join(lock_dir, f"{name}.lock"))
+    lock.acquire(blocking=True)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+class Scheduler:
+    def __init__(self, lock_dir: str = DEFAULT_LOCK_DIR):
+        self.lock_dir = lock_dir
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], object],
+        interval: float,
+        jitter: float = 0.1,
+        exclusive: bool = False,
+        run_on_start: bool = True,
+    ) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"Job '{name}' is already registered")
+        if interval <= 0:
+            raise ValueError(f"Job '{name}' needs a positive interval")
+        job = Job(name, func, interval, jitter, exclusive, run_on_start)
+        self.jobs[name] = job
+        return job
+
+    async def start(self):
+        self._started_at = time.time()
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"job:{job.name}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self, job: Job):
+        if job.run_on_start:
+            # Spread the first run over the jitter window
+            delay = random.uniform(0, job.interval * job.jitter)
+        else:
+            delay = job.next_delay()
+        while True:
+            await asyncio.sleep(delay)
+            await self.run_job(job.name)
+            delay = job.next_delay()
+
+    async def run_job(self, name: str) -> bool:
+        """Run a job now unless it is already running; returns True if it ran"""
+        job = self.jobs[name]
+        if job.running:
+            job.stats.skipped += 1
+            return False
+
+        lock = _FileLock(os.path.join(self.lock_dir, f"{name}.lock")) if job.exclusive else None
+        if lock is not None and not lock.acquire():
+            job.stats.skipped += 1
+            return False
+
+        job.running = True
+        stats = job.stats
+        stats.last_started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(job.func)
+        except Exception as e:
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            stats.last_error = f"{type(e).__name__}: {e}"
+            logger.error("Job %s failed:\n%s", name, traceback.format_exc())
+        else:
+            stats.consecutive_failures = 0
+            stats.last_success_at = datetime.utcnow()
+        finally:
+            stats.runs += 1
+            stats.last_duration_seconds = time.perf_counter() - started
+            job.running = False
+            if lock is not None:
+                lock.release()
+        return True
+
+    def status(self) -> List[dict]:
+        """Run time, lag and failure counts per job"""
+        now = datetime.utcnow()
+        result = []
+        for job in self.jobs.values():
+            stats = job.stats
+            if stats.last_success_at is not None:
+                lag = (now - stats.last_success_at).total_seconds()
+            elif self._started_at is not None:
+                lag = time.time() - self._started_at
+            else:
+                lag = None
+            result.append({
+                "name": job.name,
+                "interval_seconds": job.interval,
+                "exclusive": job.exclusive,
+                "running": job.running,
+                "runs": stats.runs,
+                "failures": stats.failures,
+                "consecutive_failures": stats.consecutive_failures,
+                "skipped": stats.skipped,
+                "last_started_at": stats.last_started_at,
+                "last_success_at": stats.last_success_at,
+                "last_duration_seconds": stats.last_duration_seconds,
+                "lag_seconds": lag,
+                "last_error": stats.last_error,
+            })
+        return result
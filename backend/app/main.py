@@ -1,16 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .api.endpoints import router as api_router
 from .db.database import engine
+from .jobs.refresh import SCHEDULER_ENABLED, build_scheduler
 from .models.models import Base
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run periodic refresh jobs for as long as the app is up
+    scheduler = build_scheduler()
+    app.state.scheduler = scheduler
+    if SCHEDULER_ENABLED:
+        await scheduler.start()
+    yield
+    await scheduler.stop()
+
+
 app = FastAPI(
     title="Zip Listen Analytics API",
     description="Music streaming analytics API for Zip Listen",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -20,6 +35,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the dashboard read revalidation and pagination headers
+    expose_headers=["ETag", "Link", "X-Next-Cursor"],
 )
 
 # Include API routes
@@ -35,7 +52,13 @@ def read_root():
             "/api/genres/by-region",
             "/api/subscribers/by-region",
             "/api/artists/top",
-            "/api/artists/rising"
+            "/api/artists/rising",
+            "/api/geo/drilldown",
+            "/api/durations/quantiles",
+            "/api/auth/failure-rates",
+            "/api/conversion/cohorts",
+            "/api/streams/hourly",
+            "/api/jobs"
         ]
     }
 
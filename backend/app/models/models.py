@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -14,6 +14,7 @@ class ListenEvent(Base):
     duration = Column(Float)
     userId = Column(String, index=True)
     state = Column(String, index=True)
+    zip = Column(String, index=True)
     level = Column(String, index=True)
     genre = Column(String, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -37,3 +38,61 @@ class StatusChangeEvent(Base):
     userId = Column(String, index=True)
     state = Column(String, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+
+class Watermark(Base):
+    __tablename__ = "watermarks"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class WatermarkGap(Base):
+    """Ids below a watermark that weren't visible when it moved past them"""
+    __tablename__ = "watermark_gaps"
+
+    name = Column(String, primary_key=True)
+    event_id = Column(Integer, primary_key=True)
+
+
+class ListenEventSample(Base):
+    __tablename__ = "listen_events_sample"
+
+    event_id = Column(Integer, primary_key=True)
+    artist = Column(String, index=True)
+    userId = Column(String)
+    state = Column(String, index=True)
+    level = Column(String)
+    genre = Column(String, index=True)
+    timestamp = Column(DateTime, index=True)
+
+
+class SampleStratum(Base):
+    __tablename__ = "listen_sample_strata"
+
+    state = Column(String, primary_key=True)
+    genre = Column(String, primary_key=True)
+    population = Column(Integer, default=0)
+    sample_size = Column(Integer, default=0)
+
+
+class UserCohort(Base):
+    __tablename__ = "user_cohorts"
+
+    userId = Column(String, primary_key=True)
+    cohort_date = Column(Date, index=True)
+    region = Column(String, index=True)
+    first_seen_at = Column(DateTime)
+    first_paid_at = Column(DateTime)
+    converted_at = Column(DateTime)
+
+
+class CohortDailyCount(Base):
+    __tablename__ = "cohort_daily_counts"
+
+    cohort_date = Column(Date, primary_key=True)
+    region = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    new_users = Column(Integer, default=0)
+    conversions = Column(Integer, default=0)
@@ -0,0 +1,417 @@
+"""
+DAG runner for the batch analytics pipeline
+
+Tasks declare the upstream tasks they read from. Tasks whose inputs are
+ready run concurrently on a thread or process pool. Results are stored in a
+content-addressed cache keyed by the task's source code, the source of the
+project modules it can reach, its version, its parameters and the content of
+its inputs, so a rerun only recomputes tasks whose code or data changed.
+Bump a task's version when it depends on something the fingerprint can't
+see, such as an installed package or a file it reads. Source tasks
+(cache=False) always run; their outputs are hashed so unchanged data still
+hits the cache downstream. The cache can be capped at a size, in which case
+the least recently used entries are evicted.
+
+Printed output is buffered per task and written in one piece when the task
+finishes, so concurrent tasks don't interleave their reports. Cache hits
+replay the output recorded when the task last ran.
+"""
+
+import hashlib
+import inspect
+import io
+import os
+import pickle
+import sys
+import sysconfig
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+
+@dataclass
+class Task:
+    name: str
+    func: Callable
+    inputs: Tuple[str, ...] = ()
+    params: Dict[str, Any] = field(default_factory=dict)
+    cache: bool = True
+    version: str = ""
+
+
+@dataclass
+class TaskTiming:
+    name: str
+    status: str
+    seconds: float
+
+
+@dataclass
+class DagResult:
+    outputs: Dict[str, Any]
+    timings: List[TaskTiming]
+    wall_seconds: float
+
+    def report(self) -> str:
+        width = max([len(t.name) for t in self.timings] + [4])
+        lines = [f"{'task':<{width}}  {'status':<7}  seconds"]
+        for timing in self.timings:
+            lines.append(f"{timing.name:<{width}}  {timing.status:<7}  {timing.seconds:7.3f}")
+        busy = sum(t.seconds for t in self.timings)
+        lines.append(f"Wall time: {self.wall_seconds:.3f}s (task time {busy:.3f}s)")
+        return "\n".join(lines)
+
+
+class TaskError(Exception):
+    def __init__(self, name: str, error: BaseException):
+        super().__init__(f"Task '{name}' failed: {error}")
+        self.name = name
+        self.error = error
+
+
+def content_hash(value: Any) -> str:
+    """Stable hash of a task output"""
+    digest = hashlib.sha256()
+    _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+def _update_hash(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(digest, item)
+    else:
+        digest.update(pickle.dumps(value, protocol=4))
+
+
+# Modules under these directories are treated as fixed dependencies
+_SYSTEM_DIRS = tuple(
+    os.path.join(os.path.realpath(path), "")
+    for path in {sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")}
+)
+
+# File hashes keyed by (path, mtime, size) so unchanged files are read once
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def _project_file(module) -> Optional[str]:
+    path = getattr(module, "__file__", None)
+    if not path or not path.endswith(".py"):
+        return None
+    path = os.path.realpath(path)
+    return None if path.startswith(_SYSTEM_DIRS) else path
+
+
+def _file_hash(path: str) -> str:
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        with open(path, "rb") as f:
+            _file_hashes[key] = hashlib.sha256(f.read()).hexdigest()
+    return _file_hashes[key]
+
+
+def _module_files(func: Callable) -> List[str]:
+    """Source files of the project modules reachable from a task's module"""
+    seen = set()
+    files = []
+    queue = [inspect.getmodule(func)]
+    while queue:
+        module = queue.pop()
+        if module is None or module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        path = _project_file(module)
+        if path is None:
+            continue
+        files.append(path)
+        for value in list(vars(module).values()):
+            if inspect.ismodule(value):
+                queue.append(value)
+            elif inspect.isfunction(value) or inspect.isclass(value):
+                queue.append(sys.modules.get(value.__module__))
+    return sorted(files)
+
+
+def _code_fingerprint(func: Callable) -> str:
+    # Helpers a task calls live in its own module or in modules it imports,
+    # so hash those files too; a change anywhere in them invalidates the task
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = repr(getattr(func, "__code__", func))
+    digest = hashlib.sha256(source.encode())
+    for path in _module_files(func):
+        try:
+            digest.update(path.encode())
+            digest.update(_file_hash(path).encode())
+        except OSError:
+            continue
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """Pickled task outputs stored under their cache key
+
+    With max_bytes set, each put evicts the least recently used entries
+    until the directory fits. Reads touch an entry's mtime to mark it used.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, value
+
+    def put(self, key: str, value: Any):
+        # Write then rename so a crash never leaves a truncated entry
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        if self.max_bytes is not None:
+            self.evict(keep=path)
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".pkl"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # Another runner may have evicted it already
+                pass
+            total -= size
+
+
+class _TaskOutput(io.TextIOBase):
+    """sys.stdout stand-in that buffers writes made from task threads"""
+
+    def __init__(self, target):
+        self.target = target
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.target).write(text)
+
+    def flush(self):
+        self.target.flush()
+
+
+def _timed_call(func, args, kwargs):
+    # Timed inside the worker so queue wait isn't counted; a failing task
+    # carries its time on the exception
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        e.task_seconds = time.perf_counter() - started
+        raise
+    return result, time.perf_counter() - started
+
+
+def _call_in_thread(output: _TaskOutput, func, args, kwargs):
+    output.local.buffer = io.StringIO()
+    try:
+        result, seconds = _timed_call(func, args, kwargs)
+        return result, output.local.buffer.getvalue(), seconds
+    finally:
+        output.local.buffer = None
+
+
+def _call_in_process(func, args, kwargs):
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        result, seconds = _timed_call(func, args, kwargs)
+    return result, buffer.getvalue(), seconds
+
+
+class DagRunner:
+    def __init__(
+        self,
+        tasks: Sequence[Task],
+        cache_dir: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        executor: str = "thread",
+        cache_max_bytes: Optional[int] = None,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}'")
+        self.tasks = {task.name: task for task in tasks}
+        if len(self.tasks) != len(tasks):
+            raise ValueError("Task names must be unique")
+        self.cache = ContentCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.max_workers = max_workers
+        self.executor = executor
+        self._check_graph()
+
+    def _check_graph(self):
+        for task in self.tasks.values():
+            for name in task.inputs:
+                if name not in self.tasks:
+                    raise ValueError(f"Task '{task.name}' depends on unknown task '{name}'")
+
+        # Depth-first search for cycles
+        state: Dict[str, int] = {}
+
+        def visit(name, path):
+            if state.get(name) == 1:
+                raise ValueError(f"Cycle in pipeline: {' -> '.join(path + [name])}")
+            if state.get(name) == 2:
+                return
+            state[name] = 1
+            for upstream in self.tasks[name].inputs:
+                visit(upstream, path + [name])
+            state[name] = 2
+
+        for name in self.tasks:
+            visit(name, [])
+
+    def _cache_key(self, task: Task, input_hashes: List[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(task.name.encode())
+        digest.update(_code_fingerprint(task.func).encode())
+        digest.update(task.version.encode())
+        digest.update(repr(sorted(task.params.items())).encode())
+        for value in input_hashes:
+            digest.update(value.encode())
+        return digest.hexdigest()
+
+    def run(self) -> DagResult:
+        started = time.perf_counter()
+        outputs: Dict[str, Any] = {}
+        hashes: Dict[str, str] = {}
+        timings: List[TaskTiming] = []
+        pending = dict(self.tasks)
+        running = {}
+        failure: Optional[TaskError] = None
+
+        pool_class = ThreadPoolExecutor if self.executor == "thread" else ProcessPoolExecutor
+        output = _TaskOutput(sys.stdout)
+        original_stdout = sys.stdout
+        if self.executor == "thread":
+            sys.stdout = output
+
+        try:
+            with pool_class(max_workers=self.max_workers) as pool:
+                while True:
+                    if failure is None:
+                        self._launch_ready(pending, running, outputs, hashes, timings, pool, output)
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        try:
+                            result, printed, seconds = future.result()
+                        except Exception as e:
+                            failure = failure or TaskError(task.name, e)
+                            timings.append(TaskTiming(task.name, "failed", getattr(e, "task_seconds", 0.0)))
+                            continue
+                        original_stdout.write(printed)
+                        self._store(task, result, printed, outputs, hashes)
+                        timings.append(TaskTiming(task.name, "ran", seconds))
+        finally:
+            sys.stdout = original_stdout
+
+        if failure is not None:
+            raise failure
+
+        return DagResult(outputs, timings, time.perf_counter() - started)
+
+    def _launch_ready(self, pending, running, outputs, hashes, timings, pool, output):
+        # Cache hits complete immediately and may unblock further tasks
+        progressed = True
+        while progressed:
+            progressed = False
+            for name in list(pending):
+                task = pending[name]
+                if not all(upstream in outputs for upstream in task.inputs):
+                    continue
+                del pending[name]
+                if self._from_cache(task, outputs, hashes, timings):
+                    progressed = True
+                    continue
+                args = [outputs[upstream] for upstream in task.inputs]
+                if self.executor == "thread":
+                    future = pool.submit(_call_in_thread, output, task.func, args, task.params)
+                else:
+                    future = pool.submit(_call_in_process, task.func, args, task.params)
+                running[future] = task
+
+    def _input_hashes(self, task: Task, hashes: Dict[str, str]) -> List[str]:
+        return [hashes[upstream] for upstream in task.inputs]
+
+    def _from_cache(self, task, outputs, hashes, timings) -> bool:
+        if self.cache is None or not task.cache:
+            return False
+        started = time.perf_counter()
+        key = self._cache_key(task, self._input_hashes(task, hashes))
+        hit, entry = self.cache.get(key)
+        if not hit:
+            return False
+        value, printed = entry
+        sys.stdout.write(printed)
+        outputs[task.name] = value
+        hashes[task.name] = key
+        timings.append(TaskTiming(task.name, "cached", time.perf_counter() - started))
+        return True
+
+    def _store(self, task, result, printed, outputs, hashes):
+        outputs[task.name] = result
+        if task.cache:
+            key = self._cache_key(task, self._input_hashes(task, hashes))
+            hashes[task.name] = key
+            if self.cache is not None:
+                self.cache.put(key, (result, printed))
+        else:
+            hashes[task.name] = content_hash(result)
@@ -0,0 +1,326 @@
+"""
+Incremental CSV export for Tableau extracts
+
+Each table is exported into date-partitioned part files:
+    <export dir>/tableau_listen_events/date=2024-01-15/part-000000000101-000000000250.csv
+A delta export appends one part per date holding only the rows past the
+table's id watermark, then advances the watermark. Partitions that collect
+TABLEAU_COMPACT_MIN_PARTS parts are compacted into a single part. Point a
+Tableau wildcard union at the table directory to pick up every part.
+
+Part names carry the id range of the run that wrote them, from one past
+the previous watermark to the new one. That keeps reruns idempotent: a part
+above the watermark comes from a run that died before committing and is
+removed, and a part whose range lies inside another part's range was
+already compacted.
+
+Ids are handed out when a row is inserted, not when its transaction
+commits, so a row can become visible after a run has exported higher ids.
+Each run records the ids missing among the last TABLEAU_LATE_ID_WINDOW ids
+it exported, and the next run that has new rows picks up any of those that
+have since committed. A row that commits later than that is only exported
+by a full export:
+    python -m app.pipeline.tableau_export [--full]
+"""
+
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from ..models.models import AuthEvent, ListenEvent, StatusChangeEvent, Watermark
+from ..utils.regions import STATE_TO_REGION
+
+TABLEAU_EXPORT_DIR = os.getenv("TABLEAU_EXPORT_DIR", "tableau_export")
+TABLEAU_COMPACT_MIN_PARTS = int(os.getenv("TABLEAU_COMPACT_MIN_PARTS", "8"))
+TABLEAU_LATE_ID_WINDOW = int(os.getenv("TABLEAU_LATE_ID_WINDOW", "1000"))
+
+# Model and output directory per exported table
+EXPORTS = {
+    "listen_events": (ListenEvent, "tableau_listen_events"),
+    "auth_events": (AuthEvent, "tableau_auth_events"),
+    "status_change_events": (StatusChangeEvent, "tableau_status_events"),
+}
+
+UNKNOWN_DATE = "unknown"
+
+_PART = re.compile(r"^part-(\d+)-(\d+)\.csv$")
+_LATE = re.compile(r"^_late-(\d+)\.json$")
+
+
+def _watermark_name(table: str) -> str:
+    return f"tableau_{table}"
+
+
+def _watermark(db: Session, table: str) -> Watermark:
+    watermark = db.get(Watermark, _watermark_name(table))
+    if watermark is None:
+        watermark = Watermark(name=_watermark_name(table), last_id=0)
+        db.add(watermark)
+    return watermark
+
+
+def _part_name(first_id: int, last_id: int) -> str:
+    return f"part-{first_id:012d}-{last_id:012d}.csv"
+
+
+def _parts(partition: str) -> List[Tuple[int, int, str]]:
+    """(first id, last id, path) of the part files in a partition"""
+    parts = []
+    for name in os.listdir(partition):
+        match = _PART.match(name)
+        if match:
+            parts.append((int(match.group(1)), int(match.group(2)), os.path.join(partition, name)))
+    return sorted(parts)
+
+
+def _late_path(table_dir: str, last_id: int) -> str:
+    return os.path.join(table_dir, f"_late-{last_id:012d}.json")
+
+
+def _load_late_ids(table_dir: str, last_id: int) -> List[int]:
+    """Ids missing from the run that committed last_id"""
+    try:
+        with open(_late_path(table_dir, last_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _save_late_ids(table_dir: str, last_id: int, ids: List[int]):
+    # Keyed by the watermark, so a run that dies before committing leaves the
+    # committed run's list in place
+    os.makedirs(table_dir, exist_ok=True)
+    path = _late_path(table_dir, last_id)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(ids, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _partitions(table_dir: str) -> List[str]:
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(
+        os.path.join(table_dir, name) for name in os.listdir(table_dir)
+        if name.startswith("date=") and os.path.isdir(os.path.join(table_dir, name))
+    )
+
+
+def enrich(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Add the region, and time features for listens, that the dashboards use"""
+    df = df.assign(region=df["state"].map(STATE_TO_REGION))
+    if table == "listen_events":
+        timestamps = pd.to_datetime(df["timestamp"])
+        df = df.assign(timestamp=timestamps, hour=timestamps.dt.hour, day_of_week=timestamps.dt.day_name())
+    return df
+
+
+def _clean(table_dir: str, last_id: int):
+    """Remove leftovers of runs or compactions that didn't finish"""
+    if os.path.isdir(table_dir):
+        for name in os.listdir(table_dir):
+            match = _LATE.match(name)
+            if name.endswith(".tmp") or (match and int(match.group(1)) != last_id):
+                os.remove(os.path.join(table_dir, name))
+
+    for partition in _partitions(table_dir):
+        for name in os.listdir(partition):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(partition, name))
+
+        parts = _parts(partition)
+        for first, last, path in parts:
+            uncommitted = first > last_id
+            superseded = any(
+                other != path and other_first <= first and last <= other_last
+                for other_first, other_last, other in parts
+            )
+            if uncommitted or superseded:
+                os.remove(path)
+
+
+def _write_rows(
+    db: Session,
+    table: str,
+    table_dir: str,
+    after_id: int,
+    batch_size: int,
+    late_ids: Sequence[int] = (),
+) -> Tuple[int, int, List[int]]:
+    """Write rows past after_id, plus any late_ids now committed, into one new part per date
+
+    Returns (rows, last id, ids still missing). Late rows are only written
+    alongside new rows, since part names need a range above the watermark.
+    """
+    model, _ = EXPORTS[table]
+    condition = model.id > after_id
+    if late_ids:
+        condition = or_(condition, model.id.in_(late_ids))
+    stmt = select(model.__table__).where(condition).order_by(model.id)
+
+    # date -> open file
+    open_parts: Dict[str, object] = {}
+    rows = 0
+    last_id = after_id
+    found_late: set = set()
+    recent = np.empty(0, dtype=np.int64)
+    try:
+        for chunk in pd.read_sql(stmt, db.connection(), chunksize=batch_size):
+            if chunk.empty:
+                continue
+            ids = chunk["id"].to_numpy(dtype=np.int64)
+            found_late.update(ids[ids <= after_id].tolist())
+            # Only the last window of exported ids matters for finding gaps
+            recent = np.concatenate([recent, ids[ids > after_id]])[-TABLEAU_LATE_ID_WINDOW:]
+
+            chunk = enrich(table, chunk)
+            dates = pd.to_datetime(chunk["timestamp"]).dt.strftime("%Y-%m-%d").fillna(UNKNOWN_DATE)
+            for day, group in chunk.groupby(dates, sort=False):
+                handle = open_parts.get(day)
+                if handle is None:
+                    partition = os.path.join(table_dir, f"date={day}")
+                    os.makedirs(partition, exist_ok=True)
+                    handle = open_parts[day] = open(os.path.join(partition, f"part-{after_id + 1:012d}.tmp"), "w", newline="")
+                    group.to_csv(handle, index=False)
+                else:
+                    group.to_csv(handle, index=False, header=False)
+            rows += len(chunk)
+            last_id = max(last_id, int(ids[-1]))
+    finally:
+        for handle in open_parts.values():
+            handle.close()
+
+    if last_id == after_id:
+        # Only late rows turned up; leave them for the next run with new rows
+        for handle in open_parts.values():
+            os.remove(handle.name)
+        return 0, after_id, list(late_ids)
+
+    # Publish the parts only once every row has been written
+    for handle in open_parts.values():
+        os.replace(handle.name, os.path.join(os.path.dirname(handle.name), _part_name(after_id + 1, last_id)))
+
+    window_start = max(after_id + 1, last_id - TABLEAU_LATE_ID_WINDOW + 1)
+    missing = set(range(window_start, last_id + 1)).difference(recent.tolist())
+    missing.update(i for i in late_ids if i not in found_late and i > last_id - TABLEAU_LATE_ID_WINDOW)
+    return rows, last_id, sorted(missing)
+
+
+def compact(table_dir: str, min_parts: int = TABLEAU_COMPACT_MIN_PARTS) -> int:
+    """Merge the parts of every partition holding min_parts or more; returns partitions compacted"""
+    compacted = 0
+    for partition in _partitions(table_dir):
+        parts = _parts(partition)
+        if len(parts) < max(min_parts, 2):
+            continue
+
+        first = min(part[0] for part in parts)
+        last = max(part[1] for part in parts)
+        tmp = os.path.join(partition, f"{_part_name(first, last)}.tmp")
+        headers = set()
+        for _, _, path in parts:
+            with open(path, "rb") as part:
+                headers.add(part.readline())
+
+        if len(headers) == 1:
+            with open(tmp, "wb") as out:
+                for index, (_, _, path) in enumerate(parts):
+                    with open(path, "rb") as part:
+                        header = part.readline()
+                        if index == 0:
+                            out.write(header)
+                        shutil.copyfileobj(part, out)
+        else:
+            # Parts written before and after a column change; align them by
+            # name, leaving columns a part lacks empty
+            frames = [pd.read_csv(path, dtype=str, keep_default_na=False) for _, _, path in parts]
+            pd.concat(frames, ignore_index=True).to_csv(tmp, index=False)
+        os.replace(tmp, os.path.join(partition, _part_name(first, last)))
+
+        for _, _, path in parts:
+            os.remove(path)
+        compacted += 1
+    return compacted
+
+
+def export_delta(
+    db: Session,
+    out_dir: str = TABLEAU_EXPORT_DIR,
+    tables: Optional[List[str]] = None,
+    min_parts: int = TABLEAU_COMPACT_MIN_PARTS,
+    batch_size: int = 50000,
+) -> Dict[str, int]:
+    """Append rows past each table's watermark; returns rows exported per table"""
+    exported = {}
+    for table in tables or list(EXPORTS):
+        table_dir = os.path.join(out_dir, EXPORTS[table][1])
+        watermark = _watermark(db, table)
+        after_id = watermark.last_id or 0
+
+        _clean(table_dir, after_id)
+        late_ids = _load_late_ids(table_dir, after_id)
+        rows, last_id, missing = _write_rows(db, table, table_dir, after_id, batch_size, late_ids)
+        _save_late_ids(table_dir, last_id, missing)
+
+        watermark.last_id = last_id
+        watermark.updated_at = datetime.utcnow()
+        db.commit()
+        if last_id != after_id and os.path.exists(_late_path(table_dir, after_id)):
+            os.remove(_late_path(table_dir, after_id))
+
+        compact(table_dir, min_parts)
+        exported[table] = rows
+    return exported
+
+
+def export_full(
+    db: Session,
+    out_dir: str = TABLEAU_EXPORT_DIR,
+    tables: Optional[List[str]] = None,
+    batch_size: int = 50000,
+) -> Dict[str, int]:
+    """Rebuild every partition from the full tables and reset the watermarks"""
+    exported = {}
+    for table in tables or list(EXPORTS):
+        table_dir = os.path.join(out_dir, EXPORTS[table][1])
+        staging = f"{table_dir}.full"
+        shutil.rmtree(staging, ignore_errors=True)
+
+        rows, last_id, missing = _write_rows(db, table, staging, 0, batch_size)
+        _save_late_ids(staging, last_id, missing)
+
+        retired = f"{table_dir}.old"
+        shutil.rmtree(retired, ignore_errors=True)
+        if os.path.isdir(table_dir):
+            os.replace(table_dir, retired)
+        os.replace(staging, table_dir)
+        shutil.rmtree(retired, ignore_errors=True)
+
+        watermark = _watermark(db, table)
+        watermark.last_id = last_id
+        watermark.updated_at = datetime.utcnow()
+        db.commit()
+        exported[table] = rows
+    return exported
+
+
+if __name__ == "__main__":
+    import sys
+
+    from ..db.database import SessionLocal
+
+    full = "--full" in sys.argv[1:]
+    db = SessionLocal()
+    try:
+        exported = export_full(db) if full else export_delta(db)
+        for table, rows in exported.items():
+            print(f"Exported {rows} {table} rows to {os.path.join(TABLEAU_EXPORT_DIR, EXPORTS[table][1])}")
+    finally:
+        db.close()
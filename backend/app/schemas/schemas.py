@@ -1,11 +1,14 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date, datetime
 
 
 class GenreByRegionResponse(BaseModel):
     region: str
     genre: str
     stream_count: int
+    stream_count_low: Optional[int] = None
+    stream_count_high: Optional[int] = None
 
 
 class SubscriberByRegionResponse(BaseModel):
@@ -18,6 +21,8 @@ class TopArtistResponse(BaseModel):
     artist: str
     stream_count: int
     rank: int
+    stream_count_low: Optional[int] = None
+    stream_count_high: Optional[int] = None
 
 
 class RisingArtistResponse(BaseModel):
@@ -25,3 +30,78 @@ class RisingArtistResponse(BaseModel):
     growth_rate: float
     current_streams: int
     previous_streams: int
+    current_streams_low: Optional[int] = None
+    current_streams_high: Optional[int] = None
+    previous_streams_low: Optional[int] = None
+    previous_streams_high: Optional[int] = None
+
+
+class GeoDrillDownResponse(BaseModel):
+    region: str
+    state: Optional[str] = None
+    zip: Optional[str] = None
+    value: str
+    stream_count: int
+
+
+class DurationQuantileResponse(BaseModel):
+    listen_count: int
+    p50_ms: Optional[int] = None
+    p90_ms: Optional[int] = None
+    p99_ms: Optional[int] = None
+    listening_time_ms: int
+
+
+class HourlyStreamsResponse(BaseModel):
+    hour: int
+    stream_count: int
+
+
+class JobStatusResponse(BaseModel):
+    name: str
+    interval_seconds: float
+    exclusive: bool
+    running: bool
+    runs: int
+    failures: int
+    consecutive_failures: int
+    skipped: int
+    last_started_at: Optional[datetime] = None
+    last_success_at: Optional[datetime] = None
+    last_duration_seconds: Optional[float] = None
+    lag_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class AuthFailureRate(BaseModel):
+    state: Optional[str] = None
+    region: str
+    window: str
+    attempts: int
+    failures: int
+    failure_rate: float
+    alerting: bool
+
+
+class AuthFailureAlert(BaseModel):
+    state: str
+    window: str
+    failure_rate: float
+    attempts: int
+    at: datetime
+
+
+class AuthFailureRatesResponse(BaseModel):
+    threshold: float
+    min_attempts: int
+    states: List[AuthFailureRate]
+    regions: List[AuthFailureRate]
+    recent_alerts: List[AuthFailureAlert]
+
+
+class CohortConversionResponse(BaseModel):
+    cohort: date
+    region: str
+    users: int
+    conversions: int
+    conversion_rate: float
@@ -0,0 +1,120 @@
+"""
+Persistent Bloom filter over DataFrame rows
+
+Rows are hashed column-wise with pandas' vectorized SipHash under two fixed
+keys, and the k bit positions come from double hashing (h1 + i*h2), so a
+batch of keys is added or tested without a Python-level loop. Hashes depend
+only on the values and dtypes of the key columns, which keeps a saved filter
+valid across runs.
+
+File layout: one JSON header line (size, hashes, count, caller metadata)
+followed by the raw bit array. Saves write a temporary file and rename it
+into place.
+"""
+
+import math
+import os
+from typing import Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+
+DEFAULT_FP_RATE = 0.001
+
+# pandas hash keys must be 16 bytes; changing them invalidates saved filters
+HASH_KEYS = ("zip-listen-bf-h1", "zip-listen-bf-h2")
+
+FORMAT = "bloom-v1"
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class BloomFilter:
+    """Bloom filter sized for `capacity` keys at false-positive rate `fp_rate`"""
+
+    def __init__(self, capacity: int, fp_rate: float = DEFAULT_FP_RATE):
+        self.capacity = max(int(capacity), 1)
+        self.fp_rate = fp_rate
+        self.size = max(64, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self.meta: dict = {}
+        self._bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, keys: pd.DataFrame) -> np.ndarray:
+        """Bit positions, one row of `hashes` columns per key"""
+        h1, h2 = (
+            pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key).to_numpy()
+            for hash_key in HASH_KEYS
+        )
+        # An odd step never cycles early through the positions
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (h1[:, None] + steps * (h2 | np.uint64(1))[:, None]) % np.uint64(self.size)
+
+    def add(self, keys: pd.DataFrame):
+        """Add every row of `keys`"""
+        if len(keys) == 0:
+            return
+        positions = self._positions(keys).ravel()
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        np.bitwise_or.at(self._bits, positions >> np.uint64(3), masks)
+        self.count += len(keys)
+
+    def contains(self, keys: pd.DataFrame) -> np.ndarray:
+        """Boolean per row: False means definitely absent, True means possibly present"""
+        if len(keys) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(keys)
+        bits = (self._bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    @property
+    def fill_ratio(self) -> float:
+        """Fraction of bits set"""
+        return int(_POPCOUNT[self._bits].sum(dtype=np.int64)) / self.size
+
+    def expected_fp_rate(self) -> float:
+        """False-positive rate implied by the bits set so far"""
+        return self.fill_ratio ** self.hashes
+
+    def save(self, path: str):
+        header = {
+            "format": FORMAT,
+            "capacity": self.capacity,
+            "fp_rate": self.fp_rate,
+            "size": self.size,
+            "hashes": self.hashes,
+            "count": self.count,
+            "meta": self.meta,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(header) + b"\n")
+            f.write(self._bits.tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BloomFilter"]:
+        """Read a saved filter, or None if the file is missing or not a complete filter"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            try:
+                header = orjson.loads(f.readline())
+            except orjson.JSONDecodeError:
+                return None
+            bits = np.frombuffer(f.read(), dtype=np.uint8)
+
+        if not isinstance(header, dict) or header.get("format") != FORMAT:
+            return None
+        bloom = cls(header["capacity"], header["fp_rate"])
+        if (bloom.size, bloom.hashes) != (header["size"], header["hashes"]) or len(bits) != len(bloom._bits):
+            return None
+        bloom._bits = bits.copy()
+        bloom.count = header["count"]
+        bloom.meta = header["meta"]
+        return bloom
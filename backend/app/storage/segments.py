@@ -0,0 +1,364 @@
+"""
+Append-only segment store for raw listen events
+
+Events are written in immutable segments of fixed-width columns:
+    <store>/dictionaries/<column>.ndjson   one JSON string per line, line n is code n
+    <store>/seg-000001/meta.json           rows and min/max timestamp
+    <store>/seg-000001/<column>.bin        little-endian column values
+String columns hold int32 codes into store-wide, append-only dictionaries
+(-1 for null). Rows inside a segment are sorted by timestamp, NaT last.
+
+Readers memory-map the column files. Segments whose timestamp range misses
+the query are skipped from their metadata alone, and the range inside a
+segment is found by binary search, so scans return views into the mapped
+files instead of copies.
+
+Writers take an exclusive lock on the store; readers need none because a
+segment directory only appears, by rename, once its files and dictionary
+entries are complete.
+"""
+
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
+
+SEGMENT_DIR = os.getenv("SEGMENT_DIR", "")
+SEGMENT_ROWS = int(os.getenv("SEGMENT_ROWS", "1000000"))
+
+STRING_COLUMNS = ("artist", "song", "userId", "state", "zip", "level", "genre")
+VALUE_DTYPES = {"duration": np.dtype("<f8"), "timestamp": np.dtype("<M8[ns]")}
+CODE_DTYPE = np.dtype("<i4")
+COLUMNS = ("artist", "song", "duration", "userId", "state", "zip", "level", "genre", "timestamp")
+
+NULL_CODE = -1
+
+
+def _dtype(column: str) -> np.dtype:
+    return CODE_DTYPE if column in STRING_COLUMNS else VALUE_DTYPES[column]
+
+
+def _as_strings(values: pd.Series) -> List[str]:
+    """Distinct non-null values as strings; whole floats such as ZIPs read as 10001.0 lose the .0"""
+    if pd.api.types.is_float_dtype(values) and (values % 1 == 0).all():
+        values = values.astype("int64")
+    return [str(value) for value in values]
+
+
+class Dictionary:
+    """Append-only string dictionary for one column"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._offset = 0
+        self._array: Optional[np.ndarray] = None
+        self._categories: Optional[Tuple[List[str], Optional[np.ndarray]]] = None
+        # Concurrent scans refresh the same dictionary; reentrant because
+        # encode refreshes while holding it
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """Read entries appended since the last refresh"""
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Only whole lines; a writer may be midway through one
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                value = orjson.loads(line)
+                # Line n is code n, so a repeated value keeps its first code
+                # but still takes up its line
+                self._codes.setdefault(value, len(self.values))
+                self.values.append(value)
+            self._offset += end
+            if end:
+                self._array = None
+                self._categories = None
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        """Codes for the values, appending unseen ones (caller holds the write lock)"""
+        # Look up each distinct value once rather than every row
+        local, uniques = pd.factorize(values, use_na_sentinel=True)
+        strings = _as_strings(pd.Series(uniques))
+        with self._lock:
+            self.refresh()
+            new = [value for value in dict.fromkeys(strings) if value not in self._codes]
+            if new:
+                with open(self.path, "ab") as f:
+                    f.write(b"".join(orjson.dumps(value) + b"\n" for value in new))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.refresh()
+            # The trailing entry is what the -1 of missing values picks
+            mapping = np.array([self._codes[value] for value in strings] + [NULL_CODE], dtype=CODE_DTYPE)
+        return mapping[local]
+
+    def code(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Object array of strings (None for null codes)"""
+        array = self._array
+        if array is None:
+            with self._lock:
+                # Trailing None is what code -1 indexes
+                array = self._array = np.array(self.values + [None], dtype=object)
+        return array.take(codes)
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        """Categorical over the distinct values, in order of first code"""
+        cached = self._categories
+        if cached is None:
+            with self._lock:
+                categories = list(self._codes)
+                remap = None
+                if len(categories) != len(self.values):
+                    # Files written before encode was locked can repeat a
+                    # value; point every line at its value's category
+                    position = {value: index for index, value in enumerate(categories)}
+                    remap = np.array([position[value] for value in self.values] + [NULL_CODE], dtype=CODE_DTYPE)
+                cached = self._categories = (categories, remap)
+        categories, remap = cached
+        if remap is not None:
+            codes = remap.take(codes)
+        return pd.Categorical.from_codes(codes, categories=categories, validate=False)
+
+
+class Segment:
+    """One immutable, memory-mapped segment"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), "rb") as f:
+            meta = orjson.loads(f.read())
+        self.rows = meta["rows"]
+        # Rows with a timestamp come first; the rest are NaT
+        self.timed_rows = meta["timed_rows"]
+        self.min_timestamp = pd.Timestamp(meta["min_timestamp"]) if meta["min_timestamp"] else None
+        self.max_timestamp = pd.Timestamp(meta["max_timestamp"]) if meta["max_timestamp"] else None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def column(self, name: str) -> np.ndarray:
+        array = self._columns.get(name)
+        if array is None:
+            with self._lock:
+                array = self._columns.get(name)
+                if array is None:
+                    array = np.memmap(
+                        os.path.join(self.path, f"{name}.bin"), dtype=_dtype(name), mode="r", shape=(self.rows,)
+                    )
+                    self._columns[name] = array
+        return array
+
+    def overlaps(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> bool:
+        """Whether any row can fall in [start, end)"""
+        if start is None and end is None:
+            return True
+        if self.min_timestamp is None:
+            return False
+        if start is not None and self.max_timestamp < start:
+            return False
+        if end is not None and self.min_timestamp >= end:
+            return False
+        return True
+
+    def bounds(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> slice:
+        """Row range in [start, end), found by binary search on the sorted timestamps"""
+        if start is None and end is None:
+            return slice(0, self.rows)
+        timestamps = self.column("timestamp")[:self.timed_rows]
+        low = 0 if start is None else int(np.searchsorted(timestamps, np.datetime64(start, "ns"), side="left"))
+        high = self.timed_rows if end is None else int(np.searchsorted(timestamps, np.datetime64(end, "ns"), side="left"))
+        return slice(low, max(low, high))
+
+
+class _StoreLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class SegmentStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._dictionary_dir = os.path.join(directory, "dictionaries")
+        os.makedirs(self._dictionary_dir, exist_ok=True)
+        self.dictionaries = {
+            column: Dictionary(os.path.join(self._dictionary_dir, f"{column}.ndjson"))
+            for column in STRING_COLUMNS
+        }
+        self._segments: Dict[str, Segment] = {}
+        self._lock = threading.Lock()
+
+    def segments(self) -> List[Segment]:
+        """Committed segments in write order"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("seg-") and not name.endswith(".tmp")
+        )
+        with self._lock:
+            for name in names:
+                if name not in self._segments:
+                    self._segments[name] = Segment(os.path.join(self.directory, name))
+            return [self._segments[name] for name in names]
+
+    def __len__(self):
+        return sum(segment.rows for segment in self.segments())
+
+    def append(self, events: pd.DataFrame, segment_rows: int = SEGMENT_ROWS) -> int:
+        """Write events as new segments; returns rows written"""
+        if events.empty:
+            return 0
+        events = events.reindex(columns=COLUMNS)
+        timestamps = pd.to_datetime(events["timestamp"], errors="coerce")
+        if timestamps.dt.tz is not None:
+            timestamps = timestamps.dt.tz_convert("UTC").dt.tz_localize(None)
+        events = events.assign(timestamp=timestamps.astype("datetime64[ns]"))
+
+        with _StoreLock(os.path.join(self.directory, ".lock")):
+            for dictionary in self.dictionaries.values():
+                dictionary.refresh()
+            existing = [segment.name for segment in self.segments()]
+            number = int(existing[-1][4:]) if existing else 0
+
+            # NaT sorts last, which keeps the timed rows a prefix
+            events = events.iloc[np.argsort(events["timestamp"].to_numpy(), kind="stable")]
+            for start in range(0, len(events), segment_rows):
+                number += 1
+                self._write_segment(f"seg-{number:06d}", events.iloc[start:start + segment_rows])
+        return len(events)
+
+    def _write_segment(self, name: str, events: pd.DataFrame):
+        staging = os.path.join(self.directory, f"{name}.tmp")
+        os.makedirs(staging, exist_ok=True)
+
+        for column in COLUMNS:
+            if column in STRING_COLUMNS:
+                values = self.dictionaries[column].encode(events[column])
+            else:
+                values = pd.to_numeric(events[column], errors="coerce") if column == "duration" else events[column]
+                values = values.to_numpy(dtype=_dtype(column))
+            values.tofile(os.path.join(staging, f"{column}.bin"))
+
+        timed = events["timestamp"].dropna()
+        meta = {
+            "rows": len(events),
+            "timed_rows": len(timed),
+            "min_timestamp": timed.iloc[0].isoformat() if len(timed) else None,
+            "max_timestamp": timed.iloc[-1].isoformat() if len(timed) else None,
+        }
+        with open(os.path.join(staging, "meta.json"), "wb") as f:
+            f.write(orjson.dumps(meta))
+        os.replace(staging, os.path.join(self.directory, name))
+
+    def scan(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Per-segment views of the columns for rows in [start, end)
+
+        String columns come back as dictionary codes; decode them with
+        self.dictionaries[column]. The arrays are read-only views of the
+        mapped files.
+        """
+        columns = list(columns or COLUMNS)
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        for dictionary in self.dictionaries.values():
+            dictionary.refresh()
+
+        for segment in self.segments():
+            if not segment.overlaps(start, end):
+                continue
+            rows = segment.bounds(start, end)
+            if rows.stop > rows.start:
+                yield {column: segment.column(column)[rows] for column in columns}
+
+    def to_frame(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        categorical: bool = False,
+    ) -> pd.DataFrame:
+        """Events in [start, end) as a DataFrame
+
+        String columns are decoded to objects, or to categoricals sharing the
+        dictionary when categorical is set.
+        """
+        columns = list(columns or COLUMNS)
+        parts = list(self.scan(columns, start, end))
+        frame = {}
+        for column in columns:
+            values = np.concatenate([part[column] for part in parts]) if parts else np.empty(0, _dtype(column))
+            if column in STRING_COLUMNS:
+                dictionary = self.dictionaries[column]
+                values = dictionary.categorical(values) if categorical else dictionary.decode(values)
+            frame[column] = values
+        return pd.DataFrame(frame, columns=columns)
+
+
+def count_by_hour(
+    store: SegmentStore,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    filters: Optional[Dict[str, Sequence[str]]] = None,
+) -> np.ndarray:
+    """Streams per hour of day in [start, end), keeping rows whose string columns are in filters"""
+    filters = filters or {}
+    columns = ["timestamp"] + list(filters)
+    counts = np.zeros(24, dtype=np.int64)
+    for part in store.scan(columns, start, end):
+        timestamps = part["timestamp"]
+        keep = ~np.isnat(timestamps)
+        for column, values in filters.items():
+            codes = [store.dictionaries[column].code(value) for value in values]
+            keep &= np.isin(part[column], [code for code in codes if code is not None])
+        hours = timestamps.view(np.int64)[keep] // 3_600_000_000_000 % 24
+        counts += np.bincount(hours, minlength=24)
+    return counts
+
+
+_store: Optional[SegmentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_segment_store() -> Optional[SegmentStore]:
+    """Store under SEGMENT_DIR, or None when segments are not configured"""
+    global _store
+    if not SEGMENT_DIR:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SegmentStore(SEGMENT_DIR)
+    return _store
@@ -1,5 +1,8 @@
 """
-US State to Region mapping utility
+US geo hierarchy utility (region -> state -> ZIP)
+
+This is the single source of truth for the state to region mapping; the
+root-level data loader and the pipeline import it from here.
 """
 
 # US State to Region mapping
@@ -13,7 +16,7 @@ STATE_TO_REGION = {
     "DE": "Southeast", "FL": "Southeast", "GA": "Southeast", "MD": "Southeast",
     "NC": "Southeast", "SC": "Southeast", "VA": "Southeast", "WV": "Southeast",
     "AL": "Southeast", "KY": "Southeast", "MS": "Southeast", "TN": "Southeast",
-    "AR": "Southeast", "LA": "Southeast", "TX": "Southeast",
+    "AR": "Southeast", "LA": "Southeast", "TX": "Southeast", "OK": "Southeast",
     
     # Midwest
     "IL": "Midwest", "IN": "Midwest", "MI": "Midwest", "OH": "Midwest",
@@ -30,3 +33,7 @@ STATE_TO_REGION = {
 def get_region(state: str) -> str:
     """Get region for a given US state code"""
     return STATE_TO_REGION.get(state.upper(), "Unknown")
+
+
+# Levels of the geo hierarchy, coarsest first
+GEO_LEVELS = ("region", "state", "zip")
@@ -0,0 +1,98 @@
+"""
+Latency benchmark for approximate (approx=true) dashboard queries
+
+Times each sampled endpoint in exact and approximate mode against a seeded
+SQLite database, through the API router so routing and serialization are
+included. Revalidation is avoided by sending no If-None-Match, so every
+request does the full work. Exits non-zero when an approximate endpoint's
+median misses the target.
+
+Usage:
+    python benchmark_approx.py [db] [--listens 50000] [--runs 20] [--target-ms 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.analytics.sampling import refresh_listen_sample
+from app.api.endpoints import router
+from app.db.database import get_db
+from load_test import seed_database
+
+ENDPOINTS = [
+    "/api/genres/by-region",
+    "/api/artists/top?limit=10",
+    "/api/artists/rising?limit=10",
+]
+
+
+def make_client(db_path):
+    engine = create_engine(f"sqlite:///{os.path.abspath(db_path)}")
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        refresh_listen_sample(db)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def median_ms(client, url, runs):
+    # The first request loads the in-memory sample
+    client.get(url).raise_for_status()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        client.get(url).raise_for_status()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time exact vs approximate dashboard queries")
+    parser.add_argument("db", nargs="?", default="benchmark_approx.db")
+    parser.add_argument("--listens", type=int, default=50000, help="rows to seed when the database does not exist")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        seed_database(args.db, listens=args.listens)
+    client = make_client(args.db)
+
+    print(f"\n{'endpoint':<30}  {'exact ms':>9}  {'approx ms':>9}")
+    missed = []
+    for endpoint in ENDPOINTS:
+        separator = "&" if "?" in endpoint else "?"
+        exact = median_ms(client, endpoint, args.runs)
+        approx = median_ms(client, f"{endpoint}{separator}approx=true", args.runs)
+        print(f"{endpoint:<30}  {exact:>9.1f}  {approx:>9.1f}")
+        if approx >= args.target_ms:
+            missed.append(endpoint)
+
+    if missed:
+        print(f"\nApprox median at or above {args.target_ms:.0f} ms: {', '.join(missed)}")
+        sys.exit(1)
+    print(f"\nEvery approx median is under {args.target_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Dedup benchmark for listen event ingest
+
+Ingests a batch of listen events into a scratch SQLite database, then
+replays it, ingests fresh rows and replays a half-overlapping export. Prints
+the filter's observed and expected false-positive rate and the dedup
+throughput for each pass.
+
+Usage:
+    python benchmark_dedup.py [rows]    # default 200000
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.db.dedup import ListenDedup
+from app.db.ingest import ingest_listen_events
+from app.models.models import Base, ListenEvent
+
+
+def make_events(rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'artist': [f'Artist {i}' for i in rng.integers(0, 2000, rows)],
+        'song': [f'Song {i}' for i in rng.integers(0, 20000, rows)],
+        'duration': rng.gamma(9, 25, rows),
+        'userId': [f'user{i:06d}' for i in rng.integers(0, 5000, rows)],
+        'state': 'NY',
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 30 * 86400 * 10**6, rows), unit='us'),
+    })
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    first, second = make_events(rows, seed=1), make_events(rows, seed=2)
+    passes = [
+        ('initial import', first),
+        ('replay', first),
+        ('new rows', second),
+        ('half overlap', pd.concat([first.iloc[:rows // 2], make_events(rows // 2, seed=3)])),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        path = os.path.join(tmp, 'listen_events.bloom')
+
+        with Session(engine) as db:
+            for name, events in passes:
+                # Reopen each pass so the saved filter is exercised
+                dedup = ListenDedup.open(db, path)
+                started = time.perf_counter()
+                inserted = ingest_listen_events(db, events, dedup=dedup)
+                dedup.save()
+                total = time.perf_counter() - started
+
+                print(f"{name}: {inserted} inserted in {total:.2f}s")
+                print(f"  {dedup.stats.report()}")
+
+            print(f"\nlisten_events rows: {db.scalar(select(func.count(ListenEvent.id)))}")
+            print(f"Filter: {dedup.bloom.size / 8 / 1e6:.1f} MB, {dedup.bloom.hashes} hashes, "
+                  f"capacity {dedup.bloom.capacity}, {dedup.bloom.fill_ratio:.1%} of bits set")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Serialization benchmark for the analytics responses
+
+Compares the per-row pydantic path the endpoints used to take (build a
+model per row, then let FastAPI validate and JSON encode the list) with the
+orjson fast path in app/api/responses.py, and reports compressed sizes.
+
+Usage:
+    python benchmark_serialization.py [rows ...]    # default 10000 50000 100000
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.api.responses import brotli, compress
+from app.schemas.schemas import RisingArtistResponse
+
+Adapter = TypeAdapter(list[RisingArtistResponse])
+
+
+def make_frame(rows, seed=0):
+    """Rising-artist shaped result rows with confidence bounds"""
+    rng = np.random.default_rng(seed)
+    current = rng.integers(0, 5000, rows)
+    previous = rng.integers(0, 5000, rows)
+    return pd.DataFrame({
+        'artist': [f'Artist {i}' for i in range(rows)],
+        'growth_rate': (current - previous) / np.maximum(previous, 1) * 100,
+        'current_streams': current,
+        'previous_streams': previous,
+        'current_low': current * 0.9,
+        'current_high': current * 1.1,
+        'previous_low': previous * 0.9,
+        'previous_high': previous * 1.1,
+    })
+
+
+def pydantic_path(df):
+    response = []
+    for _, row in df.iterrows():
+        response.append(RisingArtistResponse(
+            artist=row['artist'],
+            growth_rate=float(row['growth_rate']),
+            current_streams=int(round(row['current_streams'])),
+            previous_streams=int(round(row['previous_streams'])),
+            current_streams_low=int(round(row['current_low'])),
+            current_streams_high=int(round(row['current_high'])),
+            previous_streams_low=int(round(row['previous_low'])),
+            previous_streams_high=int(round(row['previous_high']))
+        ))
+    # What FastAPI does with a response_model: validate, dump, encode
+    content = Adapter.dump_python(Adapter.validate_python(response), exclude_none=True)
+    return json.dumps(jsonable_encoder(content)).encode()
+
+
+def fast_path(df):
+    rows = pd.DataFrame({
+        'artist': df['artist'],
+        'growth_rate': df['growth_rate'].astype(float),
+        'current_streams': df['current_streams'].round().astype(int),
+        'previous_streams': df['previous_streams'].round().astype(int),
+    })
+    for column in ['current', 'previous']:
+        rows[f'{column}_streams_low'] = df[f'{column}_low'].round().astype(int)
+        rows[f'{column}_streams_high'] = df[f'{column}_high'].round().astype(int)
+    return orjson.dumps(rows.to_dict('records'), option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(sizes):
+    print(f"{'rows':>8}  {'pydantic ms':>11}  {'orjson ms':>9}  {'speedup':>7}  {'json KB':>8}  {'gzip KB':>8}  {'br KB':>8}")
+    for rows in sizes:
+        df = make_frame(rows)
+        slow, slow_body = timed(pydantic_path, df, repeat=1 if rows > 50000 else 3)
+        fast, fast_body = timed(fast_path, df)
+        assert json.loads(slow_body) == json.loads(fast_body)
+
+        gzip_kb = len(compress(fast_body, 'gzip')) / 1024
+        br_kb = len(compress(fast_body, 'br')) / 1024 if brotli is not None else float('nan')
+        print(
+            f"{rows:>8}  {slow * 1000:>11.1f}  {fast * 1000:>9.1f}  {slow / fast:>6.1f}x"
+            f"  {len(fast_body) / 1024:>8.0f}  {gzip_kb:>8.0f}  {br_kb:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000, 100000])
@@ -13,9 +13,17 @@ Requirements:
 
 import pandas as pd
 from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
 import os
+import sys
 from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.analytics.metrics import Metric, compute_metrics
+from app.pipeline.dag import DagRunner, Task
+from app.pipeline.tableau_export import EXPORTS, TABLEAU_EXPORT_DIR, export_delta, export_full
+from app.storage.segments import SEGMENT_DIR, SegmentStore
+
 
 # Database connection
 DATABASE_URL = os.getenv(
@@ -26,44 +34,50 @@ DATABASE_URL = os.getenv(
 # Create engine
 engine = create_engine(DATABASE_URL)
 
+# Intermediate results cache; set to an empty string to disable
+PIPELINE_CACHE_DIR = os.getenv(
+    "PIPELINE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pipeline_cache")
+)
+# Least recently used cache entries are evicted past this size; 0 = unbounded
+PIPELINE_CACHE_MAX_MB = int(os.getenv("PIPELINE_CACHE_MAX_MB", "1024"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_EXECUTOR = os.getenv("PIPELINE_EXECUTOR", "thread")
 
-def load_data():
-    """Load all data from database into pandas DataFrames"""
-    print("Loading data from database...")
-    
-    listen_events = pd.read_sql_table('listen_events', engine)
-    auth_events = pd.read_sql_table('auth_events', engine)
-    status_change_events = pd.read_sql_table('status_change_events', engine)
-    
-    print(f"Loaded {len(listen_events)} listen events")
-    print(f"Loaded {len(auth_events)} auth events")
-    print(f"Loaded {len(status_change_events)} status change events")
-    
-    return listen_events, auth_events, status_change_events
+
+def load_table(table):
+    """Load one table from the database into a pandas DataFrame"""
+    df = pd.read_sql_table(table, engine)
+    print(f"Loaded {len(df)} rows from {table}")
+    return df
+
+
+def load_listen_segments(store_dir):
+    """Load listen events from the memory-mapped segment store"""
+    # Categoricals wrap the stored dictionary codes instead of decoding every
+    # row into a Python string
+    df = SegmentStore(store_dir).to_frame(categorical=True)
+    print(f"Loaded {len(df)} rows from segment store {store_dir}")
+    return df
 
 
 def analyze_listening_patterns(listen_events):
     """Analyze listening patterns by time of day and day of week"""
     print("\n=== Listening Pattern Analysis ===")
     
-    # Convert timestamp to datetime
-    listen_events['timestamp'] = pd.to_datetime(listen_events['timestamp'])
-    
-    # Extract time features
-    listen_events['hour'] = listen_events['timestamp'].dt.hour
-    listen_events['day_of_week'] = listen_events['timestamp'].dt.day_name()
+    streams = [Metric('streams', 'count')]
     
     # Peak listening hours
-    hourly_streams = listen_events.groupby('hour').size()
+    hourly_streams = compute_metrics(listen_events, ['hour'], streams)['streams']
     peak_hour = hourly_streams.idxmax()
     print(f"Peak listening hour: {peak_hour}:00 ({hourly_streams[peak_hour]} streams)")
     
     # Most active day
-    daily_streams = listen_events.groupby('day_of_week').size()
+    daily_streams = compute_metrics(listen_events, ['day_of_week'], streams)['streams']
     print(f"\nStreams by day of week:")
     print(daily_streams)
     
-    return listen_events
+    return {'hourly': hourly_streams, 'daily': daily_streams}
 
 
 def analyze_user_engagement(listen_events):
@@ -71,12 +85,11 @@ def analyze_user_engagement(listen_events):
     print("\n=== User Engagement Analysis ===")
     
     # Average session duration by user
-    user_stats = listen_events.groupby('userId').agg({
-        'duration': ['sum', 'mean', 'count'],
-        'song': 'count'
-    }).round(2)
-    
-    user_stats.columns = ['total_duration', 'avg_duration', 'duration_count', 'stream_count']
+    user_stats = compute_metrics(listen_events, ['userId'], [
+        Metric('total_duration', 'sum', 'duration'),
+        Metric('avg_duration', 'mean', 'duration'),
+        Metric('stream_count', 'count'),
+    ]).round(2)
     
     print(f"Average streams per user: {user_stats['stream_count'].mean():.2f}")
     print(f"Average listening time per user: {user_stats['total_duration'].mean():.2f} seconds")
@@ -89,14 +102,17 @@ def analyze_genre_preferences(listen_events):
     """Analyze genre preferences by subscription level"""
     print("\n=== Genre Preference Analysis ===")
     
-    # Genre distribution by subscription level
-    genre_by_level = listen_events.groupby(['level', 'genre']).size().unstack(fill_value=0)
+    # Genre counts and share within each subscription level in one pass
+    genre_stats = compute_metrics(listen_events, ['level', 'genre'], [
+        Metric('streams', 'count'),
+        Metric('pct', 'share', within=('level',)),
+    ])
+    genre_by_level = genre_stats['streams'].unstack(fill_value=0)
     
     print("\nGenre distribution by subscription level:")
     print(genre_by_level)
     
-    # Calculate percentage
-    genre_pct = (genre_by_level.T / genre_by_level.sum(axis=1)).T * 100
+    genre_pct = genre_stats['pct'].unstack(fill_value=0) * 100
     print("\nGenre preferences (%):")
     print(genre_pct.round(2))
     
@@ -129,81 +145,75 @@ def generate_regional_report(listen_events):
     """Generate comprehensive regional report"""
     print("\n=== Regional Report ===")
     
-    import sys
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from app.utils.regions import STATE_TO_REGION
-    
-    # Map states to regions
-    listen_events['region'] = listen_events['state'].map(STATE_TO_REGION)
-    
     # Regional statistics
-    regional_stats = listen_events.groupby('region').agg({
-        'userId': 'nunique',
-        'song': 'count',
-        'duration': 'sum',
-        'genre': lambda x: x.mode()[0] if len(x) > 0 else None
-    }).round(2)
-    
-    regional_stats.columns = [
-        'unique_users',
-        'total_streams',
-        'total_duration_seconds',
-        'most_popular_genre'
-    ]
-    
-    # Calculate average streams per user
-    regional_stats['avg_streams_per_user'] = (
-        regional_stats['total_streams'] / regional_stats['unique_users']
-    ).round(2)
+    regional_stats = compute_metrics(listen_events, ['region'], [
+        Metric('unique_users', 'nunique', 'userId'),
+        Metric('total_streams', 'count'),
+        Metric('total_duration_seconds', 'sum', 'duration'),
+        Metric('most_popular_genre', 'mode', 'genre'),
+        Metric('avg_streams_per_user', 'per_user'),
+    ]).round(2)
     
     print(regional_stats)
     
     return regional_stats
 
 
-def export_for_tableau(listen_events, auth_events, status_change_events):
-    """Export processed data for Tableau"""
+def export_for_tableau(full=False):
+    """Export new rows (or everything when full) as partitioned CSVs for Tableau"""
     print("\n=== Exporting Data for Tableau ===")
     
-    import sys
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from app.utils.regions import STATE_TO_REGION
-    
-    # Add region to all dataframes
-    listen_events['region'] = listen_events['state'].map(STATE_TO_REGION)
-    auth_events['region'] = auth_events['state'].map(STATE_TO_REGION)
-    status_change_events['region'] = status_change_events['state'].map(STATE_TO_REGION)
-    
-    # Export to CSV
-    listen_events.to_csv('tableau_listen_events.csv', index=False)
-    auth_events.to_csv('tableau_auth_events.csv', index=False)
-    status_change_events.to_csv('tableau_status_events.csv', index=False)
-    
-    print("Exported data to:")
-    print("  - tableau_listen_events.csv")
-    print("  - tableau_auth_events.csv")
-    print("  - tableau_status_events.csv")
+    with Session(engine) as db:
+        if full:
+            exported = export_full(db, TABLEAU_EXPORT_DIR)
+        else:
+            exported = export_delta(db, TABLEAU_EXPORT_DIR)
+    
+    print(f"{'Full' if full else 'Delta'} export to {TABLEAU_EXPORT_DIR}:")
+    for table, rows in exported.items():
+        print(f"  - {EXPORTS[table][1]}: {rows} rows")
+
+
+def build_pipeline(full_export=False):
+    """Pipeline tasks and the tasks each one reads from"""
+    # Loads always run; their outputs are hashed so unchanged tables
+    # reuse cached analyses
+    if SEGMENT_DIR:
+        load_listens = Task('listen_events', load_listen_segments, params={'store_dir': SEGMENT_DIR}, cache=False)
+    else:
+        load_listens = Task('listen_events', load_table, params={'table': 'listen_events'}, cache=False)
+    
+    return [
+        load_listens,
+        Task('auth_events', load_table, params={'table': 'auth_events'}, cache=False),
+        Task('status_change_events', load_table, params={'table': 'status_change_events'}, cache=False),
+        Task('listening_patterns', analyze_listening_patterns, inputs=('listen_events',)),
+        Task('user_engagement', analyze_user_engagement, inputs=('listen_events',)),
+        Task('genre_preferences', analyze_genre_preferences, inputs=('listen_events',)),
+        Task('conversion_funnel', analyze_conversion_funnel, inputs=('auth_events', 'status_change_events')),
+        Task('regional_report', generate_regional_report, inputs=('listen_events',)),
+        Task('tableau_export', export_for_tableau, params={'full': full_export}, cache=False),
+    ]
 
 
-def main():
+def main(full_export=False):
     """Main pipeline execution"""
     print("=" * 60)
     print("Zip Listen Analytics - Data Pipeline Example")
     print("=" * 60)
     
     try:
-        # Load data
-        listen_events, auth_events, status_change_events = load_data()
-        
-        # Run analyses
-        listen_events = analyze_listening_patterns(listen_events)
-        user_stats = analyze_user_engagement(listen_events)
-        genre_prefs = analyze_genre_preferences(listen_events)
-        conversion_rate = analyze_conversion_funnel(auth_events, status_change_events)
-        regional_report = generate_regional_report(listen_events)
+        runner = DagRunner(
+            build_pipeline(full_export),
+            cache_dir=PIPELINE_CACHE_DIR or None,
+            max_workers=PIPELINE_WORKERS,
+            executor=PIPELINE_EXECUTOR,
+            cache_max_bytes=PIPELINE_CACHE_MAX_MB * 1024 * 1024 or None,
+        )
+        result = runner.run()
         
-        # Export for Tableau
-        export_for_tableau(listen_events, auth_events, status_change_events)
+        print("\n=== Task Timings ===")
+        print(result.report())
         
         print("\n" + "=" * 60)
         print("Pipeline completed successfully!")
@@ -216,4 +226,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    main(full_export="--full-export" in sys.argv[1:])
@@ -0,0 +1,435 @@
+"""
+Load test for the dashboard API
+
+Replays dashboard viewer sessions against the app. Each page view fires the
+four parallel requests App.js makes. A viewer revalidates its cached
+responses with If-None-Match on later views, the way a browser does, and
+leaves after a few views for a new viewer with an empty cache. Concurrency
+ramps through stages. Each stage reports throughput and p50/p95/p99 latency
+per route and per page view. Results are saved as JSON so saturation points
+can be compared across changes.
+
+Usage:
+    python load_test.py seed loadtest.db [--listens 200000]
+    python load_test.py run --db loadtest.db [--stages 1,2,4,8,16,32] [--label baseline]
+    python load_test.py run --url http://localhost:8000
+    python load_test.py compare loadtest_results/a.json loadtest_results/b.json
+
+Requirements:
+- httpx
+- uvicorn (to start the app for --db)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.utils.regions import STATE_TO_REGION
+
+# The requests App.js fires in parallel on every dashboard load
+DASHBOARD_ROUTES = (
+    ("genres", "/api/genres/by-region"),
+    ("subscribers", "/api/subscribers/by-region"),
+    ("top_artists", "/api/artists/top?limit=10"),
+    ("rising_artists", "/api/artists/rising?limit=10"),
+)
+
+BROWSER_HEADERS = {
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+RESULTS_DIR = os.getenv("LOADTEST_RESULTS_DIR", "loadtest_results")
+
+# A stage whose throughput gains less than this over the best so far is
+# past the saturation point
+SATURATION_GAIN = 0.10
+
+
+@dataclass
+class Sample:
+    stage: int
+    route: str
+    status: int
+    seconds: float
+
+
+@dataclass
+class ViewSample:
+    stage: int
+    seconds: float
+    ok: bool
+
+
+def seed_database(path: str, listens: int = 200000, users: int = 5000, artists: int = 2000, days: int = 30, seed: int = 7):
+    """Create a SQLite database with realistic, reproducible listen, auth and status events"""
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import Session
+
+    from app.db.dedup import ListenDedup
+    from app.db.ingest import ingest_listen_events
+    from app.models.models import AuthEvent, Base, StatusChangeEvent
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{os.path.abspath(path)}")
+    Base.metadata.create_all(engine)
+
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow()
+    states = np.array(sorted(STATE_TO_REGION))
+    user_ids = np.array([f"user{i:06d}" for i in range(users)])
+    user_states = rng.choice(states, users)
+    user_levels = rng.choice(["free", "paid"], users, p=[0.7, 0.3])
+
+    # Artist popularity and user activity both follow a long tail
+    artist_weights = 1 / np.arange(1, artists + 1) ** 1.1
+    user_weights = 1 / np.arange(1, users + 1) ** 0.8
+    listen_users = rng.choice(users, listens, p=user_weights / user_weights.sum())
+    listen_artists = rng.choice(artists, listens, p=artist_weights / artist_weights.sum())
+    genres = np.array(["Rock", "Pop", "Hip-Hop", "Country", "Jazz", "Electronic", "Classical", "R&B"])
+
+    events = pd.DataFrame({
+        "artist": [f"Artist {i}" for i in listen_artists],
+        "song": [f"Song {i}-{j}" for i, j in zip(listen_artists, rng.integers(0, 12, listens))],
+        "duration": rng.gamma(9, 25, listens),
+        "userId": user_ids[listen_users],
+        "state": user_states[listen_users],
+        "zip": [f"{z:05d}" for z in rng.integers(1000, 99999, listens) // 1000 * 1000],
+        "level": user_levels[listen_users],
+        "genre": genres[listen_artists % len(genres)],
+        "timestamp": now - pd.to_timedelta(rng.uniform(0, days * 86400, listens), unit="s").floor("us"),
+    })
+
+    auths = users * 4
+    auth_users = rng.integers(0, users, auths)
+    auth_rows = pd.DataFrame({
+        "success": rng.random(auths) > 0.08,
+        "userId": user_ids[auth_users],
+        "state": user_states[auth_users],
+        "timestamp": now - pd.to_timedelta(rng.uniform(0, days * 86400, auths), unit="s").floor("us"),
+    })
+
+    status_users = np.flatnonzero(user_levels == "paid")
+    status_rows = pd.DataFrame({
+        "level": "paid",
+        "userId": user_ids[status_users],
+        "state": user_states[status_users],
+        "timestamp": now - pd.to_timedelta(rng.uniform(0, days * 86400, len(status_users)), unit="s").floor("us"),
+    })
+
+    with Session(engine) as db:
+        # A fresh database needs no saved dedup filter
+        ingest_listen_events(db, events, dedup=ListenDedup.open(db, path=None))
+        for model, rows in ((AuthEvent, auth_rows), (StatusChangeEvent, status_rows)):
+            records = rows.to_dict("records")
+            for record in records:
+                record["timestamp"] = record["timestamp"].to_pydatetime()
+            db.execute(insert(model), records)
+        db.commit()
+
+    print(f"Seeded {path}: {listens} listens, {auths} auth events, {len(status_rows)} status changes")
+
+
+async def _fetch(client, name: str, path: str, cache: Dict[str, str], stage: int, samples: List[Sample]) -> bool:
+    headers = dict(BROWSER_HEADERS)
+    if path in cache:
+        headers["If-None-Match"] = cache[path]
+
+    started = time.perf_counter()
+    try:
+        response = await client.get(path, headers=headers)
+        status = response.status_code
+        if "etag" in response.headers:
+            cache[path] = response.headers["etag"]
+    except httpx.HTTPError:
+        status = 0
+    samples.append(Sample(stage, name, status, time.perf_counter() - started))
+    return status in (200, 304)
+
+
+async def _viewer(client, stage: int, deadline: float, think_time: float, views_per_session: float,
+                  rng: random.Random, samples: List[Sample], views: List[ViewSample]):
+    """Loop viewer sessions until the stage ends"""
+    while time.monotonic() < deadline:
+        # A new viewer starts with an empty browser cache
+        cache: Dict[str, str] = {}
+        session_views = 1 + int(rng.expovariate(1 / max(views_per_session - 1, 1e-9))) if views_per_session > 1 else 1
+
+        for _ in range(session_views):
+            if time.monotonic() >= deadline:
+                return
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                _fetch(client, name, path, cache, stage, samples) for name, path in DASHBOARD_ROUTES
+            ))
+            views.append(ViewSample(stage, time.perf_counter() - started, all(results)))
+            if think_time > 0:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+
+
+async def run_load(client, stages: Sequence[int], stage_seconds: float, think_time: float = 1.0,
+                   views_per_session: float = 3.0, seed: int = 0) -> dict:
+    """Ramp through the concurrency stages and summarize each one"""
+    samples: List[Sample] = []
+    views: List[ViewSample] = []
+    durations = []
+    rng = random.Random(seed)
+
+    for stage, concurrency in enumerate(stages):
+        started = time.monotonic()
+        deadline = started + stage_seconds
+        await asyncio.gather(*(
+            _viewer(client, stage, deadline, think_time, views_per_session,
+                    random.Random(rng.random()), samples, views)
+            for _ in range(concurrency)
+        ))
+        durations.append(time.monotonic() - started)
+        summary = summarize_stage(concurrency, durations[-1], samples, views, stage)
+        print(
+            f"  {concurrency:>4} viewers: {summary['throughput_rps']:8.1f} req/s"
+            f"  view p95 {summary['view_p95_ms']:8.1f} ms  errors {summary['errors']}"
+        )
+
+    return summarize(stages, durations, samples, views)
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.array(seconds) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+def summarize_stage(concurrency: int, seconds: float, samples: List[Sample], views: List[ViewSample], stage: int) -> dict:
+    stage_samples = [sample for sample in samples if sample.stage == stage]
+    stage_views = [view for view in views if view.stage == stage]
+
+    routes = {}
+    for name, _ in DASHBOARD_ROUTES:
+        route_samples = [sample for sample in stage_samples if sample.route == name]
+        routes[name] = {
+            "requests": len(route_samples),
+            "not_modified": sum(sample.status == 304 for sample in route_samples),
+            "errors": sum(sample.status not in (200, 304) for sample in route_samples),
+            **_percentiles([sample.seconds for sample in route_samples]),
+        }
+
+    view_latency = _percentiles([view.seconds for view in stage_views])
+    return {
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "requests": len(stage_samples),
+        "throughput_rps": round(len(stage_samples) / seconds, 2) if seconds else 0.0,
+        "views_per_second": round(len(stage_views) / seconds, 2) if seconds else 0.0,
+        "errors": sum(sample.status not in (200, 304) for sample in stage_samples),
+        **{f"view_{key}": value for key, value in view_latency.items()},
+        "routes": routes,
+    }
+
+
+def saturation_point(stages: List[dict]) -> Optional[dict]:
+    """Last stage before throughput stops growing with concurrency"""
+    best = None
+    for stage in stages:
+        if best is not None and stage["throughput_rps"] < best["throughput_rps"] * (1 + SATURATION_GAIN):
+            return {"concurrency": best["concurrency"], "throughput_rps": best["throughput_rps"]}
+        if best is None or stage["throughput_rps"] > best["throughput_rps"]:
+            best = stage
+    return None
+
+
+def summarize(stages: Sequence[int], durations: Sequence[float], samples: List[Sample], views: List[ViewSample]) -> dict:
+    summaries = [
+        summarize_stage(concurrency, durations[index], samples, views, index)
+        for index, concurrency in enumerate(stages)
+    ]
+    return {"stages": summaries, "saturation": saturation_point(summaries)}
+
+
+def print_report(summary: dict):
+    print(f"\n{'viewers':>7}  {'req/s':>8}  {'views/s':>8}  {'errors':>6}  {'view p50':>9}  {'view p95':>9}  {'view p99':>9}")
+    for stage in summary["stages"]:
+        print(
+            f"{stage['concurrency']:>7}  {stage['throughput_rps']:>8.1f}  {stage['views_per_second']:>8.1f}"
+            f"  {stage['errors']:>6}  {_ms(stage['view_p50_ms'])}  {_ms(stage['view_p95_ms'])}  {_ms(stage['view_p99_ms'])}"
+        )
+
+    print(f"\n{'viewers':>7}  {'route':<15}  {'reqs':>6}  {'304s':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}")
+    for stage in summary["stages"]:
+        for name, route in stage["routes"].items():
+            print(
+                f"{stage['concurrency']:>7}  {name:<15}  {route['requests']:>6}  {route['not_modified']:>6}"
+                f"  {_ms(route['p50_ms'])}  {_ms(route['p95_ms'])}  {_ms(route['p99_ms'])}"
+            )
+
+    saturation = summary["saturation"]
+    if saturation:
+        print(f"\nSaturation: {saturation['throughput_rps']:.1f} req/s at {saturation['concurrency']} viewers")
+    else:
+        print("\nSaturation: not reached; throughput still growing at the last stage")
+
+
+def _ms(value) -> str:
+    return f"{'-':>9}" if value is None else f"{value:>9.1f}"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(summary: dict, config: dict, label: str, directory: str = RESULTS_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{datetime.now():%Y%m%d-%H%M%S}-{label}.json")
+    with open(path, "w") as f:
+        json.dump({"label": label, "commit": _git_commit(), "config": config, **summary}, f, indent=2)
+    return path
+
+
+def compare(paths: Sequence[str]):
+    """Print throughput and view p95 per concurrency, one column group per result file"""
+    results = []
+    for path in paths:
+        with open(path) as f:
+            results.append(json.load(f))
+
+    header = f"{'viewers':>7}"
+    for result in results:
+        name = f"{result['label']}@{result.get('commit') or '?'}"
+        header += f"  {name[:20]:>20}"
+    print(header)
+    print(f"{'':>7}" + "".join(f"  {'req/s':>8} {'view p95':>11}" for _ in results))
+
+    levels = sorted({stage["concurrency"] for result in results for stage in result["stages"]})
+    for level in levels:
+        line = f"{level:>7}"
+        for result in results:
+            stage = next((s for s in result["stages"] if s["concurrency"] == level), None)
+            if stage is None:
+                line += f"  {'-':>20}"
+            else:
+                p95 = stage["view_p95_ms"]
+                line += f"  {stage['throughput_rps']:>8.1f} {'-' if p95 is None else f'{p95:.1f}':>11}"
+        print(line)
+
+    for result in results:
+        saturation = result.get("saturation")
+        where = f"{saturation['throughput_rps']:.1f} req/s at {saturation['concurrency']} viewers" if saturation else "not reached"
+        print(f"Saturation {result['label']}: {where}")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path: str, workers: int = 1, port: Optional[int] = None) -> Tuple[subprocess.Popen, str]:
+    """Run the app under uvicorn on a seeded SQLite database"""
+    port = port or _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.abspath(db_path)}",
+        SCHEDULER_ENABLED=os.getenv("SCHEDULER_ENABLED", "false"),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy within 30s")
+
+
+async def _run(url: str, args) -> dict:
+    # Browsers open up to 6 connections per host
+    limits = httpx.Limits(max_connections=max(args.stages) * 6, max_keepalive_connections=max(args.stages) * 6)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        # Warm up caches and connection pools outside the measured stages
+        await asyncio.gather(*(client.get(path) for _, path in DASHBOARD_ROUTES))
+        return await run_load(client, args.stages, args.stage_seconds, args.think_time, args.views_per_session, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay dashboard traffic and report tail latency")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed = commands.add_parser("seed", help="create a seeded SQLite database")
+    seed.add_argument("db")
+    seed.add_argument("--listens", type=int, default=200000)
+    seed.add_argument("--users", type=int, default=5000)
+    seed.add_argument("--artists", type=int, default=2000)
+
+    run = commands.add_parser("run", help="ramp viewer concurrency and report latency")
+    target = run.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="seeded SQLite database to start the app on")
+    target.add_argument("--url", help="already running app")
+    run.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the app")
+    run.add_argument("--stages", type=lambda value: [int(v) for v in value.split(",")], default=[1, 2, 4, 8, 16, 32])
+    run.add_argument("--stage-seconds", type=float, default=15)
+    run.add_argument("--think-time", type=float, default=1.0, help="mean seconds between page views (0 for none)")
+    run.add_argument("--views-per-session", type=float, default=3.0, help="mean page views per viewer session")
+    run.add_argument("--timeout", type=float, default=30)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--label", default="run")
+
+    compare_parser = commands.add_parser("compare", help="compare saved results")
+    compare_parser.add_argument("results", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        seed_database(args.db, listens=args.listens, users=args.users, artists=args.artists)
+    elif args.command == "compare":
+        compare(args.results)
+    else:
+        process = None
+        url = args.url
+        if args.db:
+            process, url = start_server(args.db, workers=args.workers)
+        try:
+            print(f"Replaying dashboard sessions against {url}")
+            summary = asyncio.run(_run(url, args))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+        print_report(summary)
+        config = {key: value for key, value in vars(args).items() if key != "command"}
+        print(f"\nSaved {save_results(summary, config, args.label)}")
+
+
+if __name__ == "__main__":
+    main()
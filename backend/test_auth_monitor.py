@@ -0,0 +1,164 @@
+"""
+Tests for sliding-window auth failure monitoring.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.analytics.auth_monitor import AuthMonitor, SlidingWindowCounter
+from app.models.models import AuthEvent, Base
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def at(clock, offset=0.0):
+    return datetime.utcfromtimestamp(clock.now + offset)
+
+
+def test_window_expiry():
+    """Test that counts leave the window as it slides."""
+    counter = SlidingWindowCounter(60, buckets=60)
+    start = 1_000_000.0
+
+    counter.add(start, True)
+    counter.add(start + 10, False)
+    counter.add(start + 30, False)
+    assert counter.counts(start + 30) == (3, 2)
+    assert counter.counts(start + 65) == (2, 2)
+    assert counter.counts(start + 85) == (1, 1)
+    assert counter.counts(start + 3600) == (0, 0)
+
+    # Events older than the window are ignored
+    counter.add(start, False)
+    assert counter.counts(start + 3600) == (0, 0)
+
+    print("✓ Counts expire as the window slides")
+
+
+def test_spike_flagged_and_cleared():
+    """Test that a failure spike is flagged once and clears when rates recover."""
+    clock = FakeClock()
+    monitor = AuthMonitor(threshold=0.5, min_attempts=10, clock=clock)
+
+    for i in range(8):
+        monitor.record('NY', True, at(clock, -50 + i))
+    for i in range(12):
+        monitor.record('NY', False, at(clock, -40 + i))
+    for i in range(20):
+        monitor.record('CA', True, at(clock, -30 + i))
+
+    states, regions = monitor.rates('1m')
+    ny = next(row for row in states if row['state'] == 'NY')
+    assert ny['attempts'] == 20 and ny['failures'] == 12
+    assert ny['alerting']
+    assert not next(row for row in states if row['state'] == 'CA')['alerting']
+    assert [alert['window'] for alert in monitor.alerts] == ['1m', '15m', '1h']
+
+    clock.now += 120
+    states, _ = monitor.rates('1m')
+    assert not any(row['state'] == 'NY' for row in states)
+
+    for i in range(30):
+        monitor.record('NY', True, at(clock, -10))
+    _, regions = monitor.rates('1h')
+    northeast = next(row for row in regions if row['region'] == 'Northeast')
+    assert northeast['attempts'] == 50
+    assert not northeast['alerting']
+    assert len(monitor.alerts) == 3
+
+    print("✓ Spike flagged once per window and cleared on recovery")
+
+
+def test_region_rollup():
+    """Test that region rates sum their states' counters."""
+    clock = FakeClock()
+    monitor = AuthMonitor(clock=clock)
+
+    for state, success in [('NY', True), ('PA', False), ('PA', True), ('CA', False), ('OK', False)]:
+        monitor.record(state, success, at(clock, -5))
+
+    _, regions = monitor.rates('15m')
+    by_region = {row['region']: row for row in regions}
+    assert by_region['Northeast']['attempts'] == 3
+    assert by_region['Northeast']['failures'] == 1
+    assert by_region['West']['failure_rate'] == 1.0
+    assert by_region['Southeast']['attempts'] == 1
+
+    print("✓ Region rates rolled up from states")
+
+
+def test_poll_tails_auth_events():
+    """Test that polling reads only auth events added since the last poll."""
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    now = datetime.utcnow()
+
+    db.execute(insert(AuthEvent), [
+        {'success': False, 'userId': 'old', 'state': 'NY', 'timestamp': now - timedelta(days=2)},
+        {'success': True, 'userId': 'u1', 'state': 'NY', 'timestamp': now - timedelta(minutes=5)},
+        {'success': False, 'userId': 'u2', 'state': 'NY', 'timestamp': now - timedelta(minutes=1)},
+    ])
+    db.commit()
+
+    monitor = AuthMonitor()
+    assert monitor.poll(db) == 2
+    assert monitor.poll(db) == 0
+
+    db.execute(insert(AuthEvent), [
+        {'success': False, 'userId': 'u3', 'state': 'TX', 'timestamp': now},
+    ])
+    db.commit()
+    assert monitor.poll(db) == 1
+
+    states, _ = monitor.rates('1h')
+    assert {row['state']: row['attempts'] for row in states} == {'NY': 2, 'TX': 1}
+
+    print("✓ Poll tails auth_events from the last seen id")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running auth monitor tests...\n")
+
+    tests = [
+        test_window_expiry,
+        test_spike_flagged_and_cleared,
+        test_region_rollup,
+        test_poll_tails_auth_events,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,206 @@
+"""
+Tests for the incremental cohort conversion engine.
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.analytics.cohorts import cohort_conversion, refresh_cohorts
+from app.models.models import AuthEvent, Base, StatusChangeEvent, UserCohort
+
+START = datetime(2024, 1, 1)
+
+
+def make_session():
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def make_events(seed, users=300):
+    rnd = random.Random(seed)
+    auths, statuses = [], []
+    for i in range(users):
+        user = f'user{i:04d}'
+        state = rnd.choice(['NY', 'CA', 'TX', 'IL', 'OK'])
+        first = START + timedelta(days=rnd.uniform(0, 28))
+        for _ in range(rnd.randint(1, 4)):
+            auths.append({
+                'success': rnd.random() > 0.2,
+                'userId': user,
+                'state': state,
+                'timestamp': first + timedelta(days=rnd.uniform(0, 10)),
+            })
+        if rnd.random() < 0.4:
+            statuses.append({
+                'level': 'paid',
+                'userId': user,
+                'state': state,
+                'timestamp': first + timedelta(days=rnd.uniform(-3, 20)),
+            })
+        if rnd.random() < 0.3:
+            statuses.append({'level': 'free', 'userId': user, 'state': state, 'timestamp': first})
+    # Arrival order is not timestamp order
+    rnd.shuffle(auths)
+    rnd.shuffle(statuses)
+    return auths, statuses
+
+
+def cohort_table(db):
+    return cohort_conversion(db, granularity='day').sort_values(['cohort', 'region']).reset_index(drop=True)
+
+
+def test_matches_global_funnel():
+    """Test that cohort totals agree with the global conversion funnel."""
+    db = make_session()
+    auths, statuses = make_events(seed=1)
+    db.execute(insert(AuthEvent), auths)
+    db.execute(insert(StatusChangeEvent), statuses)
+    db.commit()
+    refresh_cohorts(db)
+
+    auth_df = pd.DataFrame(auths)
+    status_df = pd.DataFrame(statuses)
+    authed = set(auth_df[auth_df['success']]['userId'])
+    paid = set(status_df[status_df['level'] == 'paid']['userId'])
+
+    result = cohort_conversion(db, granularity='week')
+    assert result['users'].sum() == len(authed)
+    assert result['conversions'].sum() == len(authed & paid)
+
+    first_seen = auth_df[auth_df['success']].groupby('userId')['timestamp'].min()
+    user = db.get(UserCohort, first_seen.index[0])
+    assert user.cohort_date == first_seen.iloc[0].date()
+
+    print("✓ Cohort totals match the global funnel")
+
+
+def test_incremental_matches_full_build():
+    """Test that refreshing in batches gives the same counts as one build."""
+    auths, statuses = make_events(seed=2)
+
+    full = make_session()
+    full.execute(insert(AuthEvent), auths)
+    full.execute(insert(StatusChangeEvent), statuses)
+    full.commit()
+    refresh_cohorts(full)
+
+    incremental = make_session()
+    for part in range(4):
+        incremental.execute(insert(AuthEvent), auths[part::4])
+        incremental.execute(insert(StatusChangeEvent), statuses[part::4])
+        incremental.commit()
+        refresh_cohorts(incremental)
+
+    # A user's cohort is fixed by the first successful auth seen, which can
+    # differ when an earlier auth arrives in a later batch; compare totals
+    assert refresh_cohorts(incremental) == 0
+    full_totals = cohort_table(full).groupby('region')[['users', 'conversions']].sum()
+    incremental_totals = cohort_table(incremental).groupby('region')[['users', 'conversions']].sum()
+    assert full_totals.equals(incremental_totals)
+
+    print("✓ Incremental refreshes match a full build")
+
+
+def test_late_committed_events_are_counted():
+    """Test that events committed after the watermark passed their ids are folded once."""
+    db = make_session()
+
+    def auth(event_id, user, day=0):
+        return {'id': event_id, 'success': True, 'userId': user, 'state': 'NY', 'timestamp': START + timedelta(days=day)}
+
+    # Id 3 is still in flight when the first refresh runs
+    db.execute(insert(AuthEvent), [auth(1, 'a'), auth(2, 'b'), auth(4, 'c'), auth(5, 'd')])
+    db.execute(insert(StatusChangeEvent), [
+        {'id': 2, 'level': 'paid', 'userId': 'a', 'state': 'NY', 'timestamp': START + timedelta(days=1)},
+    ])
+    db.commit()
+    assert refresh_cohorts(db) == 4
+
+    db.execute(insert(AuthEvent), [auth(3, 'late', day=2)])
+    db.execute(insert(StatusChangeEvent), [
+        {'id': 1, 'level': 'paid', 'userId': 'late', 'state': 'NY', 'timestamp': START + timedelta(days=3)},
+    ])
+    db.commit()
+    assert refresh_cohorts(db) == 1
+    assert refresh_cohorts(db) == 0
+
+    result = cohort_conversion(db, granularity='week')
+    assert result['users'].sum() == 5
+    assert result['conversions'].sum() == 2
+    print("✓ Late committed events are counted once")
+
+
+def test_within_days_and_region():
+    """Test conversion windows and region filtering."""
+    db = make_session()
+    db.execute(insert(AuthEvent), [
+        {'success': True, 'userId': 'a', 'state': 'NY', 'timestamp': START},
+        {'success': True, 'userId': 'b', 'state': 'NY', 'timestamp': START + timedelta(days=1)},
+        {'success': True, 'userId': 'c', 'state': 'CA', 'timestamp': START + timedelta(days=2)},
+        {'success': False, 'userId': 'd', 'state': 'CA', 'timestamp': START},
+    ])
+    db.execute(insert(StatusChangeEvent), [
+        {'level': 'paid', 'userId': 'a', 'state': 'NY', 'timestamp': START + timedelta(days=2)},
+        {'level': 'paid', 'userId': 'b', 'state': 'NY', 'timestamp': START + timedelta(days=30)},
+        {'level': 'paid', 'userId': 'd', 'state': 'CA', 'timestamp': START},
+    ])
+    db.commit()
+    refresh_cohorts(db)
+
+    week = cohort_conversion(db, granularity='week', region='Northeast')
+    assert week.to_dict('records') == [{
+        'cohort': START.date(), 'region': 'Northeast', 'users': 2, 'conversions': 2, 'conversion_rate': 1.0
+    }]
+
+    within = cohort_conversion(db, granularity='week', region='Northeast', within_days=7)
+    assert within['conversions'].tolist() == [1]
+
+    days = cohort_conversion(db, granularity='day')
+    assert days['users'].tolist() == [1, 1, 1]
+    assert days.set_index('region').loc['West', 'conversions'] == 0
+
+    print("✓ Conversion windows and region filter applied")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running cohort tests...\n")
+
+    tests = [
+        test_matches_global_funnel,
+        test_incremental_matches_full_build,
+        test_late_committed_events_are_counted,
+        test_within_days_and_region,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,248 @@
+"""
+Tests for the pipeline DAG runner.
+"""
+
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.pipeline.dag import ContentCache, DagRunner, Task, TaskError, content_hash
+
+
+def test_independent_tasks_run_in_parallel():
+    """Test that tasks without a dependency between them overlap."""
+    barrier = threading.Barrier(2, timeout=5)
+
+    def source():
+        return 1
+
+    def left(value):
+        barrier.wait()
+        return value + 1
+
+    def right(value):
+        barrier.wait()
+        return value + 2
+
+    def total(a, b):
+        return a + b
+
+    result = DagRunner([
+        Task('source', source),
+        Task('left', left, inputs=('source',)),
+        Task('right', right, inputs=('source',)),
+        Task('total', total, inputs=('left', 'right')),
+    ], max_workers=2).run()
+
+    assert result.outputs['total'] == 5
+    assert [t.name for t in result.timings][-1] == 'total'
+    assert all(t.status == 'ran' for t in result.timings)
+    assert 'total' in result.report()
+    print("✓ Independent tasks run in parallel")
+
+
+def test_cache_recomputes_only_changed_tasks():
+    """Test that reruns reuse cached results unless inputs change."""
+    cache_dir = tempfile.mkdtemp()
+    data = {'frame': pd.DataFrame({'genre': ['Rock', 'Pop', 'Rock']})}
+
+    def load():
+        return data['frame']
+
+    def counts(df):
+        print("counting genres")
+        return df['genre'].value_counts().to_dict()
+
+    def top(counts):
+        return max(counts, key=counts.get)
+
+    def tasks():
+        return [
+            Task('load', load, cache=False),
+            Task('counts', counts, inputs=('load',)),
+            Task('top', top, inputs=('counts',)),
+        ]
+
+    first = DagRunner(tasks(), cache_dir=cache_dir).run()
+    assert first.outputs['top'] == 'Rock'
+
+    second = DagRunner(tasks(), cache_dir=cache_dir).run()
+    status = {t.name: t.status for t in second.timings}
+    assert status == {'load': 'ran', 'counts': 'cached', 'top': 'cached'}
+    assert second.outputs['counts'] == {'Rock': 2, 'Pop': 1}
+
+    data['frame'] = pd.DataFrame({'genre': ['Pop', 'Pop', 'Rock']})
+    third = DagRunner(tasks(), cache_dir=cache_dir).run()
+    status = {t.name: t.status for t in third.timings}
+    assert status == {'load': 'ran', 'counts': 'ran', 'top': 'ran'}
+    assert third.outputs['top'] == 'Pop'
+    print("✓ Cache recomputes only changed tasks")
+
+
+def test_params_are_part_of_cache_key():
+    """Test that tasks with different parameters don't share results."""
+    cache_dir = tempfile.mkdtemp()
+
+    def scale(factor):
+        return factor * 10
+
+    first = DagRunner([Task('scale', scale, params={'factor': 1})], cache_dir=cache_dir).run()
+    second = DagRunner([Task('scale', scale, params={'factor': 2})], cache_dir=cache_dir).run()
+    assert first.outputs['scale'] == 10
+    assert second.outputs['scale'] == 20
+    assert second.timings[0].status == 'ran'
+    print("✓ Parameters are part of the cache key")
+
+
+def test_helper_changes_invalidate_cache():
+    """Test that editing a module a task calls into, or bumping its version, reruns it."""
+    cache_dir = tempfile.mkdtemp()
+    module_dir = tempfile.mkdtemp()
+    with open(os.path.join(module_dir, 'dag_test_helpers.py'), 'w') as f:
+        f.write("def label(n):\n    return f'{n} listens'\n")
+    with open(os.path.join(module_dir, 'dag_test_tasks.py'), 'w') as f:
+        f.write("from dag_test_helpers import label\n\n\ndef describe():\n    return label(3)\n")
+    sys.path.insert(0, module_dir)
+    try:
+        import dag_test_tasks
+
+        def statuses(version=''):
+            result = DagRunner([Task('describe', dag_test_tasks.describe, version=version)], cache_dir=cache_dir).run()
+            return result.timings[0].status, result.outputs['describe']
+
+        assert statuses() == ('ran', '3 listens')
+        assert statuses() == ('cached', '3 listens')
+
+        with open(os.path.join(module_dir, 'dag_test_helpers.py'), 'w') as f:
+            f.write("def label(n):\n    return f'{n} plays'\n")
+        importlib.reload(sys.modules['dag_test_helpers'])
+        importlib.reload(dag_test_tasks)
+        assert statuses() == ('ran', '3 plays')
+        assert statuses() == ('cached', '3 plays')
+        assert statuses(version='2') == ('ran', '3 plays')
+    finally:
+        sys.path.remove(module_dir)
+        sys.modules.pop('dag_test_tasks', None)
+        sys.modules.pop('dag_test_helpers', None)
+    print("✓ Helper changes invalidate the cache")
+
+
+def test_timings_exclude_queue_wait():
+    """Test that a task's time starts when it runs, not when it is queued."""
+    def slow():
+        time.sleep(0.2)
+        return 1
+
+    result = DagRunner([Task('a', slow), Task('b', slow)], max_workers=1).run()
+    assert result.wall_seconds >= 0.4
+    assert all(0.15 < t.seconds < 0.35 for t in result.timings), result.report()
+    print("✓ Timings exclude queue wait")
+
+
+def test_cache_evicts_least_recently_used():
+    """Test that a size-capped cache drops the entries read least recently."""
+    cache_dir = tempfile.mkdtemp()
+    cache = ContentCache(cache_dir, max_bytes=3000)
+    payload = b'x' * 900
+    for age, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, payload)
+        # Explicit mtimes so the order doesn't depend on timestamp resolution
+        os.utime(os.path.join(cache_dir, f'{key}.pkl'), (1000 + age, 1000 + age))
+
+    assert cache.get('a') == (True, payload)
+    cache.put('d', payload)
+    assert cache.get('b') == (False, None)
+    assert all(cache.get(key)[0] for key in ['a', 'c', 'd'])
+    print("✓ Cache evicts least recently used entries")
+
+
+def test_content_hash():
+    """Test that equal frames hash equally and changes are detected."""
+    a = pd.DataFrame({'x': [1, 2, 3]})
+    assert content_hash(a) == content_hash(a.copy())
+    assert content_hash(a) != content_hash(a.assign(x=[1, 2, 4]))
+    assert content_hash(a) != content_hash(a.astype(float))
+    assert content_hash({'a': a, 'n': 1}) == content_hash({'n': 1, 'a': a.copy()})
+    print("✓ Content hash")
+
+
+def test_invalid_graphs_and_failures():
+    """Test graph validation and that failures stop dependent tasks."""
+    def noop(*args):
+        return None
+
+    for tasks in (
+        [Task('a', noop, inputs=('missing',))],
+        [Task('a', noop, inputs=('b',)), Task('b', noop, inputs=('a',))],
+        [Task('a', noop), Task('a', noop)],
+    ):
+        try:
+            DagRunner(tasks)
+            assert False, "Expected ValueError"
+        except ValueError:
+            pass
+
+    ran = []
+
+    def broken():
+        raise RuntimeError("boom")
+
+    def downstream(value):
+        ran.append(value)
+
+    try:
+        DagRunner([
+            Task('broken', broken),
+            Task('downstream', downstream, inputs=('broken',)),
+        ]).run()
+        assert False, "Expected TaskError"
+    except TaskError as e:
+        assert e.name == 'broken'
+        assert isinstance(e.error, RuntimeError)
+    assert ran == []
+    print("✓ Invalid graphs and failures")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running DAG runner tests...\n")
+
+    tests = [
+        test_independent_tasks_run_in_parallel,
+        test_cache_recomputes_only_changed_tasks,
+        test_params_are_part_of_cache_key,
+        test_helper_changes_invalidate_cache,
+        test_timings_exclude_queue_wait,
+        test_cache_evicts_least_recently_used,
+        test_content_hash,
+        test_invalid_graphs_and_failures,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,240 @@
+"""
+Tests for ingest-time deduplication of listen events.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, delete, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db import dedup as dedup_module
+from app.db.dedup import ListenDedup, listen_keys
+from app.db.ingest import ingest_listen_events
+from app.models.models import Base, ListenEvent
+from app.storage.bloom import BloomFilter
+
+
+def make_session():
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def make_events(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'artist': 'Artist',
+        'song': [f'Song {i}' for i in rng.integers(0, 50, rows)],
+        'duration': 200.0,
+        'userId': [f'user{i}' for i in rng.integers(0, 100, rows)],
+        'state': 'NY',
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 10**12, rows), unit='us'),
+    })
+
+
+def listen_count(db):
+    return db.scalar(select(func.count(ListenEvent.id)))
+
+
+def test_bloom_filter():
+    """Test no false negatives, a false-positive rate near target and a save/load round trip."""
+    present = listen_keys(make_events(20000, seed=1))
+    absent = listen_keys(make_events(20000, seed=2))
+    bloom = BloomFilter(20000, fp_rate=0.01)
+    bloom.add(present)
+
+    assert bloom.contains(present).all()
+    rate = bloom.contains(absent).mean()
+    assert rate < 0.02, rate
+    assert abs(bloom.expected_fp_rate() - 0.01) < 0.005
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'listens.bloom')
+        bloom.meta = {'last_id': 7}
+        bloom.save(path)
+        loaded = BloomFilter.load(path)
+        assert loaded.meta == {'last_id': 7}
+        assert loaded.count == 20000
+        assert (loaded.contains(absent) == bloom.contains(absent)).all()
+    print("✓ Bloom filter test passed")
+
+
+def test_reingest_skips_duplicates():
+    """Test that replaying an import and repeats within one import insert nothing twice."""
+    db = make_session()
+    events = make_events(500)
+    dedup = ListenDedup.open(db, path=None)
+
+    assert ingest_listen_events(db, pd.concat([events, events.iloc[:50]]), dedup=dedup) == 500
+    assert ingest_listen_events(db, events, dedup=dedup) == 0
+    assert listen_count(db) == 500
+
+    # A different song at the same time by the same user is a new listen
+    changed = events.iloc[:10].assign(song='Another Song')
+    assert ingest_listen_events(db, changed, dedup=dedup) == 10
+    assert dedup.stats.rows == 1060
+    assert dedup.stats.duplicates == 550
+    print("✓ Re-ingest test passed")
+
+
+def test_filter_persists_and_catches_up():
+    """Test that a saved filter is reloaded and picks up rows inserted since it was saved."""
+    db = make_session()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'listens.bloom')
+        first, later = make_events(300, seed=1), make_events(300, seed=2)
+        assert ingest_listen_events(db, first, dedup=ListenDedup.open(db, path)) == 300
+        ListenDedup.open(db, path).save()
+
+        # Rows inserted without going through ingest
+        records = later.to_dict('records')
+        for record in records:
+            record['timestamp'] = record['timestamp'].to_pydatetime()
+        db.execute(insert(ListenEvent), records)
+        db.commit()
+
+        dedup = ListenDedup.open(db, path)
+        assert dedup.last_id == 600
+        assert dedup.bloom.contains(listen_keys(later)).all()
+        assert ingest_listen_events(db, pd.concat([first, later]), dedup=dedup) == 0
+
+        # A filter saved against a table that has since shrunk is rebuilt
+        db.query(ListenEvent).filter(ListenEvent.id > 300).delete()
+        db.commit()
+        dedup.bloom.meta['last_id'] = 900
+        dedup.save()
+        dedup = ListenDedup.open(db, path)
+        assert dedup.last_id == 300
+        assert ingest_listen_events(db, later, dedup=dedup) == 300
+    print("✓ Persistence test passed")
+
+
+def test_false_positives_are_inserted():
+    """Test that rows the filter wrongly flags pass the exact check and are counted."""
+    db = make_session()
+    dedup = ListenDedup.open(db, path=None)
+    ingest_listen_events(db, make_events(100, seed=1), dedup=dedup)
+
+    # A saturated filter flags every row
+    dedup.bloom._bits[:] = 0xFF
+    new = make_events(100, seed=2)
+    _, _, stats = dedup.filter(db, new)
+    assert stats.candidates == 100
+    assert stats.false_positives == 100
+    assert stats.false_positive_rate == 1.0
+    assert ingest_listen_events(db, new, dedup=dedup) == 100
+    assert listen_count(db) == 200
+    print("✓ False positive test passed")
+
+
+def test_range_scan_matches_lookups():
+    """Test that the streamed range scan used for large batches finds the same duplicates."""
+    db = make_session()
+    first = make_events(400, seed=1)
+    ingest_listen_events(db, first, dedup=ListenDedup.open(db, path=None))
+    mixed = pd.concat([first.iloc[:200], make_events(200, seed=2)])
+
+    threshold = dedup_module.EXACT_SCAN_THRESHOLD
+    try:
+        results = []
+        for value in (threshold, 10):
+            dedup_module.EXACT_SCAN_THRESHOLD = value
+            dedup = ListenDedup.open(db, path=None)
+            dedup.bloom._bits[:] = 0xFF
+            _, _, stats = dedup.filter(db, mixed)
+            results.append((stats.candidates, stats.duplicates, stats.false_positives))
+    finally:
+        dedup_module.EXACT_SCAN_THRESHOLD = threshold
+    assert results[0] == results[1] == (400, 200, 200), results
+    print("✓ Range scan test passed")
+
+
+def test_record_counts_each_key_once():
+    """Test that rows inserted around an ingest don't make the filter count keys twice."""
+    db = make_session()
+    dedup = ListenDedup.open(db, path=None)
+    ingest_listen_events(db, make_events(100, seed=1), dedup=dedup)
+
+    # Another writer leaves the ids non-contiguous for the next batch
+    records = make_events(10, seed=2).to_dict('records')
+    for record in records:
+        record['timestamp'] = record['timestamp'].to_pydatetime()
+    db.execute(insert(ListenEvent), records)
+    db.commit()
+
+    ingest_listen_events(db, make_events(50, seed=3), dedup=dedup)
+    assert dedup.last_id == listen_count(db) == 160
+    assert dedup.bloom.count == 160
+    print("✓ Record count test passed")
+
+
+def test_late_committed_rows_enter_the_filter():
+    """Test that a row committed after the filter passed its id is added and blocks a replay."""
+    db = make_session()
+    events = make_events(100, seed=4)
+    records = events.to_dict('records')
+    for event_id, record in enumerate(records, start=1):
+        record['id'] = event_id
+        record['timestamp'] = record['timestamp'].to_pydatetime()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'listens.bloom')
+        # Row 50 belongs to a concurrent ingest that commits after this open
+        db.execute(insert(ListenEvent), records[:49] + records[50:])
+        db.commit()
+        dedup = ListenDedup.open(db, path)
+        dedup.save()
+        assert dedup.bloom.meta['missing'] == [50]
+
+        db.execute(insert(ListenEvent), [records[49]])
+        db.commit()
+        dedup = ListenDedup.open(db, path)
+        assert dedup.bloom.meta['missing'] == []
+        assert dedup.bloom.count == 100
+        assert ingest_listen_events(db, events.iloc[49:50], dedup=dedup) == 0
+        assert listen_count(db) == 100
+    print("✓ Late commit test passed")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running dedup tests...\n")
+
+    tests = [
+        test_bloom_filter,
+        test_reingest_skips_duplicates,
+        test_filter_persists_and_catches_up,
+        test_false_positives_are_inserted,
+        test_range_scan_matches_lookups,
+        test_record_counts_each_key_once,
+        test_late_committed_rows_enter_the_filter,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
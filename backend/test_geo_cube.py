@@ -0,0 +1,124 @@
+"""
+Tests for the geo hierarchy and the drill-down cube.
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.analytics.geo_cube import GeoCube
+from app.utils.regions import STATE_TO_REGION, get_region
+
+
+def sample_listen_events():
+    return pd.DataFrame({
+        'state': ['NY', 'NY', 'PA', 'CA', 'CA', 'OK', 'OK', 'TX'],
+        'zip': ['10001', '10002', '19104', '94103', '94103', '73301', None, '73301'],
+        'genre': ['Pop', 'Rock', 'Pop', 'Pop', 'Rock', 'Country', 'Country', 'Pop'],
+        'level': ['paid', 'free', 'paid', 'free', 'free', 'paid', 'free', 'paid'],
+        'artist': ['A', 'B', 'A', 'A', 'C', 'D', 'D', 'A'],
+    })
+
+
+def test_oklahoma_is_mapped():
+    """Test that the single geo hierarchy includes Oklahoma."""
+    assert get_region('ok') == 'Southeast'
+    assert len(STATE_TO_REGION) == 50
+    print("✓ Oklahoma maps to Southeast")
+
+
+def test_drill_down_matches_raw_counts():
+    """Test every level and measure against a group-by over raw events."""
+    events = sample_listen_events()
+    cube = GeoCube.from_events(events)
+
+    raw = events.assign(
+        region=events['state'].map(STATE_TO_REGION),
+        zip=events['zip'].fillna('Unknown')
+    )
+
+    for measure in ['genre', 'level', 'artist']:
+        for keys in [['region'], ['region', 'state'], ['region', 'state', 'zip']]:
+            expected = raw.groupby(keys + [measure]).size().to_dict()
+            result = cube.drill_down(measure, level=keys[-1])
+            actual = result.set_index(keys + [measure])['stream_count'].to_dict()
+            assert actual == expected, (measure, keys)
+
+    assert cube.total_streams == len(events)
+    print("✓ Drill-down matches raw counts at region, state and ZIP level")
+
+
+def test_partial_materialization():
+    """Test that artist rollups are only built when first requested."""
+    cube = GeoCube.from_events(sample_listen_events())
+
+    assert ('zip', 'artist') in cube.materialized
+    assert ('region', 'artist') not in cube.materialized
+    assert ('region', 'genre') in cube.materialized
+
+    cube.drill_down('artist', level='region')
+    assert ('region', 'artist') in cube.materialized
+    assert ('state', 'artist') in cube.materialized
+
+    print("✓ Artist rollups materialized lazily")
+
+
+def test_filters_and_limit():
+    """Test branch filters and per-member top-N."""
+    cube = GeoCube.from_events(sample_listen_events())
+
+    west = cube.drill_down('genre', level='state', region='West')
+    assert set(west['state']) == {'CA'}
+
+    ok_zips = cube.drill_down('level', level='zip', state='OK')
+    assert sorted(ok_zips['zip']) == ['73301', 'Unknown']
+
+    top = cube.drill_down('artist', level='region', limit=1)
+    assert top.groupby('region').size().max() == 1
+    assert top.set_index('region').loc['Northeast', 'artist'] == 'A'
+
+    try:
+        cube.drill_down('genre', level='region', state='NY')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError for a state filter at region level")
+
+    print("✓ Region/state filters and top-N limit applied")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running geo cube tests...\n")
+
+    tests = [
+        test_oklahoma_is_mapped,
+        test_drill_down_matches_raw_counts,
+        test_partial_materialization,
+        test_filters_and_limit,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
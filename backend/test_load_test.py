@@ -0,0 +1,156 @@
+"""
+Tests for the dashboard load test harness.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_test
+from app.api.endpoints import router
+from app.db.database import get_db
+from app.models.models import Base, ListenEvent, StatusChangeEvent
+
+
+def make_app():
+    """The API router on an in-memory database, without app.main's startup"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        db.execute(insert(ListenEvent), [
+            {'artist': f'Artist {i % 5}', 'genre': 'Rock', 'state': 'NY', 'timestamp': datetime.utcnow()}
+            for i in range(50)
+        ])
+        db.execute(insert(StatusChangeEvent), [{'level': 'paid', 'state': 'CA', 'timestamp': datetime.utcnow()}])
+        db.commit()
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(router, prefix='/api')
+    app.dependency_overrides[get_db] = override_get_db
+    return app
+
+
+def stage(concurrency, throughput):
+    return {'concurrency': concurrency, 'throughput_rps': throughput}
+
+
+def test_saturation_point():
+    """Test that the knee is the last stage before throughput stops growing."""
+    stages = [stage(1, 10.0), stage(2, 19.0), stage(4, 35.0), stage(8, 37.0), stage(16, 30.0)]
+    assert load_test.saturation_point(stages) == {'concurrency': 4, 'throughput_rps': 35.0}
+
+    growing = [stage(1, 10.0), stage(2, 20.0), stage(4, 40.0)]
+    assert load_test.saturation_point(growing) is None
+    print("✓ Saturation point test passed")
+
+
+def test_summarize_stage():
+    """Test per-route percentiles, 304 counts and error counts."""
+    samples = [load_test.Sample(0, 'genres', 200, ms / 1000) for ms in range(1, 101)]
+    samples += [load_test.Sample(0, 'subscribers', 304, 0.005), load_test.Sample(0, 'subscribers', 0, 1.0)]
+    samples += [load_test.Sample(1, 'genres', 200, 9.0)]
+    views = [load_test.ViewSample(0, 0.1, True), load_test.ViewSample(0, 0.3, False)]
+
+    summary = load_test.summarize_stage(4, 2.0, samples, views, 0)
+    assert summary['requests'] == 102
+    assert summary['throughput_rps'] == 51.0
+    assert summary['views_per_second'] == 1.0
+    assert summary['errors'] == 1
+
+    genres = summary['routes']['genres']
+    assert genres['requests'] == 100
+    assert abs(genres['p50_ms'] - 50.5) < 0.01
+    assert abs(genres['p99_ms'] - 99.01) < 0.01
+    assert summary['routes']['subscribers']['not_modified'] == 1
+    assert summary['routes']['top_artists']['p95_ms'] is None
+    print("✓ Summarize stage test passed")
+
+
+def test_run_load_in_process():
+    """Test a short ramp replaying dashboard views against the API."""
+    app = make_app()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            return await load_test.run_load(client, [1, 2], stage_seconds=0.3, think_time=0, views_per_session=3)
+
+    summary = asyncio.run(run())
+    assert [s['concurrency'] for s in summary['stages']] == [1, 2]
+    for result in summary['stages']:
+        assert result['errors'] == 0
+        assert set(result['routes']) == {name for name, _ in load_test.DASHBOARD_ROUTES}
+        # Every view fires all four requests
+        counts = {route['requests'] for route in result['routes'].values()}
+        assert len(counts) == 1 and counts.pop() > 0
+        # Returning viewers revalidate and get 304s
+        assert result['routes']['top_artists']['not_modified'] > 0
+    print("✓ In-process run test passed")
+
+
+def test_save_and_compare():
+    """Test that saved results can be compared."""
+    summary = {'stages': [dict(stage(1, 10.0), view_p95_ms=12.5)], 'saturation': None}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = load_test.save_results(summary, {'stages': [1]}, 'baseline', directory=tmp)
+        with open(path) as f:
+            saved = json.load(f)
+        assert saved['label'] == 'baseline'
+        assert saved['config'] == {'stages': [1]}
+        assert saved['stages'] == summary['stages']
+        load_test.compare([path, path])
+    print("✓ Save and compare test passed")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running load test harness tests...\n")
+
+    tests = [
+        test_saturation_point,
+        test_summarize_stage,
+        test_run_load_in_process,
+        test_save_and_compare,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,226 @@
+"""
+Tests for the declarative metrics layer.
+"""
+
+import os
+import sys
+
+import pandas as pd
+from sqlalchemy import create_engine, func, select
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.analytics.metrics import Metric, compute_metrics
+from app.api.endpoints import _region_of
+from app.models.models import Base, ListenEvent
+from app.utils.regions import STATE_TO_REGION
+
+
+def sample_listen_events():
+    return pd.DataFrame({
+        'userId': ['u1', 'u2', 'u2', 'u3', 'u4', 'u4', 'u5'],
+        'state': ['NY', 'CA', 'CA', 'TX', 'IL', 'IL', 'NY'],
+        'level': ['paid', 'free', 'free', 'paid', 'free', 'free', 'paid'],
+        'genre': ['Pop', 'Rock', 'Pop', 'Pop', 'Rock', 'Rock', 'Rock'],
+        'song': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+        'duration': [200.0, 180.5, 210.0, 190.0, 240.0, 205.5, 230.0],
+        'timestamp': pd.to_datetime([
+            '2024-01-01 08:00', '2024-01-01 09:30', '2024-01-02 09:10',
+            '2024-01-03 20:00', '2024-01-03 20:45', '2024-01-04 08:15',
+            '2024-01-05 09:00',
+        ]),
+    })
+
+
+def test_regional_report_matches_groupby():
+    """Test the single-pass report against the per-group pandas version."""
+    df = sample_listen_events()
+
+    result = compute_metrics(df, ['region'], [
+        Metric('unique_users', 'nunique', 'userId'),
+        Metric('total_streams', 'count'),
+        Metric('total_duration_seconds', 'sum', 'duration'),
+        Metric('most_popular_genre', 'mode', 'genre'),
+        Metric('avg_streams_per_user', 'per_user'),
+    ])
+
+    expected = df.assign(region=df['state'].map(STATE_TO_REGION)).groupby('region').agg({
+        'userId': 'nunique',
+        'song': 'count',
+        'duration': 'sum',
+        'genre': lambda x: x.mode()[0],
+    })
+
+    assert list(result.columns) == [
+        'unique_users', 'total_streams', 'total_duration_seconds',
+        'most_popular_genre', 'avg_streams_per_user'
+    ]
+    assert result['unique_users'].tolist() == expected['userId'].tolist()
+    assert result['total_streams'].tolist() == expected['song'].tolist()
+    assert result['total_duration_seconds'].tolist() == expected['duration'].tolist()
+    assert result['most_popular_genre'].tolist() == expected['genre'].tolist()
+    assert result['avg_streams_per_user'].tolist() == (expected['song'] / expected['userId']).tolist()
+    assert 'region' not in df.columns
+
+    print("✓ Regional report matches pandas group-by")
+
+
+def test_share_within_dimension():
+    """Test share-of-total normalized within a dimension."""
+    df = sample_listen_events()
+
+    result = compute_metrics(df, ['level', 'genre'], [
+        Metric('streams', 'count'),
+        Metric('pct', 'share', within=('level',)),
+    ])
+
+    assert result.loc[('free', 'Rock'), 'streams'] == 3
+    assert result.loc[('free', 'Rock'), 'pct'] == 0.75
+    assert result['pct'].groupby(level='level').sum().round(6).tolist() == [1.0, 1.0]
+
+    total_share = compute_metrics(df, ['genre'], [Metric('share', 'share', 'duration')])
+    assert round(total_share['share'].sum(), 6) == 1.0
+
+    print("✓ Shares normalized within level and over the grand total")
+
+
+def test_time_dimensions():
+    """Test hour and day-of-week dimensions derived from the timestamp."""
+    df = sample_listen_events()
+
+    hourly = compute_metrics(df, ['hour'], [Metric('streams', 'count')])['streams']
+    assert hourly.to_dict() == {8: 2, 9: 3, 20: 2}
+
+    daily = compute_metrics(df, ['day_of_week'], [Metric('streams', 'count')])['streams']
+    assert daily['Wednesday'] == 2
+    assert 'hour' not in df.columns
+
+    print("✓ Time dimensions derived without modifying the input")
+
+
+def test_pre_aggregated_rollup():
+    """Test rolling state-level counts up to regions as the API does."""
+    df = pd.DataFrame({
+        'state': ['NY', 'PA', 'CA', 'NY'],
+        'genre': ['Pop', 'Pop', 'Rock', 'Rock'],
+        'stream_count': [10, 5, 7, 1],
+    })
+
+    result = compute_metrics(df, ['region', 'genre'], [
+        Metric('stream_count', 'sum', 'stream_count')
+    ]).reset_index()
+
+    assert result.to_dict('records') == [
+        {'region': 'Northeast', 'genre': 'Pop', 'stream_count': 15},
+        {'region': 'Northeast', 'genre': 'Rock', 'stream_count': 1},
+        {'region': 'West', 'genre': 'Rock', 'stream_count': 7},
+    ]
+
+    empty = compute_metrics(df.iloc[0:0], ['region', 'genre'], [
+        Metric('stream_count', 'sum', 'stream_count')
+    ])
+    assert len(empty) == 0
+
+    print("✓ Pre-aggregated counts rolled up to regions")
+
+
+def test_categorical_columns_match_strings():
+    """Test that categorical columns, as loaded from the segment store, give the same report."""
+    df = sample_listen_events()
+    categorical = df.copy()
+    for column in ['userId', 'state', 'level', 'genre']:
+        # Unsorted categories, as in a segment dictionary, plus one unused
+        categories = list(dict.fromkeys(df[column][::-1])) + ['unused']
+        categorical[column] = pd.Categorical(df[column], categories=categories)
+
+    metrics = [
+        Metric('streams', 'count'),
+        Metric('users', 'nunique', 'userId'),
+        Metric('top_state', 'mode', 'state'),
+        Metric('pct', 'share'),
+    ]
+    for dimensions in (['region', 'level'], ['level', 'genre'], ['userId']):
+        expected = compute_metrics(df, dimensions, metrics)
+        result = compute_metrics(categorical, dimensions, metrics)
+        assert result.index.tolist() == expected.index.tolist()
+        for column in expected.columns:
+            assert result[column].tolist() == expected[column].tolist()
+    print("✓ Categorical columns match strings")
+
+
+def test_sql_region_rollup_matches_metrics():
+    """Test that the endpoints' SQL region rollup agrees with the metrics layer."""
+    df = pd.concat([sample_listen_events(), sample_listen_events().assign(state=['OK', 'WV', 'ZZ', 'HI', 'ND', 'ME', 'ny'])])
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    df.drop(columns=['song']).to_sql('listen_events', engine, if_exists='append', index=False)
+
+    region = _region_of(ListenEvent.state)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(region, ListenEvent.genre, func.count())
+            .where(region.isnot(None))
+            .group_by(region, ListenEvent.genre)
+        ).all()
+    from_sql = {(r, genre): count for r, genre, count in rows}
+
+    expected = compute_metrics(df, ['region', 'genre'], [Metric('stream_count', 'count')])
+    assert from_sql == expected['stream_count'].to_dict()
+    print("✓ SQL region rollup matches the metrics layer")
+
+
+def test_invalid_definitions():
+    """Test that unknown dimensions and aggregations are rejected."""
+    df = sample_listen_events()
+
+    for dimensions, metrics in [
+        (['country'], [Metric('streams', 'count')]),
+        (['region'], [Metric('streams', 'median', 'duration')]),
+        (['region'], [Metric('total', 'sum')]),
+        (['region'], [Metric('pct', 'share', within=('level',))]),
+        ([], [Metric('streams', 'count')]),
+    ]:
+        try:
+            compute_metrics(df, dimensions, metrics)
+        except ValueError:
+            continue
+        raise AssertionError(f"Expected ValueError for {dimensions} {metrics}")
+
+    print("✓ Invalid metric definitions rejected")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running metrics tests...\n")
+
+    tests = [
+        test_regional_report_matches_groupby,
+        test_share_within_dimension,
+        test_time_dimensions,
+        test_pre_aggregated_rollup,
+        test_categorical_columns_match_strings,
+        test_sql_region_rollup_matches_metrics,
+        test_invalid_definitions,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
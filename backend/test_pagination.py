@@ -0,0 +1,208 @@
+"""
+Tests for keyset pagination and NDJSON streaming.
+"""
+
+import asyncio
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.api import pagination
+from app.api.endpoints import get_genres_by_region, get_subscribers_by_region, get_top_artists
+from app.models.models import Base, ListenEvent, StatusChangeEvent
+
+
+def make_request(path, query=''):
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'scheme': 'http',
+        'server': ('testserver', 80),
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [],
+    })
+
+
+def make_session():
+    # Streamed bodies are read from a worker thread
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def add_listens(db, artists, states=('NY', 'CA', 'TX', 'IL'), genres=('Rock', 'Pop', 'Jazz')):
+    rows = []
+    for i, artist in enumerate(artists):
+        rows.append({
+            'artist': artist,
+            'genre': genres[i % len(genres)],
+            'state': states[i % len(states)],
+            'timestamp': datetime(2024, 1, 1),
+        })
+    db.execute(insert(ListenEvent), rows)
+    db.commit()
+
+
+def read_stream(response):
+    async def collect():
+        return b''.join([chunk async for chunk in response.body_iterator])
+    return [orjson.loads(line) for line in asyncio.run(collect()).splitlines()]
+
+
+def walk_pages(endpoint, path, db, limit, **params):
+    """Follow X-Next-Cursor until the last page"""
+    rows, cursor, pages = [], None, 0
+    while True:
+        query = f'limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = endpoint(
+            make_request(path, query), limit=limit, cursor=cursor, format='json', db=db, **params
+        )
+        rows += orjson.loads(response.body)
+        pages += 1
+        cursor = response.headers.get('x-next-cursor')
+        if cursor is None:
+            return rows, pages
+        assert response.headers['link'].endswith('rel="next"')
+
+
+def test_cursor_round_trip():
+    """Test that cursors round-trip and malformed cursors are rejected."""
+    cursor = pagination.encode_cursor((12, 'Ärtist/+=', 3))
+    assert pagination.decode_cursor(cursor, (int, str, int)) == (12, 'Ärtist/+=', 3)
+    assert pagination.decode_cursor(None, (int,)) is None
+
+    for bad, types in (
+        ('not a cursor!', (int,)),
+        (pagination.encode_cursor(('a',)), (int,)),
+        (pagination.encode_cursor((1, 'a')), (int,)),
+        (pagination.encode_cursor((True,)), (int,)),
+    ):
+        try:
+            pagination.decode_cursor(bad, types)
+            assert False, "Expected HTTPException"
+        except HTTPException as e:
+            assert e.status_code == 400
+    print("✓ Cursor round trip")
+
+
+def test_top_artist_pages_match_stream():
+    """Test that walking every page yields the full, ranked leaderboard."""
+    db = make_session()
+    # Artist i gets (i % 7) + 1 streams, so there are many ties
+    add_listens(db, [f'artist{i:03d}' for i in range(120) for _ in range((i % 7) + 1)])
+
+    pages, count = walk_pages(get_top_artists, '/api/artists/top', db, limit=25, approx=False)
+    assert count == 5
+    assert len(pages) == 120
+    assert [row['rank'] for row in pages] == list(range(1, 121))
+    keys = [(-row['stream_count'], row['artist']) for row in pages]
+    assert keys == sorted(keys)
+
+    streamed = read_stream(get_top_artists(
+        make_request('/api/artists/top', 'format=ndjson'),
+        limit=None, approx=False, cursor=None, format='ndjson', db=db
+    ))
+    assert streamed == pages
+    print("✓ Top artist pages match the stream")
+
+
+def test_region_pages():
+    """Test pagination of the genre and subscriber breakdowns."""
+    db = make_session()
+    add_listens(db, ['a'] * 60, states=('NY', 'CA', 'TX', 'IL', 'ZZ'), genres=('Rock', 'Pop', 'Jazz', 'Folk'))
+    db.execute(insert(StatusChangeEvent), [
+        {'userId': f'u{i}', 'level': ('free', 'paid')[i % 2], 'state': ('NY', 'CA', 'TX')[i % 3]}
+        for i in range(30)
+    ])
+    db.commit()
+
+    genres, count = walk_pages(get_genres_by_region, '/api/genres/by-region', db, limit=3, region=None, approx=False)
+    everything = orjson.loads(get_genres_by_region(
+        make_request('/api/genres/by-region'), region=None, approx=False, limit=None, cursor=None, format='json', db=db
+    ).body)
+    assert genres == everything
+    assert count == 6
+    assert [(row['region'], row['genre']) for row in genres] == sorted((row['region'], row['genre']) for row in genres)
+    # Unknown states are left out, as before
+    assert sum(row['stream_count'] for row in genres) == 48
+
+    subscribers, _ = walk_pages(get_subscribers_by_region, '/api/subscribers/by-region', db, limit=4, region=None)
+    assert sum(row['user_count'] for row in subscribers) == 30
+    assert len(subscribers) == 6
+    print("✓ Region pages")
+
+
+def test_stream_memory_stays_flat():
+    """Test that streaming reads in batches instead of loading every row."""
+    db = make_session()
+    add_listens(db, [f'artist{i:06d}' for i in range(40000)])
+
+    def peak(limit):
+        response = get_top_artists(
+            make_request('/api/artists/top', 'format=ndjson'),
+            limit=limit, approx=False, cursor=None, format='ndjson', db=db
+        )
+
+        async def consume():
+            lines = 0
+            async for chunk in response.body_iterator:
+                lines += chunk.count(b'\n')
+            return lines
+
+        tracemalloc.start()
+        lines = asyncio.run(consume())
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return lines, peak_bytes
+
+    small_lines, small_peak = peak(2000)
+    large_lines, large_peak = peak(None)
+    assert (small_lines, large_lines) == (2000, 40000)
+    # 20x the rows must not cost anywhere near 20x the memory
+    assert large_peak < small_peak * 4, (small_peak, large_peak)
+    print("✓ Stream memory stays flat")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running pagination tests...\n")
+
+    tests = [
+        test_cursor_round_trip,
+        test_top_artist_pages_match_stream,
+        test_region_pages,
+        test_stream_memory_stays_flat,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,168 @@
+"""
+Tests for conditional, compressed analytics responses.
+"""
+
+import gzip
+import os
+import sys
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.api import responses
+from app.api.endpoints import get_rising_artists, get_top_artists
+from app.models.models import Base, ListenEvent
+from app.schemas.schemas import RisingArtistResponse
+
+
+def make_request(path='/api/artists/top', query='', headers=None):
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+
+def make_session():
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def add_listens(db, artists):
+    db.execute(insert(ListenEvent), [
+        {'artist': artist, 'genre': 'Rock', 'state': 'NY', 'timestamp': datetime(2024, 1, 1)}
+        for artist in artists
+    ])
+    db.commit()
+
+
+def test_etag_depends_on_url_and_version():
+    """Test that ETags change with the query or the data version only."""
+    request = make_request(query='limit=5&approx=false')
+    same = make_request(query='approx=false&limit=5')
+    assert responses.make_etag(request, 10) == responses.make_etag(same, 10)
+    assert responses.make_etag(request, 10) != responses.make_etag(request, 11)
+    assert responses.make_etag(request, 10) != responses.make_etag(make_request(query='limit=6'), 10)
+    assert responses.make_etag(request, 10).startswith('W/"')
+    print("✓ ETag depends on URL and version")
+
+
+def test_not_modified():
+    """Test If-None-Match handling, including weak and listed tags."""
+    etag = responses.make_etag(make_request(), 1)
+    opaque = etag[2:]
+    for header in (etag, opaque, f'"other", {etag}', '*'):
+        response = responses.not_modified(make_request(headers={'If-None-Match': header}), etag)
+        assert response is not None and response.status_code == 304
+        assert response.headers['etag'] == etag
+    assert responses.not_modified(make_request(), etag) is None
+    assert responses.not_modified(make_request(headers={'If-None-Match': '"other"'}), etag) is None
+    print("✓ Not modified")
+
+
+def test_compression_negotiation():
+    """Test that large bodies are compressed with the preferred coding."""
+    assert responses.accepted_encoding('gzip, deflate') == 'gzip'
+    assert responses.accepted_encoding('identity') is None
+    assert responses.accepted_encoding('gzip;q=0') is None
+    assert responses.accepted_encoding('') is None
+    if responses.brotli is not None:
+        assert responses.accepted_encoding('gzip, br') == 'br'
+        assert responses.accepted_encoding('br;q=0, gzip') == 'gzip'
+
+    rows = [{'artist': f'Artist {i}', 'stream_count': i} for i in range(500)]
+    response = responses.json_response(make_request(headers={'Accept-Encoding': 'gzip'}), rows, 'W/"x"')
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert orjson.loads(gzip.decompress(response.body)) == rows
+
+    small = responses.json_response(make_request(headers={'Accept-Encoding': 'gzip'}), rows[:1])
+    assert 'content-encoding' not in small.headers
+    assert orjson.loads(small.body) == rows[:1]
+    print("✓ Compression negotiation")
+
+
+def test_endpoint_revalidation():
+    """Test that an endpoint answers 304 until new events arrive."""
+    db = make_session()
+    add_listens(db, ['A', 'A', 'B'])
+
+    first = get_top_artists(make_request(query='limit=2'), limit=2, approx=False, cursor=None, format='json', db=db)
+    assert orjson.loads(first.body) == [
+        {'artist': 'A', 'stream_count': 2, 'rank': 1},
+        {'artist': 'B', 'stream_count': 1, 'rank': 2},
+    ]
+    etag = first.headers['etag']
+
+    headers = {'If-None-Match': etag}
+    again = get_top_artists(make_request(query='limit=2', headers=headers), limit=2, approx=False, cursor=None, format='json', db=db)
+    assert again.status_code == 304
+
+    add_listens(db, ['B', 'B'])
+    changed = get_top_artists(make_request(query='limit=2', headers=headers), limit=2, approx=False, cursor=None, format='json', db=db)
+    assert changed.status_code == 200
+    assert changed.headers['etag'] != etag
+    assert orjson.loads(changed.body)[0] == {'artist': 'B', 'stream_count': 3, 'rank': 1}
+    print("✓ Endpoint revalidation")
+
+
+def test_rising_artists_skip_null_artists():
+    """Test that listens without an artist don't produce rows the response model rejects."""
+    db = make_session()
+    now = datetime.utcnow()
+    db.execute(insert(ListenEvent), [
+        {'artist': artist, 'genre': 'Rock', 'state': 'NY', 'timestamp': now - timedelta(days=days)}
+        for artist, days in [('A', 1), ('A', 2), ('A', 10), (None, 1), (None, 10), ('B', 3)]
+    ])
+    db.commit()
+
+    response = get_rising_artists(make_request('/api/artists/rising'), limit=10, approx=False, db=db)
+    rows = orjson.loads(response.body)
+    assert sorted(row['artist'] for row in rows) == ['A', 'B']
+    for row in rows:
+        RisingArtistResponse(**row)
+    print("✓ Rising artists skip null artists")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running response tests...\n")
+
+    tests = [
+        test_etag_depends_on_url_and_version,
+        test_not_modified,
+        test_compression_negotiation,
+        test_endpoint_revalidation,
+        test_rising_artists_skip_null_artists,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,263 @@
+"""
+Tests for the stratified sample, checked against exact answers.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import orjson
+import pandas as pd
+from sqlalchemy import create_engine, delete, func, insert, select
+from starlette.requests import Request
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.analytics.metrics import Metric, compute_metrics
+from app.analytics import sampling
+from app.analytics.sampling import estimate_counts, refresh_listen_sample, rollup_estimates, sample_snapshot
+from app.api.endpoints import get_genres_by_region
+from app.jobs.scheduler import job_lock
+from app.models.models import Base, ListenEvent, ListenEventSample, SampleStratum, Watermark, WatermarkGap
+
+STATES = ['NY', 'PA', 'CA', 'WA', 'TX', 'FL', 'IL', 'OH']
+GENRES = ['Pop', 'Rock', 'Hip-Hop', 'Country', None]
+PER_STRATUM = 150
+
+
+def make_session():
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def insert_events(db, count, seed):
+    rnd = random.Random(seed)
+    now = datetime(2024, 6, 1)
+    # Skewed artist popularity so the top of the leaderboard is well separated
+    artists = [f'Artist{i}' for i in range(1, 41)]
+    weights = [1 / i for i in range(1, 41)]
+    db.execute(insert(ListenEvent), [
+        {
+            'artist': rnd.choices(artists, weights)[0],
+            'song': 'song',
+            'duration': 200.0,
+            'userId': f'user{rnd.randint(1, 500)}',
+            'state': rnd.choices(STATES, [5, 2, 6, 2, 4, 3, 3, 1])[0],
+            'level': rnd.choice(['paid', 'free']),
+            'genre': rnd.choices(GENRES, [4, 3, 2, 1, 3])[0],
+            'timestamp': now - timedelta(hours=rnd.uniform(0, 24 * 14)),
+        }
+        for _ in range(count)
+    ])
+    db.commit()
+
+
+def exact_events(db):
+    rows = db.query(ListenEvent.state, ListenEvent.genre, ListenEvent.artist).all()
+    return pd.DataFrame(rows, columns=['state', 'genre', 'artist'])
+
+
+def genres_by_region(db, approx):
+    request = Request({'type': 'http', 'method': 'GET', 'path': '/api/genres/by-region', 'query_string': b'', 'headers': []})
+    response = get_genres_by_region(request, region=None, approx=approx, limit=None, cursor=None, format='json', db=db)
+    return pd.DataFrame(orjson.loads(response.body))
+
+
+def test_genre_by_region_estimates_are_exact():
+    """Test that groups aligned with strata are estimated exactly."""
+    db = make_session()
+    insert_events(db, 20000, seed=1)
+    refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(42))
+
+    approx = rollup_estimates(estimate_counts(db), ['region', 'genre'])
+    exact = compute_metrics(exact_events(db), ['region', 'genre'], [Metric('n', 'count')]).reset_index()
+
+    merged = approx.merge(exact, on=['region', 'genre'])
+    assert len(merged) == len(exact)
+    assert (merged['estimate'].round(6) == merged['n']).all()
+    assert (merged['high'] - merged['low']).max() < 1e-6
+
+    # The endpoint drops null genres in both modes
+    approx = genres_by_region(db, approx=True)
+    exact = genres_by_region(db, approx=False)
+    assert len(approx) == len(exact)
+    assert approx[['region', 'genre', 'stream_count']].equals(exact)
+
+    print("✓ Genre by region estimates equal exact counts")
+
+
+def test_artist_estimates_within_intervals():
+    """Test artist count estimates and 95% interval coverage."""
+    db = make_session()
+    insert_events(db, 20000, seed=2)
+    refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(7))
+
+    approx = rollup_estimates(estimate_counts(db, ['artist']), ['artist']).set_index('artist')
+    exact = exact_events(db).groupby('artist').size()
+
+    top = exact.sort_values(ascending=False).head(5)
+    for artist, count in top.items():
+        assert abs(approx.loc[artist, 'estimate'] - count) / count < 0.2, artist
+
+    covered = [
+        approx.loc[artist, 'low'] <= count <= approx.loc[artist, 'high']
+        for artist, count in exact.items() if artist in approx.index
+    ]
+    assert sum(covered) / len(covered) >= 0.85
+
+    top_approx = approx['estimate'].sort_values(ascending=False).head(3).index
+    assert set(top_approx) <= set(exact.sort_values(ascending=False).head(6).index)
+
+    print(f"✓ Top artists within 20%, {sum(covered)}/{len(covered)} intervals cover the exact count")
+
+
+def test_incremental_refresh():
+    """Test that new events extend the reservoirs from the watermark."""
+    db = make_session()
+    insert_events(db, 8000, seed=3)
+    assert refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(1)) == 8000
+
+    insert_events(db, 4000, seed=4)
+    assert refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(2)) == 4000
+    assert refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(3)) == 0
+
+    strata = pd.DataFrame(
+        db.query(SampleStratum.state, SampleStratum.genre, SampleStratum.population, SampleStratum.sample_size).all(),
+        columns=['state', 'genre', 'population', 'sample_size']
+    ).set_index(['state', 'genre'])
+    # Null genres have their own stratum
+    exact = exact_events(db).fillna({'genre': sampling.UNKNOWN}).groupby(['state', 'genre']).size()
+
+    assert strata['population'].sort_index().to_dict() == exact.sort_index().to_dict()
+    assert (strata['sample_size'] == strata['population'].clip(upper=PER_STRATUM)).all()
+
+    sampled = db.query(func.count(ListenEventSample.event_id)).scalar()
+    assert sampled == strata['sample_size'].sum()
+    assert db.get(Watermark, 'listen_events_sample').last_id == 12000
+
+    print("✓ Sample extended incrementally and bounded per stratum")
+
+
+def test_late_committed_events_are_folded():
+    """Test that an event committed after the watermark passed its id is counted once."""
+    db = make_session()
+    insert_events(db, 500, seed=5)
+
+    # Event 200 stands in for a transaction that commits after the refresh
+    late = dict(db.execute(select(ListenEvent.__table__).where(ListenEvent.id == 200)).mappings().one())
+    db.execute(delete(ListenEvent).where(ListenEvent.id == 200))
+    db.commit()
+    assert refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(1)) == 499
+    assert db.query(WatermarkGap.event_id).scalar() == 200
+
+    db.execute(insert(ListenEvent), [late])
+    db.commit()
+    assert refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(2)) == 1
+    assert refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(3)) == 0
+    assert db.query(func.sum(SampleStratum.population)).scalar() == 500
+    assert db.query(WatermarkGap).count() == 0
+    print("✓ Late committed events are folded once")
+
+
+def test_snapshot_follows_watermark():
+    """Test that the in-memory sample is reused until the watermark moves."""
+    db = make_session()
+    insert_events(db, 3000, seed=5)
+    refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(1))
+    snapshot = sample_snapshot(db)
+    assert sample_snapshot(db) is snapshot
+    assert len(snapshot) == db.query(func.count(ListenEventSample.event_id)).scalar()
+
+    insert_events(db, 1000, seed=6)
+    refresh_listen_sample(db, per_stratum=PER_STRATUM, rng=random.Random(2))
+    assert sample_snapshot(db) is not snapshot
+    assert estimate_counts(db)['estimate'].sum().round(6) == 4000
+
+    # Windows filter the in-memory rows like the SQL predicate would
+    start = datetime(2024, 5, 25)
+    recent = estimate_counts(db, ['artist'], start=start)
+    sampled = db.query(func.count(ListenEventSample.event_id)).filter(ListenEventSample.timestamp >= start).scalar()
+    assert recent['hits'].sum() == sampled
+
+    print("✓ In-memory sample reloads when the watermark moves")
+
+
+def test_first_use_waits_for_running_refresh():
+    """Test that a first approximate query waits for a running refresh job instead of racing it."""
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/sample.db")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        insert_events(db, 2000, seed=7)
+
+    started = threading.Event()
+    order = []
+
+    def scheduled_run():
+        with job_lock(sampling.REFRESH_JOB):
+            started.set()
+            with Session() as db:
+                time.sleep(0.2)
+                refresh_listen_sample(db, per_stratum=PER_STRATUM)
+            order.append('job')
+
+    calls = []
+    original = sampling.refresh_listen_sample
+    sampling.refresh_listen_sample = lambda db: calls.append(db) or original(db)
+    try:
+        job = threading.Thread(target=scheduled_run)
+        job.start()
+        started.wait()
+        with Session() as db:
+            sampling.ensure_listen_sample(db)
+            order.append('request')
+        job.join()
+    finally:
+        sampling.refresh_listen_sample = original
+
+    assert order == ['job', 'request']
+    assert calls == []
+    print("✓ First use waits for the running refresh")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running sampling tests...\n")
+
+    tests = [
+        test_genre_by_region_estimates_are_exact,
+        test_artist_estimates_within_intervals,
+        test_incremental_refresh,
+        test_late_committed_events_are_folded,
+        test_snapshot_follows_watermark,
+        test_first_use_waits_for_running_refresh,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
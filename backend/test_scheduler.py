@@ -0,0 +1,152 @@
+"""
+Tests for the background job scheduler.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.jobs.scheduler import Job, Scheduler
+
+
+def test_single_flight():
+    """Test that a job never overlaps with itself."""
+    release = threading.Event()
+    calls = []
+
+    def slow_job():
+        calls.append(1)
+        release.wait(timeout=5)
+
+    async def scenario():
+        scheduler = Scheduler(lock_dir=tempfile.mkdtemp())
+        scheduler.add_job("slow", slow_job, interval=60)
+        first = asyncio.create_task(scheduler.run_job("slow"))
+        await asyncio.sleep(0.05)
+        second = await scheduler.run_job("slow")
+        release.set()
+        return await first, second, scheduler.jobs["slow"].stats
+
+    ran_first, ran_second, stats = asyncio.run(scenario())
+    assert ran_first and not ran_second
+    assert len(calls) == 1
+    assert stats.runs == 1 and stats.skipped == 1
+
+    print("✓ Overlapping run skipped")
+
+
+def test_exclusive_lock_across_schedulers():
+    """Test that exclusive jobs are single-flight across schedulers sharing a lock dir."""
+    lock_dir = tempfile.mkdtemp()
+    release = threading.Event()
+
+    async def scenario():
+        worker_a = Scheduler(lock_dir=lock_dir)
+        worker_b = Scheduler(lock_dir=lock_dir)
+        worker_a.add_job("refresh", lambda: release.wait(timeout=5), interval=60, exclusive=True)
+        worker_b.add_job("refresh", lambda: None, interval=60, exclusive=True)
+
+        first = asyncio.create_task(worker_a.run_job("refresh"))
+        await asyncio.sleep(0.05)
+        blocked = await worker_b.run_job("refresh")
+        release.set()
+        await first
+        after = await worker_b.run_job("refresh")
+        return blocked, after
+
+    blocked, after = asyncio.run(scenario())
+    assert not blocked
+    assert after
+
+    print("✓ Exclusive job held off by another worker's lock")
+
+
+def test_failures_and_status():
+    """Test failure counting, lag and recovery."""
+    outcomes = [ValueError("boom"), ValueError("boom again"), None]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+
+    async def scenario():
+        scheduler = Scheduler(lock_dir=tempfile.mkdtemp())
+        scheduler.add_job("flaky", flaky, interval=60)
+        await scheduler.run_job("flaky")
+        await scheduler.run_job("flaky")
+        failing = dict(scheduler.status()[0])
+        await scheduler.run_job("flaky")
+        return failing, scheduler.status()[0]
+
+    failing, recovered = asyncio.run(scenario())
+    assert failing["failures"] == 2
+    assert failing["consecutive_failures"] == 2
+    assert failing["last_error"] == "ValueError: boom again"
+    assert failing["last_success_at"] is None
+
+    assert recovered["runs"] == 3
+    assert recovered["consecutive_failures"] == 0
+    assert recovered["lag_seconds"] < 5
+    assert recovered["last_duration_seconds"] is not None
+
+    print("✓ Failures counted and cleared on success")
+
+
+def test_periodic_runs_with_jitter():
+    """Test that started jobs run repeatedly and stop cleanly."""
+    calls = []
+
+    async def scenario():
+        scheduler = Scheduler(lock_dir=tempfile.mkdtemp())
+        scheduler.add_job("tick", lambda: calls.append(1), interval=0.05, jitter=0.2)
+        await scheduler.start()
+        await asyncio.sleep(0.4)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert 3 <= len(calls) <= 12
+
+    job = Job("jittered", lambda: None, interval=100, jitter=0.1)
+    delays = [job.next_delay() for _ in range(200)]
+    assert 90 <= min(delays) and max(delays) <= 110
+
+    print(f"✓ Job ran {len(calls)} times with jittered intervals")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running scheduler tests...\n")
+
+    tests = [
+        test_single_flight,
+        test_exclusive_lock_across_schedulers,
+        test_failures_and_status,
+        test_periodic_runs_with_jitter,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,217 @@
+"""
+Tests for the memory-mapped listen event segment store.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.storage.segments import SegmentStore, count_by_hour
+
+
+def make_events(rows, start='2024-01-01', days=10, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'artist': rng.choice(['A1', 'A2', 'A3'], rows),
+        'song': [f's{i}' for i in rng.integers(0, 50, rows)],
+        'duration': rng.uniform(60, 300, rows),
+        'userId': [f'u{i}' for i in rng.integers(0, 20, rows)],
+        'state': rng.choice(['NY', 'CA', 'TX'], rows),
+        'zip': rng.choice([10001.0, 94105.0], rows),
+        'level': rng.choice(['free', 'paid'], rows),
+        'genre': rng.choice(['Rock', 'Pop'], rows),
+        'timestamp': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 86400, rows), unit='s'),
+    })
+
+
+def test_round_trip():
+    """Test that events read back sorted by time with nulls preserved."""
+    store = SegmentStore(tempfile.mkdtemp())
+    events = make_events(500)
+    events.loc[[3, 7], 'genre'] = None
+    events.loc[5, 'duration'] = np.nan
+    events.loc[9, 'timestamp'] = None
+
+    assert store.append(events, segment_rows=200) == 500
+    assert [segment.rows for segment in store.segments()] == [200, 200, 100]
+
+    frame = store.to_frame()
+    expected = events.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    expected['zip'] = expected['zip'].map(lambda z: str(int(z)))
+    pd.testing.assert_frame_equal(
+        frame.drop(columns=['timestamp', 'duration', 'genre']),
+        expected.drop(columns=['timestamp', 'duration', 'genre']).astype(object)
+    )
+    pd.testing.assert_series_equal(frame['timestamp'], expected['timestamp'].astype('datetime64[ns]'))
+    np.testing.assert_allclose(frame['duration'], expected['duration'])
+    assert frame['genre'].isna().sum() == 2
+    assert frame['timestamp'].isna().sum() == 1 and pd.isna(frame['timestamp'].iloc[-1])
+
+    categorical = store.to_frame(['genre'], categorical=True)
+    assert categorical['genre'].dtype == 'category'
+    assert categorical['genre'].astype(object).where(categorical['genre'].notna(), None).tolist() == frame['genre'].tolist()
+    print("✓ Round trip")
+
+
+def test_dictionaries_are_shared_and_stable():
+    """Test that codes stay fixed across appends and new store instances."""
+    directory = tempfile.mkdtemp()
+    store = SegmentStore(directory)
+    store.append(make_events(100, seed=1))
+    rock = store.dictionaries['genre'].code('Rock')
+
+    other = SegmentStore(directory)
+    other.append(make_events(100, seed=2).assign(genre='Jazz'))
+    store.to_frame()
+    assert store.dictionaries['genre'].code('Rock') == rock
+    assert store.dictionaries['genre'].code('Jazz') is not None
+    assert store.dictionaries['genre'].values == other.dictionaries['genre'].values
+    assert len(store.dictionaries['genre'].values) == 3
+    assert (store.to_frame(['genre'])['genre'] == 'Jazz').sum() == 100
+    print("✓ Dictionaries are shared and stable")
+
+
+def test_repeated_dictionary_lines():
+    """Test that a dictionary with a repeated line, as left by racing writers, still decodes."""
+    directory = tempfile.mkdtemp()
+    store = SegmentStore(directory)
+    store.append(make_events(100, seed=1))
+    path = os.path.join(directory, 'dictionaries', 'artist.ndjson')
+    with open(path, 'rb') as f:
+        first = f.readline()
+    with open(path, 'ab') as f:
+        f.write(first)
+
+    store = SegmentStore(directory)
+    frame = store.to_frame(['artist'])
+    categorical = store.to_frame(['artist'], categorical=True)
+    assert categorical['artist'].astype(object).tolist() == frame['artist'].tolist()
+
+    dictionary = store.dictionaries['artist']
+    duplicate = len(dictionary.values) - 1
+    decoded = dictionary.categorical(np.array([0, duplicate, -1], dtype=np.int32))
+    assert list(decoded.categories) == list(dict.fromkeys(dictionary.values))
+    assert decoded[0] == decoded[1] == dictionary.values[0] and pd.isna(decoded[2])
+    print("✓ Repeated dictionary lines")
+
+
+def test_time_range_scans_are_zero_copy():
+    """Test segment skipping, in-segment binary search and mapped views."""
+    store = SegmentStore(tempfile.mkdtemp())
+    for week, start in enumerate(['2024-01-01', '2024-01-08', '2024-01-15']):
+        store.append(make_events(300, start=start, days=7, seed=week))
+
+    # A staged segment that never committed is ignored
+    os.makedirs(os.path.join(store.directory, 'seg-000099.tmp'))
+    assert len(store.segments()) == 3
+
+    start, end = pd.Timestamp('2024-01-09'), pd.Timestamp('2024-01-11')
+    parts = list(store.scan(['timestamp', 'genre'], start, end))
+    assert len(parts) == 1
+    timestamps = parts[0]['timestamp']
+    assert isinstance(timestamps, np.memmap) and not timestamps.flags.owndata and not timestamps.flags.writeable
+    assert (timestamps >= np.datetime64(start)).all() and (timestamps < np.datetime64(end)).all()
+
+    everything = store.to_frame()
+    in_range = everything[(everything['timestamp'] >= start) & (everything['timestamp'] < end)]
+    assert len(timestamps) == len(in_range)
+    assert list(store.scan(start=pd.Timestamp('2025-01-01'))) == []
+    print("✓ Time range scans are zero copy")
+
+
+def test_count_by_hour():
+    """Test hourly counts with filters against pandas."""
+    store = SegmentStore(tempfile.mkdtemp())
+    events = make_events(2000, seed=3)
+    store.append(events, segment_rows=700)
+
+    start, end = pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-06')
+    counts = count_by_hour(store, start, end, {'genre': ['Rock'], 'state': ['NY', 'CA', 'ZZ']})
+    mask = (
+        (events['timestamp'] >= start) & (events['timestamp'] < end)
+        & (events['genre'] == 'Rock') & events['state'].isin(['NY', 'CA'])
+    )
+    expected = events.loc[mask, 'timestamp'].dt.hour.value_counts().reindex(range(24), fill_value=0)
+    assert counts.tolist() == expected.tolist()
+
+    assert count_by_hour(store).sum() == 2000
+    assert count_by_hour(store, filters={'genre': ['Polka']}).sum() == 0
+    print("✓ Count by hour")
+
+
+def test_concurrent_scans_share_dictionaries():
+    """Test that concurrent scans on a cold store read each dictionary entry once."""
+    directory = tempfile.mkdtemp()
+    events = make_events(2000, seed=4)
+    SegmentStore(directory).append(events, segment_rows=500)
+    expected = (events['genre'] == 'Rock').sum()
+
+    # Switch threads often so refreshes interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            _scan_concurrently(SegmentStore(directory), expected)
+    finally:
+        sys.setswitchinterval(interval)
+    print("✓ Concurrent scans share dictionaries")
+
+
+def _scan_concurrently(store, expected):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def scan():
+        barrier.wait()
+        results.append(count_by_hour(store, filters={'genre': ['Rock']}).sum())
+
+    threads = [threading.Thread(target=scan) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [expected] * 8
+    assert sorted(store.dictionaries['genre'].values) == ['Pop', 'Rock']
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running segment store tests...\n")
+
+    tests = [
+        test_round_trip,
+        test_dictionaries_are_shared_and_stable,
+        test_repeated_dictionary_lines,
+        test_time_range_scans_are_zero_copy,
+        test_count_by_hour,
+        test_concurrent_scans_share_dictionaries,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,158 @@
+"""
+Tests for the t-digest duration sketches.
+"""
+
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.analytics import sketches
+from app.analytics.sketches import DurationSketchStore, TDigest
+from app.models.models import Base, ListenEvent
+
+
+def test_quantile_accuracy():
+    """Test p50/p90/p99 against exact quantiles of skewed durations."""
+    rng = np.random.default_rng(7)
+    durations = rng.lognormal(mean=5.3, sigma=0.35, size=100000)
+
+    digest = TDigest()
+    for chunk in np.array_split(durations, 100):
+        digest.update(chunk)
+
+    for q in [0.5, 0.9, 0.99]:
+        exact = np.quantile(durations, q)
+        error = abs(digest.quantile(q) - exact) / exact
+        assert error < 0.01, (q, error)
+
+    assert digest.centroids <= digest.compression
+    assert digest.count == len(durations)
+    assert abs(digest.total - durations.sum()) < 1e-6 * durations.sum()
+
+    print("✓ Quantiles within 1% of exact values")
+
+
+def test_merge_matches_single_digest():
+    """Test that merging partial digests approximates one digest over all values."""
+    rng = np.random.default_rng(11)
+    durations = rng.uniform(60, 600, size=40000)
+
+    parts = [TDigest() for _ in range(8)]
+    for i, chunk in enumerate(np.array_split(durations, 80)):
+        parts[i % 8].update(chunk)
+
+    merged = TDigest()
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.count == len(durations)
+    for q in [0.5, 0.9, 0.99]:
+        exact = np.quantile(durations, q)
+        assert abs(merged.quantile(q) - exact) / exact < 0.01
+
+    print("✓ Merged digests match exact quantiles")
+
+
+def test_store_slices():
+    """Test genre/region/day slicing of the sketch store."""
+    events = pd.DataFrame({
+        'genre': ['Pop', 'Pop', 'Rock', 'Pop', 'Rock'],
+        'state': ['NY', 'CA', 'CA', 'NY', 'OK'],
+        'timestamp': pd.to_datetime([
+            '2024-03-01 10:00', '2024-03-01 11:00', '2024-03-02 09:00',
+            '2024-03-03 12:00', '2024-03-03 13:00',
+        ]),
+        'duration': [100.0, 200.0, 300.0, 400.0, 500.0],
+    })
+
+    store = DurationSketchStore()
+    store.update(events.iloc[:3])
+    store.update(events.iloc[3:])
+
+    assert len(store) == 5
+    assert store.query().count == 5
+    assert store.query(genre='Pop').total == 700.0
+    assert store.query(region='Northeast').quantile(0.5) == 250.0
+    assert store.query(region='Southeast').total == 500.0
+    assert store.query(start=date(2024, 3, 2), end=date(2024, 3, 2)).total == 300.0
+    assert store.query(genre='Jazz').quantile(0.5) is None
+
+    print("✓ Sketch store answers genre, region and day slices")
+
+
+def test_refresh_folds_new_rows():
+    """Test that a refresh folds in only rows added since the last one."""
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    def add(durations):
+        db.execute(insert(ListenEvent), [
+            {'genre': 'Pop', 'state': 'NY', 'timestamp': pd.Timestamp('2024-03-01').to_pydatetime(), 'duration': d}
+            for d in durations
+        ])
+        db.commit()
+
+    sketches._sketches = None
+    try:
+        add([100.0, 200.0])
+        store = sketches.refresh_duration_sketches(db)
+        assert store.last_id == 2 and store.query().total == 300.0
+
+        # Written by another process, e.g. the ingest CLI
+        add([300.0])
+        assert sketches.refresh_duration_sketches(db) is store
+        assert store.last_id == 3 and store.query().count == 3 and store.listen_count == 3
+
+        # A table that shrank below last_id is rebuilt from scratch
+        db.query(ListenEvent).delete()
+        db.commit()
+        add([50.0])
+        rebuilt = sketches.refresh_duration_sketches(db)
+        assert rebuilt is not store
+        assert rebuilt.query().total == 50.0 and rebuilt.last_id == 1
+    finally:
+        sketches._sketches = None
+    print("✓ Refresh folds in new rows by id")
+
+
+def run_all_tests():
+    """Run all tests and report results."""
+    print("Running sketch tests...\n")
+
+    tests = [
+        test_quantile_accuracy,
+        test_merge_matches_single_digest,
+        test_store_slices,
+        test_refresh_folds_new_rows,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"Test Results: {passed} passed, {failed} failed")
+    print(f"{'='*50}")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -3,32 +3,15 @@ Data loader module for Zip Listen Analytics.
 Reads CSV files and adds region mapping based on US states.
 """
 
+import sys
 import pandas as pd
 from pathlib import Path
 
-# US State to Region mapping
-STATE_TO_REGION = {
-    # Northeast
-    'CT': 'Northeast', 'ME': 'Northeast', 'MA': 'Northeast', 'NH': 'Northeast',
-    'RI': 'Northeast', 'VT': 'Northeast', 'NJ': 'Northeast', 'NY': 'Northeast',
-    'PA': 'Northeast',
-    
-    # Southeast
-    'DE': 'Southeast', 'FL': 'Southeast', 'GA': 'Southeast', 'MD': 'Southeast',
-    'NC': 'Southeast', 'SC': 'Southeast', 'VA': 'Southeast', 'WV': 'Southeast',
-    'AL': 'Southeast', 'KY': 'Southeast', 'MS': 'Southeast', 'TN': 'Southeast',
-    'AR': 'Southeast', 'LA': 'Southeast', 'TX': 'Southeast', 'OK': 'Southeast',
-    
-    # Midwest
-    'IL': 'Midwest', 'IN': 'Midwest', 'MI': 'Midwest', 'OH': 'Midwest',
-    'WI': 'Midwest', 'IA': 'Midwest', 'KS': 'Midwest', 'MN': 'Midwest',
-    'MO': 'Midwest', 'NE': 'Midwest', 'ND': 'Midwest', 'SD': 'Midwest',
-    
-    # West
-    'AZ': 'West', 'CO': 'West', 'ID': 'West', 'MT': 'West', 'NV': 'West',
-    'NM': 'West', 'UT': 'West', 'WY': 'West', 'AK': 'West', 'CA': 'West',
-    'HI': 'West', 'OR': 'West', 'WA': 'West'
-}
+# The state to region mapping lives with the backend's geo hierarchy so both
+# sides always agree
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'backend'))
+from app.utils.regions import STATE_TO_REGION
+from app.storage.segments import SegmentStore
 
 
 def add_region_column(df, state_column='state'):
@@ -127,14 +110,36 @@ def load_all_csvs(data_dir='data', state_column='state'):
     return dataframes
 
 
+def write_listen_segments(df, store_dir):
+    """
+    Append listen events to a segment store for fast repeated scans.
+    
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Listen events (artist, song, duration, userId, state, zip, level,
+        genre, timestamp); missing columns are stored as nulls
+    store_dir : str or Path
+        Directory of the segment store, created if needed
+    
+    Returns:
+    --------
+    int
+        Number of rows written
+    """
+    store = SegmentStore(str(store_dir))
+    return store.append(df)
+
+
 if __name__ == '__main__':
     # Example usage - requires a 'data' directory with CSV files
-    import sys
-    
-    if len(sys.argv) > 1:
-        data_dir = sys.argv[1]
-    else:
-        data_dir = 'data'
+    args = sys.argv[1:]
+    segment_dir = None
+    if '--segments' in args:
+        index = args.index('--segments')
+        segment_dir = args[index + 1] if index + 1 < len(args) else 'segments'
+        del args[index:index + 2]
+    data_dir = args[0] if args else 'data'
     
     try:
         dataframes = load_all_csvs(data_dir)
@@ -148,8 +153,12 @@ if __name__ == '__main__':
             print(f"  Columns: {list(df.columns)}")
             if 'region' in df.columns:
                 print(f"  Regions: {df['region'].value_counts().to_dict()}")
+        
+        if segment_dir and 'listen_events' in dataframes:
+            rows = write_listen_segments(dataframes['listen_events'], segment_dir)
+            print(f"\nWrote {rows} listen events to segment store '{segment_dir}'")
                 
     except FileNotFoundError as e:
         print(f"Error: {e}")
         print(f"\nTo use this script, create a '{data_dir}' directory with CSV files containing a 'state' column.")
-        print(f"Usage: python data_loader.py [data_directory]")
+        print(f"Usage: python data_loader.py [data_directory] [--segments store_directory]")
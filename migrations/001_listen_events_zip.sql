@@ -0,0 +1,13 @@
+-- Add the ZIP code column used by the geo cube (/api/geo/drilldown)
+--
+-- New databases get the column from the backend's create_all at startup.
+-- create_all doesn't alter existing tables, so run this once against a
+-- database created before the column was added:
+--
+--   docker compose exec -T db psql -U zipuser -d ziplistendb < migrations/001_listen_events_zip.sql
+--
+-- Existing rows keep a NULL zip; the geo cube reports them under the ZIP
+-- "Unknown" within their state.
+
+ALTER TABLE listen_events ADD COLUMN IF NOT EXISTS zip VARCHAR;
+CREATE INDEX IF NOT EXISTS ix_listen_events_zip ON listen_events (zip);